@@ -6,12 +6,17 @@ cd 4-latest-results/
 
 echo "Current directory: $(pwd)"
 
-if [ $# -ne 1 ]; then
-  echo "Usage: $0 <values-file.yaml>"
+if [ $# -lt 1 ] || [ $# -gt 3 ]; then
+  echo "Usage: $0 <values-file.yaml> [config fingerprint] [install|upgrade]"
   exit 1
 fi
 
 VALUES_FILE="$1"
+# Fingerprint of the rendered values (run-bench.py), kept as the release description so the
+# next run can tell whether the deployed release already serves the same config
+FINGERPRINT="${2:-}"
+# upgrade: the running release only differs in replica counts, upgrade it in place
+MODE="${3:-install}"
 
 # Add Helm repo if not already added
 helm repo add vllm https://vllm-project.github.io/production-stack || true
@@ -22,44 +27,49 @@ if lsof -ti :30080 > /dev/null; then
   kill -9 $(lsof -ti :30080)
 fi
 
-# Make sure there is no current release
-echo "Uninstalling any existing helm releases..."
-helm uninstall vllm || true
-
-# More thorough cleanup of any leftover deployments
-echo "Cleaning up any lingering deployments..."
-kubectl delete deployment -l helm-release-name=vllm --ignore-not-found=true
-# Delete any stale pods directly as well
-kubectl delete pods -l helm-release-name=vllm --ignore-not-found=true
-
-# Wait for all resources to be fully deleted
-echo "Waiting for all resources to be fully deleted..."
-while true; do
-  # Check for any remaining pods or deployments
-  PODS=$(kubectl get pods -l helm-release-name=vllm 2>/dev/null | grep -v "No resources found" || true)
-  DEPLOYMENTS=$(kubectl get deployments -l helm-release-name=vllm 2>/dev/null | grep -v "No resources found" || true)
-
-  if [ -z "$PODS" ] && [ -z "$DEPLOYMENTS" ]; then
-    echo "✅ All previous resources have been cleaned up"
-    break
-  fi
+if [ "$MODE" = "upgrade" ]; then
+  echo "Upgrading the vllm release in place..."
+  helm upgrade vllm vllm/vllm-stack -f "$VALUES_FILE" --description "lmbench-fingerprint=$FINGERPRINT"
+else
+  # Make sure there is no current release
+  echo "Uninstalling any existing helm releases..."
+  helm uninstall vllm || true
+
+  # More thorough cleanup of any leftover deployments
+  echo "Cleaning up any lingering deployments..."
+  kubectl delete deployment -l helm-release-name=vllm --ignore-not-found=true
+  # Delete any stale pods directly as well
+  kubectl delete pods -l helm-release-name=vllm --ignore-not-found=true
+
+  # Wait for all resources to be fully deleted
+  echo "Waiting for all resources to be fully deleted..."
+  while true; do
+    # Check for any remaining pods or deployments
+    PODS=$(kubectl get pods -l helm-release-name=vllm 2>/dev/null | grep -v "No resources found" || true)
+    DEPLOYMENTS=$(kubectl get deployments -l helm-release-name=vllm 2>/dev/null | grep -v "No resources found" || true)
+
+    if [ -z "$PODS" ] && [ -z "$DEPLOYMENTS" ]; then
+      echo "✅ All previous resources have been cleaned up"
+      break
+    fi
 
-  echo "⏳ Waiting for resources to be deleted..."
-  sleep 3
-done
+    echo "⏳ Waiting for resources to be deleted..."
+    sleep 3
+  done
 
-# Double check that we have no pods at all before proceeding
-while true; do
-  if [ $(kubectl get pods | wc -l) -eq 0 ]; then
-    break
-  fi
-  sleep 1
-done
+  # Double check that we have no pods at all before proceeding
+  while true; do
+    if [ $(kubectl get pods | wc -l) -eq 0 ]; then
+      break
+    fi
+    sleep 1
+  done
 
-# Install the stack
-echo "Installing vLLM stack..."
-# release name is vllm
-helm install vllm vllm/vllm-stack -f "$VALUES_FILE"
+  # Install the stack
+  echo "Installing vLLM stack..."
+  # release name is vllm
+  helm install vllm vllm/vllm-stack -f "$VALUES_FILE" ${FINGERPRINT:+--description "lmbench-fingerprint=$FINGERPRINT"}
+fi
 
 # PATCHING DEPLOYMENTS TO USE APPROPRIATE NODE POOLS
 echo "Assigning deployments to node pools based on type..."
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Local mock of an OpenAI-compatible serving engine (no GPU, no model weights).
+
+Implements the endpoints the workloads use:
+  POST /v1/chat/completions   streaming (SSE, stream_options.include_usage) and non-streaming
+  GET  /v1/models
+  GET  /health
+  GET  /metrics               a subset of vLLM's Prometheus metrics, one series per replica
+
+Latency model (per replica):
+  - prefill: the prompt tokens missing from the prefix cache cost --prefill-ms-per-token each,
+    the first token is sent once the prefill is done
+  - decode: every further output token costs --decode-ms-per-token
+  - batching: both costs are multiplied by 1 + --batch-slowdown * (running requests - 1)
+  - prefix cache: the prompt is split into --block-size token blocks identified by chained
+    hashes (as in vLLM's automatic prefix caching), kept in an LRU of --cache-capacity-tokens
+
+Cold start: for --load-seconds after the start, /health answers (like a pod that is Ready)
+but completions fail with 503 while the "model loads"; the first --warmup-requests completions
+afterwards are slowed down by a penalty decreasing linearly from --warmup-penalty-ms.
+
+Requests carrying an `x-user-id` header stick to one replica (session affinity, as with the
+production stack router), others are spread round-robin over --num-replicas replicas.
+Tokens are whitespace-separated words of the rendered chat messages; the reused prompt tokens
+are reported in usage.prompt_tokens_details.cached_tokens.
+
+  python3 2-serving-engines/mock-engine/mock_engine.py --port 30080
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+OUTPUT_WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit"]
+
+
+@dataclass
+class LatencyModel:
+    prefill_ms_per_token: float = 0.1
+    decode_ms_per_token: float = 20.0
+    batch_slowdown: float = 0.02
+    cache_capacity_tokens: int = 200000
+    block_size: int = 16
+
+
+class PrefixCache:
+    """LRU over prompt blocks, identified by the hash of the block and everything before it."""
+
+    def __init__(self, capacity_blocks: int):
+        self.capacity_blocks = capacity_blocks
+        self.blocks: "OrderedDict[int, None]" = OrderedDict()
+
+    def match_and_insert(self, block_hashes: List[int]) -> int:
+        """Number of leading blocks already cached; afterwards all blocks are cached."""
+        num_hit = 0
+        for block_hash in block_hashes:
+            if block_hash not in self.blocks:
+                break
+            num_hit += 1
+
+        for block_hash in block_hashes:
+            self.blocks[block_hash] = None
+            self.blocks.move_to_end(block_hash)
+        while len(self.blocks) > self.capacity_blocks:
+            self.blocks.popitem(last=False)
+        return num_hit
+
+
+class Replica:
+
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+        self.cache = PrefixCache(latency.cache_capacity_tokens // latency.block_size)
+        self.running = 0
+        self.prefix_cache_queries = 0
+        self.prefix_cache_hits = 0
+
+    def slowdown(self) -> float:
+        return 1 + self.latency.batch_slowdown * max(self.running - 1, 0)
+
+
+def tokenize(messages: List[Dict[str, Any]]) -> List[str]:
+    words = []
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+        words.append(f"{message.get('role', 'user')}:")
+        words.extend(content.split())
+    return words
+
+
+def block_hashes(tokens: List[str], block_size: int) -> List[int]:
+    """Chained hashes of the full blocks of the prompt (a trailing partial block is not cached)."""
+    hashes = []
+    prev = 0
+    for start in range(0, len(tokens) - block_size + 1, block_size):
+        prev = hash((prev, tuple(tokens[start:start + block_size])))
+        hashes.append(prev)
+    return hashes
+
+
+async def _sleep_ms(ms: float) -> None:
+    if ms > 0:
+        await asyncio.sleep(ms / 1000)
+
+
+class MockEngine:
+
+    def __init__(self, latency: LatencyModel, num_replicas: int = 1, default_max_tokens: int = 256,
+                 served_model: Optional[str] = None, load_seconds: float = 0.0,
+                 warmup_requests: int = 0, warmup_penalty_ms: float = 0.0):
+        self.latency = latency
+        self.replicas = [Replica(latency) for _ in range(num_replicas)]
+        self._round_robin = itertools.cycle(self.replicas)
+        self.default_max_tokens = default_max_tokens
+        self.served_model = served_model or "mock-model"
+        self.loaded_at = time.time() + load_seconds
+        self.warmup_requests = warmup_requests
+        self.warmup_penalty_ms = warmup_penalty_ms
+        self.served_requests = 0
+
+    def warmup_penalty_ms_next(self) -> float:
+        """Cold-start penalty of the next completion, decreasing to 0 over the warmup requests."""
+        remaining = self.warmup_requests - self.served_requests
+        self.served_requests += 1
+        return self.warmup_penalty_ms * remaining / self.warmup_requests if remaining > 0 else 0.0
+
+    def route(self, user_id: Optional[str]) -> Replica:
+        if user_id is None:
+            return next(self._round_robin)
+        return self.replicas[zlib.crc32(user_id.encode()) % len(self.replicas)]
+
+    async def generate(self, replica: Replica, prompt_tokens: List[str], max_tokens: int):
+        """Yields (output word, cached prompt tokens) with the modelled timing."""
+        replica.running += 1
+        try:
+            num_hit = replica.cache.match_and_insert(block_hashes(prompt_tokens, self.latency.block_size))
+            cached_tokens = num_hit * self.latency.block_size
+            replica.prefix_cache_queries += len(prompt_tokens)
+            replica.prefix_cache_hits += cached_tokens
+            await _sleep_ms((len(prompt_tokens) - cached_tokens)
+                            * self.latency.prefill_ms_per_token * replica.slowdown())
+            for i in range(max_tokens):
+                if i > 0:
+                    await _sleep_ms(self.latency.decode_ms_per_token * replica.slowdown())
+                yield OUTPUT_WORDS[i % len(OUTPUT_WORDS)] + " ", cached_tokens
+        finally:
+            replica.running -= 1
+
+    def render_metrics(self) -> str:
+        """vLLM's names; the mock has no request queue and never preempts."""
+        metrics = [
+            ("vllm:num_requests_running", "gauge", lambda r: r.running),
+            ("vllm:num_requests_waiting", "gauge", lambda r: 0),
+            ("vllm:kv_cache_usage_perc", "gauge", lambda r: len(r.cache.blocks) / max(r.cache.capacity_blocks, 1)),
+            ("vllm:prefix_cache_queries_total", "counter", lambda r: r.prefix_cache_queries),
+            ("vllm:prefix_cache_hits_total", "counter", lambda r: r.prefix_cache_hits),
+            ("vllm:num_preemptions_total", "counter", lambda r: 0),
+        ]
+        lines = []
+        for name, kind, value in metrics:
+            lines.append(f"# TYPE {name} {kind}")
+            for i, replica in enumerate(self.replicas):
+                lines.append(f'{name}{{engine="{i}",model_name="{self.served_model}"}} {value(replica)}')
+        return "\n".join(lines) + "\n"
+
+    # ------------------------------------------------------------------ HTTP
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, value = line.decode("latin-1").split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                await self.dispatch(method, target.split("?", 1)[0], headers, body, writer)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method: str, path: str, headers: Dict[str, str], body: bytes,
+                       writer: asyncio.StreamWriter) -> None:
+        if method == "GET" and path == "/health":
+            await self._send_json(writer, 200, {"status": "ok"})
+        elif method == "GET" and path == "/metrics":
+            body = self.render_metrics().encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                         + f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+            await writer.drain()
+        elif method == "GET" and path == "/v1/models":
+            await self._send_json(writer, 200, {"object": "list", "data": [
+                {"id": self.served_model, "object": "model", "created": 0, "owned_by": "mock"}]})
+        elif method == "POST" and path == "/v1/chat/completions":
+            if time.time() < self.loaded_at:
+                await self._send_json(writer, 503, {"error": {"message": "Model is still loading"}})
+                return
+            try:
+                payload = json.loads(body or b"{}")
+            except json.JSONDecodeError as e:
+                await self._send_json(writer, 400, {"error": {"message": f"Invalid JSON: {e}"}})
+                return
+            await self.chat_completions(payload, headers, writer)
+        else:
+            await self._send_json(writer, 404, {"error": {"message": f"{method} {path} not found"}})
+
+    async def chat_completions(self, payload: Dict[str, Any], headers: Dict[str, str],
+                               writer: asyncio.StreamWriter) -> None:
+        prompt_tokens = tokenize(payload.get("messages", []))
+        max_tokens = (payload.get("max_completion_tokens") or payload.get("max_tokens")
+                      or self.default_max_tokens)
+        model = payload.get("model", self.served_model)
+        replica = self.route(headers.get("x-user-id"))
+        await _sleep_ms(self.warmup_penalty_ms_next())
+        request_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        def usage(num_generated: int, cached_tokens: int) -> Dict[str, Any]:
+            return {
+                "prompt_tokens": len(prompt_tokens),
+                "completion_tokens": num_generated,
+                "total_tokens": len(prompt_tokens) + num_generated,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens},
+            }
+
+        if not payload.get("stream", False):
+            words, cached_tokens = [], 0
+            async for word, cached_tokens in self.generate(replica, prompt_tokens, max_tokens):
+                words.append(word)
+            await self._send_json(writer, 200, {
+                "id": request_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "length",
+                             "message": {"role": "assistant", "content": "".join(words)}}],
+                "usage": usage(len(words), cached_tokens),
+            })
+            return
+
+        include_usage = (payload.get("stream_options") or {}).get("include_usage", False)
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nTransfer-Encoding: chunked\r\n\r\n")
+
+        def chunk(choices: List[Dict[str, Any]], **extra) -> Dict[str, Any]:
+            return {"id": request_id, "object": "chat.completion.chunk", "created": created,
+                    "model": model, "choices": choices, **extra}
+
+        num_generated, cached_tokens = 0, 0
+        async for word, cached_tokens in self.generate(replica, prompt_tokens, max_tokens):
+            delta = {"content": word}
+            if num_generated == 0:
+                delta["role"] = "assistant"
+            num_generated += 1
+            await self._send_event(writer, chunk([{"index": 0, "delta": delta, "finish_reason": None}]))
+        await self._send_event(writer, chunk([{"index": 0, "delta": {}, "finish_reason": "length"}]))
+        if include_usage:
+            await self._send_event(writer, chunk([], usage=usage(num_generated, cached_tokens)))
+        await self._send_event(writer, "[DONE]")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    async def _send_event(writer: asyncio.StreamWriter, data) -> None:
+        event = f"data: {data if isinstance(data, str) else json.dumps(data)}\n\n".encode()
+        writer.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+        await writer.drain()
+
+    @staticmethod
+    async def _send_json(writer: asyncio.StreamWriter, status: int, obj: Dict[str, Any]) -> None:
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 503: "Service Unavailable"}
+        body = json.dumps(obj).encode()
+        writer.write(f"HTTP/1.1 {status} {reasons[status]}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+
+
+async def serve(engine: MockEngine, host: str, port: int) -> None:
+    server = await asyncio.start_server(engine.handle_connection, host, port)
+    print(f"Mock engine serving {engine.served_model} on http://{host}:{port}/v1/ "
+          f"({len(engine.replicas)} replica(s), {engine.latency})", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible serving engine with a latency model.")
+    parser.add_argument("--host", type=str, default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=30080)
+    parser.add_argument("--model", type=str, default="mock-model",
+                        help="Model name listed by /v1/models (requests may name any model)")
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.1,
+                        help="Prefill cost per uncached prompt token (default: %(default)s)")
+    parser.add_argument("--decode-ms-per-token", type=float, default=20.0,
+                        help="Decode cost per output token (default: %(default)s)")
+    parser.add_argument("--batch-slowdown", type=float, default=0.02,
+                        help="Relative slowdown per additional running request (default: %(default)s)")
+    parser.add_argument("--cache-capacity-tokens", type=int, default=200000,
+                        help="Prefix cache capacity per replica in tokens (default: %(default)s)")
+    parser.add_argument("--block-size", type=int, default=16,
+                        help="Prefix cache block size in tokens (default: %(default)s)")
+    parser.add_argument("--num-replicas", type=int, default=1,
+                        help="Number of simulated replicas behind the endpoint (default: %(default)s)")
+    parser.add_argument("--default-max-tokens", type=int, default=256,
+                        help="Output length when a request sets no max_tokens (default: %(default)s)")
+    parser.add_argument("--load-seconds", type=float, default=0.0,
+                        help="Completions fail with 503 for this long after the start (default: %(default)s)")
+    parser.add_argument("--warmup-requests", type=int, default=0,
+                        help="Number of slowed-down completions after loading (default: %(default)s)")
+    parser.add_argument("--warmup-penalty-ms", type=float, default=200.0,
+                        help="Extra latency of the first warmup request (default: %(default)s)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    latency = LatencyModel(
+        prefill_ms_per_token=args.prefill_ms_per_token,
+        decode_ms_per_token=args.decode_ms_per_token,
+        batch_slowdown=args.batch_slowdown,
+        cache_capacity_tokens=args.cache_capacity_tokens,
+        block_size=args.block_size,
+    )
+    engine = MockEngine(latency, args.num_replicas, args.default_max_tokens, args.model,
+                        args.load_seconds, args.warmup_requests, args.warmup_penalty_ms)
+    try:
+        asyncio.run(serve(engine, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+#! /bin/bash
+
+# Starts the local mock serving engine on port 30080 in the background.
+# Extra arguments are passed to mock_engine.py (e.g. --decode-ms-per-token 15).
+
+# 1. go to the current directory
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+cd "$SCRIPT_DIR"
+
+PID_FILE="../../4-latest-results/mock-engine.pid"
+LOG_FILE="../../4-latest-results/mock-engine.log"
+
+# 2. stop a previous mock engine / anything else using port 30080
+if [ -f "$PID_FILE" ]; then
+  kill "$(cat "$PID_FILE")" 2>/dev/null || true
+  rm -f "$PID_FILE"
+fi
+if command -v lsof > /dev/null && lsof -ti :30080 > /dev/null; then
+  echo "⚠️  Port 30080 is already in use. Killing existing process..."
+  kill -9 $(lsof -ti :30080)
+fi
+
+# 3. run the mock engine
+nohup python3 mock_engine.py --port 30080 "$@" > "$LOG_FILE" 2>&1 &
+echo $! > "$PID_FILE"
+
+# 4. wait until it answers
+echo "Waiting for the mock engine to be ready..."
+for i in $(seq 1 30); do
+  if curl -sf http://localhost:30080/health > /dev/null; then
+    echo "✅ Mock engine is ready on http://localhost:30080/v1/"
+    exit 0
+  fi
+  sleep 1
+done
+
+echo "❌ Mock engine did not become ready, see $LOG_FILE"
+cat "$LOG_FILE"
+exit 1
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Readiness probing by real inference.
+
+A Ready pod does not mean the model is loaded and serving: the engine may still load
+weights, compile or capture CUDA graphs, and the first workload requests would absorb
+that tail. After the deploy scripts see the pods Ready, run-bench.py sends tiny
+completion probes (max_tokens 1) to the OpenAI API:
+  1. until the first probe succeeds, retrying with exponential backoff (INITIAL_BACKOFF
+     doubling up to MAX_BACKOFF, for at most TIMEOUT seconds)
+  2. then in windows of WINDOW probes until the mean probe latency of a window is within
+     TOLERANCE of the previous window's (at most MAX_PROBES probes)
+
+Both points are reported from the start of the baseline stage as cold-start metrics:
+time_to_first_inference_s and time_to_steady_state_s (plus the steady probe latency), and
+run-bench.py attaches them to every summary of the baseline.
+
+Configured in bench-spec.yaml (all keys optional):
+
+  Serving:
+    Readiness:
+      TIMEOUT: 1800
+      WINDOW: 5
+      TOLERANCE: 0.1
+
+Standalone, e.g. against the mock engine started with --load-seconds 10 --warmup-requests 20:
+
+  python3 2-serving-engines/readiness_probe.py --base-url http://localhost:30080/v1/ --model <MODEL>
+"""
+import argparse
+import json
+import time
+import urllib.error
+import urllib.request
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+
+@dataclass
+class ReadinessConfig:
+    # Give up if no probe succeeded after this many seconds
+    timeout: float = 1800.0
+    # Backoff between failed probes: initial_backoff, doubling up to max_backoff
+    initial_backoff: float = 0.5
+    max_backoff: float = 30.0
+    # Probes per latency window
+    window: int = 5
+    # Steady once |mean(window) - mean(previous window)| <= tolerance * mean(previous window)
+    tolerance: float = 0.1
+    # Upper bound on the probes after the first success
+    max_probes: int = 200
+    # Seconds between two successful probes
+    interval: float = 0.2
+    # Timeout of a single probe in seconds
+    probe_timeout: float = 60.0
+
+    @staticmethod
+    def from_spec(spec: Optional[Dict[str, Any]]) -> "ReadinessConfig":
+        """Build the config from the Serving.Readiness block of bench-spec.yaml."""
+        mapping = {
+            'TIMEOUT': 'timeout',
+            'INITIAL_BACKOFF': 'initial_backoff',
+            'MAX_BACKOFF': 'max_backoff',
+            'WINDOW': 'window',
+            'TOLERANCE': 'tolerance',
+            'MAX_PROBES': 'max_probes',
+            'INTERVAL': 'interval',
+            'PROBE_TIMEOUT': 'probe_timeout',
+        }
+        kwargs = {}
+        for key, val in (spec or {}).items():
+            if key not in mapping:
+                raise ValueError(f"Unsupported Readiness key: {key}")
+            kwargs[mapping[key]] = val
+        config = ReadinessConfig(**kwargs)
+        if config.window < 1:
+            raise ValueError("Readiness WINDOW must be at least 1")
+        return config
+
+
+@dataclass
+class ReadinessResult:
+    # seconds from the start of the baseline stage
+    time_to_first_inference_s: float
+    # None if the latency did not settle within max_probes
+    time_to_steady_state_s: Optional[float]
+    # mean probe latency of the last window
+    steady_probe_latency_ms: float
+    probes: int
+    failed_probes: int
+
+    def as_metrics(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def probe_once(base_url: str, model: str, timeout: float) -> float:
+    """Latency in seconds of one tiny chat completion, raises if it fails."""
+    body = json.dumps({
+        "model": model,
+        "messages": [{"role": "user", "content": "Hi"}],
+        "max_tokens": 1,
+        "temperature": 0,
+    }).encode()
+    request = urllib.request.Request(base_url.rstrip('/') + "/chat/completions", data=body,
+                                     headers={"Content-Type": "application/json"})
+    start = time.time()
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        json.loads(response.read())
+    return time.time() - start
+
+
+def wait_until_ready(base_url: str, model: str, config: ReadinessConfig, since: Optional[float] = None,
+                     probe: Callable[[str, str, float], float] = probe_once) -> ReadinessResult:
+    """
+    Probe until the first inference succeeds, then until the probe latency is steady.
+    since: start of the cold start (default: now), the reported times are relative to it.
+    """
+    since = time.time() if since is None else since
+    deadline = time.time() + config.timeout
+    backoff = config.initial_backoff
+    probes = failed = 0
+
+    # 1. first successful inference
+    while True:
+        probes += 1
+        try:
+            latency = probe(base_url, model, config.probe_timeout)
+            break
+        except (OSError, ValueError) as e:
+            failed += 1
+            if time.time() + backoff > deadline:
+                raise TimeoutError(f"No successful inference after {config.timeout:.0f}s: {e}")
+            print(f"Readiness probe failed ({e}), retrying in {backoff:.1f}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, config.max_backoff)
+    time_to_first_inference = time.time() - since
+    print(f"First successful inference after {time_to_first_inference:.1f}s ({latency * 1000:.1f} ms)")
+
+    # 2. steady state: consecutive windows of probe latencies agree
+    window: List[float] = [latency]
+    previous_mean: Optional[float] = None
+    backoff = config.initial_backoff
+    for _ in range(config.max_probes):
+        if len(window) == config.window:
+            mean = sum(window) / len(window)
+            if previous_mean is not None and abs(mean - previous_mean) <= config.tolerance * previous_mean:
+                time_to_steady_state = time.time() - since
+                print(f"Probe latency steady at {mean * 1000:.1f} ms after {time_to_steady_state:.1f}s")
+                return ReadinessResult(time_to_first_inference, time_to_steady_state, mean * 1000,
+                                       probes, failed)
+            previous_mean, window = mean, []
+        time.sleep(config.interval)
+        probes += 1
+        try:
+            window.append(probe(base_url, model, config.probe_timeout))
+            backoff = config.initial_backoff
+        except (OSError, ValueError) as e:
+            failed += 1
+            print(f"Readiness probe failed ({e}), retrying in {backoff:.1f}s")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, config.max_backoff)
+
+    last = window or [previous_mean or latency]
+    print(f"[warn] Probe latency did not settle within {config.max_probes} probes")
+    return ReadinessResult(time_to_first_inference, None, sum(last) / len(last) * 1000, probes, failed)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Wait until an OpenAI-compatible endpoint serves steadily.")
+    parser.add_argument("--base-url", default="http://localhost:30080/v1/")
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--timeout", type=float, default=ReadinessConfig.timeout)
+    parser.add_argument("--window", type=int, default=ReadinessConfig.window)
+    parser.add_argument("--tolerance", type=float, default=ReadinessConfig.tolerance)
+    parser.add_argument("--max-probes", type=int, default=ReadinessConfig.max_probes)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    config = ReadinessConfig(timeout=args.timeout, window=args.window, tolerance=args.tolerance,
+                             max_probes=args.max_probes)
+    result = wait_until_ready(args.base_url, args.model, config)
+    print(json.dumps(result.as_metrics(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,26 @@ from typing import Optional, List, Dict, Any
 import openai
 import pandas as pd
 
-from utils import AsyncLoopWrapper, init_logger
+from utils import (
+    AsyncLoopWrapper,
+    ConvergenceMonitor,
+    MetricsExporter,
+    SteadyStateWarmup,
+    TokenCounter,
+    add_convergence_args,
+    add_engine_metrics_args,
+    add_generation_mode_args,
+    add_metrics_args,
+    add_warmup_args,
+    build_convergence_monitor,
+    build_warmup,
+    cached_prompt_tokens,
+    generation_kwargs,
+    init_logger,
+    start_engine_scraper,
+    start_metrics_exporter,
+    write_warmup_report,
+)
 
 logger = init_logger(__name__, logging.INFO)
 
@@ -116,11 +135,15 @@ class Response:
     launch_time: float
     finish_time: float
     agentID: int
+    # prompt tokens served from the engine's prefix cache, None if not reported
+    cached_tokens: Optional[int] = None
+    # the stream carried no usage, the token counts come from the local tokenizer
+    tokens_counted_locally: bool = False
 
 
 class RequestExecutor:
 
-    def __init__(self, base_url: str, model: List[str]):
+    def __init__(self, base_url: str, model: List[str], generation_mode: str = "mixed"):
         # For vLLM server, we don't need an API key, but the client requires one
         self.client = openai.AsyncOpenAI(
             api_key="vllm_xxxxxxxxxxxxx",  # Dummy API key for vLLM server
@@ -130,6 +153,8 @@ class RequestExecutor:
         logging.info(f"Initialized OpenAI client with base_url={base_url} and model={model}")
         self.loop = AsyncLoopWrapper.GetOrStartLoop()
         self.request_history = []
+        self.warned_local_counts = False
+        self.generation_mode = generation_mode
 
     async def _async_launch_request(self, messages: List[Dict[str, str]],  max_tokens: int,
                                     agentID: int, extra_headers: Optional[Dict[str, str]] = None):
@@ -141,6 +166,7 @@ class RequestExecutor:
             words = ""
             tokens_out = 0
             tokens_prefill = 0
+            tokens_cached = None
             start_time = time.time()
             first_token_time = None
 
@@ -150,7 +176,7 @@ class RequestExecutor:
                     model=model,
                     messages=messages,
                     stream=True,
-                    max_tokens=max_tokens,
+                    **generation_kwargs(self.generation_mode, max_tokens),
                     temperature=0.0,
                     stream_options={"include_usage": True},
                     extra_headers=extra_headers,
@@ -167,30 +193,26 @@ class RequestExecutor:
                             first_token_time = time.time()
                         words += chunk.choices[0].delta.content
 
+                finish_time = time.time()
+
                 # Handle token counts if available
                 if hasattr(chunk, 'usage') and chunk.usage is not None:
                     tokens_out = chunk.usage.completion_tokens
                     tokens_prefill = chunk.usage.prompt_tokens
+                    tokens_cached = cached_prompt_tokens(chunk.usage)
 
-                # If we didn't get token counts from streaming, try to get them from the final response
-                if tokens_out == 0 or tokens_prefill == 0:
-                    print("No token counts from streaming, getting final response")
-                    print(f"{tokens_out}, {tokens_prefill}")
-                    try:
-                        final_response = await self.client.chat.completions.create(
-                            model=model,
-                            messages=messages,
-                            stream=False,
-                        )
-                        if hasattr(final_response, 'usage') and final_response.usage is not None:
-                            tokens_out = final_response.usage.completion_tokens
-                            tokens_prefill = final_response.usage.prompt_tokens
-                    except Exception as e:
-                        logging.warning(f"Failed to get token counts from final response: {e}")
+                # Without token counts in the stream, count locally rather than sending
+                # the request again (which doubles the load and pollutes the cache)
+                counted_locally = tokens_out == 0 or tokens_prefill == 0
+                if counted_locally:
+                    if not self.warned_local_counts:
+                        logging.warning("No token counts in the streamed usage, counting tokens locally")
+                        self.warned_local_counts = True
+                    tokens_prefill, tokens_out = await TokenCounter.Count(model, messages, words)
 
                 # # Calculate timing metrics
                 ttft = first_token_time - start_time if first_token_time else 0
-                generation_time = time.time() - first_token_time if first_token_time else 0
+                generation_time = finish_time - first_token_time if first_token_time else 0
 
                 return Response(
                     body=words,
@@ -199,8 +221,10 @@ class RequestExecutor:
                     prompt_tokens=tokens_prefill,
                     generation_tokens=tokens_out,
                     launch_time=start_time,
-                    finish_time=time.time(),
+                    finish_time=finish_time,
                     agentID=agentID,
+                    cached_tokens=tokens_cached,
+                    tokens_counted_locally=counted_locally,
                 )
             except openai.BadRequestError as e:
                 logging.warning(f"BadRequestError with model {model}: {e}")
@@ -252,10 +276,18 @@ class UserSession:
 
         self.prompt_lengths = []
         self.generation_lengths = []
+        self.cached_lengths = []
+        self.counted_locally = []
         self.ttfts = []
         self.generation_times = []
         self.launch_times = []
         self.finish_times = []
+        self.scheduled_times = []
+        self.send_times = []
+        self.dispatch_delays = []
+        self.missed_slots = []
+        # (scheduled time, send time, missed slots) of the request in flight
+        self.pending_schedule = None
 
         self.finished = False
 
@@ -268,10 +300,17 @@ class UserSession:
     def _update_result(self, response: Response):
         self.prompt_lengths.append(response.prompt_tokens)
         self.generation_lengths.append(response.generation_tokens)
+        self.cached_lengths.append(response.cached_tokens)
+        self.counted_locally.append(response.tokens_counted_locally)
         self.ttfts.append(response.ttft)
         self.generation_times.append(response.generation_time)
         self.launch_times.append(response.launch_time)
         self.finish_times.append(response.finish_time)
+        scheduled_time, send_time, missed_slots = self.pending_schedule
+        self.scheduled_times.append(scheduled_time)
+        self.send_times.append(send_time)
+        self.dispatch_delays.append(response.launch_time - send_time)
+        self.missed_slots.append(missed_slots)
         self.agentIDs.append(response.agentID)
         self.outputs.append(response.body)
 
@@ -320,6 +359,18 @@ class UserSession:
         # We'll save the input messages in _update_result after the request succeeds
         # This ensures inputs only get recorded for successful requests
 
+        # Intended send time on the session's schedule (one request every
+        # gap_between_requests); slots that pass while the previous request is
+        # still running are skipped by step() and counted as missed
+        gap = self.user_config.gap_between_requests
+        if self.last_request_time is None:
+            scheduled_time = timestamp
+        else:
+            scheduled_time = self.last_request_time + gap
+        send_time = time.time()
+        missed_slots = int(max(send_time - scheduled_time, 0) // gap)
+        self.pending_schedule = (scheduled_time, send_time, missed_slots)
+        MetricsExporter.RequestSent(scheduled_time, send_time)
         request_executor.launch_request(
             messages,
             max_tokens,
@@ -331,6 +382,7 @@ class UserSession:
         self.last_request_time = timestamp
 
     def _on_request_finished(self, response: Optional[Response], agentID: int):
+        MetricsExporter.RequestFinished(response)
         if response is None:
             logger.warning(f"User {self.user_config.user_id} request failed (likely context length exceeded)")
             self.has_unfinished_request = False
@@ -407,12 +459,18 @@ class UserSession:
         df = pd.DataFrame()
         df["prompt_tokens"] = self.prompt_lengths
         df["generation_tokens"] = self.generation_lengths
+        df["cached_tokens"] = pd.array(self.cached_lengths, dtype="Int64")
+        df["tokens_counted_locally"] = self.counted_locally
         df["ttft"] = self.ttfts
         df["generation_time"] = self.generation_times
         df["user_id"] = self.user_config.user_id
         df["question_id"] = range(1, len(self.prompt_lengths) + 1)
         df["launch_time"] = self.launch_times
         df["finish_time"] = self.finish_times
+        df["scheduled_time"] = self.scheduled_times
+        df["send_time"] = self.send_times
+        df["dispatch_delay"] = self.dispatch_delays
+        df["missed_slots"] = self.missed_slots
         df["agentID"] = self.agentIDs
         df["input"] = self.inputs
         df["output"] = self.outputs
@@ -584,13 +642,19 @@ class UserSessionManager:
         print("\n")
         return df
 
-    def summary(self, start_time: float, end_time: float) -> pd.DataFrame:
+    def get_results(self) -> pd.DataFrame:
+        """The per-request results of all finished requests so far"""
         if len(self.session_summaries) == 0 and len(self.sessions) == 0:
             return pd.DataFrame()
-
-        df = pd.concat(
+        return pd.concat(
             [s for s in self.session_summaries] + [s.summary() for s in self.sessions]
         )
+
+    def summary(self, start_time: float, end_time: float) -> pd.DataFrame:
+        df = self.get_results()
+        if len(df) == 0:
+            return df
+
         pending_queries = len([s for s in self.sessions if s.has_unfinished_request])
         start_time = max(self.start_time, start_time)
         end_time = min(end_time, df["finish_time"].max())
@@ -601,6 +665,77 @@ class UserSessionManager:
         return df
 
 
+def run_benchmark(
+    executor: RequestExecutor,
+    workload_config: WorkloadConfig,
+    time_limit: Optional[float] = None,
+    log_interval: float = 30,
+    convergence: Optional[ConvergenceMonitor] = None,
+) -> pd.DataFrame:
+    """
+    Run the workload once on the given executor and return the per-request results.
+    The executor (and its connection pool) stays usable for further runs.
+    """
+    step_interval = 0.1
+
+    manager = UserSessionManager(
+        workload_config
+    )
+
+    start_time = time.time()
+    last_summary_time = start_time
+    try:
+        while True:
+            continue_flag = manager.step(time.time(), executor)
+            time.sleep(step_interval)
+
+            if time.time() - last_summary_time > log_interval:
+                manager.summary(last_summary_time, time.time())
+                last_summary_time = time.time()
+
+            if time_limit is not None and time.time() - start_time > time_limit:
+                break
+
+            if convergence is not None and convergence.converged(
+                manager.get_results, start_time, time.time()
+            ):
+                logger.info("Metrics converged, stopping the benchmark")
+                break
+
+            if not continue_flag:
+                break
+
+    except KeyboardInterrupt:
+        logger.info("Interrupted, waiting for the final result")
+
+    AsyncLoopWrapper.WaitLoop()
+    return manager.summary(0, time.time())
+
+
+def warmup_engine(
+    executor: RequestExecutor,
+    workload_config: WorkloadConfig,
+    warmup: SteadyStateWarmup,
+    log_interval: float = 30,
+) -> Dict[str, Any]:
+    """
+    Warm the engine up with the run's own agents (same workload config, the user ids
+    start over in the benchmark): the shared system prompt and the first rounds of the
+    run's users. Stops once TTFT and throughput are steady or after warmup.max_time
+    seconds, and returns the warmup report.
+    """
+    logger.info("Warming up the engine with the run's prefixes")
+    start_time = time.time()
+    df = run_benchmark(
+        executor,
+        workload_config,
+        time_limit=warmup.max_time,
+        log_interval=log_interval,
+        convergence=warmup,
+    )
+    return warmup.report(df, start_time, time.time())
+
+
 def parse_arguments() -> WorkloadConfig:
     parser = argparse.ArgumentParser(description="Parse benchmark configurations.")
 
@@ -670,6 +805,11 @@ def parse_arguments() -> WorkloadConfig:
         action="store_true",
         help="Include the whole history in the agentic workload"
     )
+    add_convergence_args(parser)
+    add_warmup_args(parser)
+    add_metrics_args(parser)
+    add_engine_metrics_args(parser)
+    add_generation_mode_args(parser)
     args = parser.parse_args()
     return args, parser
 
@@ -713,8 +853,6 @@ def main():
             args.num_rounds,
             args.time,)
 
-    step_interval = 0.1
-
     model = args.model
     if args.num_agents != len(args.model):
         assert len(args.model) == 1
@@ -722,7 +860,7 @@ def main():
     print(f"Using models: {model}")
 
     executor = RequestExecutor(
-        base_url=args.base_url, model=model
+        base_url=args.base_url, model=model, generation_mode=args.generation_mode
     )
 
     workload_config = WorkloadConfig(
@@ -738,35 +876,32 @@ def main():
         trace_file=args.trace_file,
     )
 
-    manager = UserSessionManager(
-        workload_config
-    )
-
-    start_time = time.time()
-    last_summary_time = start_time
-    try:
-        while True:
-            continue_flag = manager.step(time.time(), executor)
-            time.sleep(step_interval)
-
-            if time.time() - last_summary_time > args.log_interval:
-                manager.summary(last_summary_time, time.time())
-                last_summary_time = time.time()
-
-            if args.time is not None and time.time() - start_time > args.time:
-                break
+    warmup = build_warmup(args)
+    warmup_report = None
+    if warmup is not None:
+        warmup_report = warmup_engine(
+            executor, workload_config, warmup, log_interval=args.log_interval
+        )
 
-            if not continue_flag:
-                break
+    convergence = build_convergence_monitor(args)
+    start_metrics_exporter(args, "agentic")
+    scraper = start_engine_scraper(args)
 
-    except KeyboardInterrupt:
-        logger.info("Interrupted, waiting for the final result")
+    summary = run_benchmark(
+        executor,
+        workload_config,
+        time_limit=args.time,
+        log_interval=args.log_interval,
+        convergence=convergence,
+    )
 
     AsyncLoopWrapper.StopLoop()
+    if scraper is not None:
+        scraper.stop()
 
     logger.info(f"Finished benchmarking, dumping summary to {args.output}")
-    summary = manager.summary(0, time.time())
     summary.to_csv(args.output, index=False)
+    write_warmup_report(warmup_report, args.output)
 
 
 if __name__ == "__main__":
@@ -30,39 +30,33 @@ else
     NEW_USER_INTERVALS=(2)  # Default new user interval
 fi
 
+# Run length of each benchmark: a fixed --time, or a convergence-driven stop
+# (--converge-metrics ...) bounded by --min-time and --time (set by run-bench.py)
+RUN_LENGTH_ARGS=${RUN_LENGTH_ARGS:---time 100}
+
+# Prometheus metrics (set by run-bench.py): --metrics-port 9400 serves the load generator's,
+# --engine-metrics-interval 5 scrapes the engine's every 5s (default 1s, 0 disables)
+METRICS_ARGS=${METRICS_ARGS:-}
+
+# Generation mode of the benchmark runs (set by run-bench.py): prefill (max_tokens 1) or
+# decode (exactly the workload's output lengths), the workload's own output lengths by default
+GENERATION_MODE=${GENERATION_MODE:-}
+GENERATION_ARGS=${GENERATION_MODE:+--generation-mode $GENERATION_MODE}
+
 # init-user-id starts at 1, will add 400 each iteration
 INIT_USER_ID=1
 
-warmup() {
-    echo "Warming up with agent count=$NUM_AGENTS..."
-    python3 "${SCRIPT_DIR}/agentic-qa.py" \
-        --num-agents "$NUM_AGENTS" \
-        --num-rounds 2 \
-        --shared-system-prompt "$(echo -n "$SYSTEM_PROMPT" | wc -w)" \
-        --user-history-prompt "$(echo -n "$CHAT_HISTORY" | wc -w)" \
-        --answer-len "$ANSWER_LEN" \
-        --model $MODEL_LIST \
-        --base-url "$BASE_URL" \
-        --user-request-interval 1 \
-        --new-user-interval 2 \
-        --output /tmp/warmup.csv \
-        --log-interval 30 \
-        --time $((NUM_USERS_WARMUP / 2))
-}
-
 run_benchmark() {
     local new_user_interval=$1
     local output_file="../../4-latest-results/${KEY}_agentic_output_${new_user_interval}.csv"
 
-    # warmup with current init ID
-    warmup
-
-    # actual benchmark with same init ID
+    # the driver first warms the engine up with the run's own agents until TTFT and
+    # throughput are steady, for at most NUM_USERS_WARMUP / 2 seconds
     echo "Running benchmark with new_user_interval=$new_user_interval..."
     python3 "${SCRIPT_DIR}/agentic-qa.py" \
         --num-agents "$NUM_AGENTS" \
-        --shared-system-prompt "$(echo -n "$SYSTEM_PROMPT" | wc -w)" \
-        --user-history-prompt "$(echo -n "$CHAT_HISTORY" | wc -w)" \
+        --shared-system-prompt "$SYSTEM_PROMPT" \
+        --user-history-prompt "$CHAT_HISTORY" \
         --answer-len "$ANSWER_LEN" \
         --num-rounds "$NUM_ROUNDS" \
         --model $MODEL_LIST \
@@ -70,7 +64,10 @@ run_benchmark() {
         --user-request-interval 1 \
         --new-user-interval "$new_user_interval" \
         --output "$output_file" \
-        --time 100
+        --warmup-time $((NUM_USERS_WARMUP / 2)) \
+        $RUN_LENGTH_ARGS \
+        $METRICS_ARGS \
+        $GENERATION_ARGS
 
     sleep 10
 
@@ -95,7 +92,8 @@ for interval in "${NEW_USER_INTERVALS[@]}"; do
         SYSTEM_PROMPT="$SYSTEM_PROMPT" \
         CHAT_HISTORY="$CHAT_HISTORY" \
         ANSWER_LEN="$ANSWER_LEN" \
-        NEW_USER_INTERVAL="$interval"
+        NEW_USER_INTERVAL="$interval" \
+        ${GENERATION_MODE:+GENERATION_MODE=$GENERATION_MODE}
 
     # Change back to script directory
     cd "$SCRIPT_DIR"
@@ -0,0 +1,209 @@
+"""
+Compile a workload into a frozen request manifest for replay/replay-qa.py.
+
+Every workload generates its requests on the fly, so two baselines never see exactly the
+same request stream. A manifest materialises the stream once; replaying the same manifest
+against every baseline makes the comparison exact.
+
+The manifest is JSONL. The first line is a header:
+  {"manifest_version": 1, "workload": ..., "requests": N, "duration": s, "params": {...},
+   "block_text": ...}
+followed by one line per request, sorted by offset:
+  offset          send time in seconds from the start of the replay
+  user_id         session of the request (x-user-id header), question_id its turn
+  max_tokens      max_tokens of the request
+  after_previous  the request is sent only once the previous request of the same user
+                  finished (at its offset or right after that response, whichever is later)
+  history         how the conversation so far is prepended to `messages`:
+                    none           messages are the whole prompt
+                    whole          previous prompt + previous response + messages
+                    last_response  previous response + messages (agentic without --whole-history)
+  previous_response  the message carrying the previous response (role, agent name), with
+                  --freeze-responses also its content; otherwise the engine's actual answer
+  messages        the new messages of the turn. Instead of "content", a message may reference
+                  cache blocks, "blocks": [ids] and "suffix", expanded as
+                  "".join(f"{id}{block_text}") + suffix (Mooncake's hash_ids)
+  model_index     index into the replay's --model list (agentic agents)
+  continued       the user sends further turns (the replay keeps its history until then)
+
+The streams are the ones prefix_analyzer.py analyses: synthetic and agentic step the
+driver's UserSessionManager in simulated time against an instant engine, sharegpt replays
+run.json at --qps and mooncake the trace timestamps (prefill only, as mooncake-qa.py does).
+
+  python3 3-workloads/compile_manifest.py synthetic --config '{"NUM_USERS": 15, "NUM_ROUNDS": 20,
+      "SYSTEM_PROMPT": 1000, "CHAT_HISTORY": 20000, "ANSWER_LEN": 100, "QPS": [0.7]}' \\
+      --time 300 --output synthetic-0.7.jsonl
+  python3 3-workloads/compile_manifest.py mooncake --output mooncake.jsonl
+"""
+import argparse
+import json
+import logging
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from prefix_analyzer import (
+    WORKLOADS_DIR,
+    RecordedCall,
+    RecordingExecutor,
+    add_workload_args,
+    agentic_manager,
+    drive_manager,
+    resolve_workload_args,
+    synthetic_manager,
+)
+
+MANIFEST_VERSION = 1
+# mooncake-qa.py builds every 512-token block of the trace as f"{hash_id}" + MOONCAKE_BLOCK_TEXT
+MOONCAKE_BLOCK_TEXT = " ".join(["hi"] * 512)
+MOONCAKE_SUFFIX = "Can you tell me a detailed story in 1000 words?"
+
+
+def _is_response(message: Dict[str, Any], answer: str) -> bool:
+    return message.get("role") == "assistant" and message.get("content") == answer
+
+
+def _response_template(message: Dict[str, Any], answer: Optional[str]) -> Dict[str, Any]:
+    template = {k: v for k, v in message.items() if k != "content"}
+    if answer is not None:
+        template["content"] = answer
+    return template
+
+
+def split_history(messages: List[Dict[str, Any]], previous: Optional[RecordedCall],
+                  freeze_responses: bool) -> Tuple[str, Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+    """(history, previous_response, new messages) of a request given the session's previous one."""
+    if previous is not None:
+        frozen = previous.answer if freeze_responses else None
+        n = len(previous.messages)
+        if len(messages) > n and messages[:n] == previous.messages and _is_response(messages[n], previous.answer):
+            return "whole", _response_template(messages[n], frozen), messages[n + 1:]
+        if messages and _is_response(messages[0], previous.answer):
+            return "last_response", _response_template(messages[0], frozen), messages[1:]
+    return "none", None, messages
+
+
+def recorded_entries(calls: List[RecordedCall], freeze_responses: bool) -> Iterator[Dict[str, Any]]:
+    previous: Dict[int, RecordedCall] = {}
+    question_ids: Counter = Counter()
+    last_call = {call.session: i for i, call in enumerate(calls)}
+    for i, call in enumerate(calls):
+        history, response, messages = split_history(call.messages, previous.get(call.session),
+                                                     freeze_responses)
+        entry = {
+            "offset": round(call.time, 6),
+            "user_id": call.session,
+            "question_id": question_ids[call.session],
+            "max_tokens": call.max_tokens,
+            "after_previous": history != "none",
+            "history": history,
+        }
+        if response is not None:
+            entry["previous_response"] = response
+        entry["messages"] = messages
+        if call.agent_id is not None:
+            entry["model_index"] = call.agent_id
+        if last_call[call.session] != i:
+            entry["continued"] = True
+        previous[call.session] = call
+        question_ids[call.session] += 1
+        yield entry
+
+
+def sharegpt_entries(path: Path, qps: float) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        prompts = json.load(f)
+    for i, prompt in enumerate(prompts):
+        yield {
+            "offset": round(i / qps, 6), "user_id": i, "question_id": 0,
+            "max_tokens": prompt.get("output_length", 1), "after_previous": False, "history": "none",
+            # sharegpt-qa.py prefixes every prompt with the QPS to avoid hits across runs
+            "messages": [{"role": "user", "content": f"{qps} {prompt['input']}"}],
+        }
+
+
+def mooncake_entries(path: Path) -> Iterator[Dict[str, Any]]:
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    for i, record in enumerate(sorted(records, key=lambda r: r["timestamp"])):
+        yield {
+            # mooncake-qa.py numbers its users from 1
+            "offset": record["timestamp"] / 1000, "user_id": i + 1, "question_id": 0,
+            # replayed prefill only (max_tokens 1), as mooncake-qa.py does by default
+            "max_tokens": 1, "after_previous": False, "history": "none",
+            "messages": [{"role": "user", "blocks": list(record["hash_ids"]), "suffix": MOONCAKE_SUFFIX}],
+        }
+
+
+def workload_entries(args: argparse.Namespace) -> Iterator[Dict[str, Any]]:
+    config = json.loads(args.config) if args.config else {}
+    if args.workload in ('synthetic', 'agentic'):
+        logging.disable(logging.INFO)
+        if args.workload == 'synthetic':
+            module, manager = synthetic_manager(config, args.qps)
+        else:
+            module, manager = agentic_manager(config, args.trace_file, args.new_user_interval,
+                                              args.whole_history)
+        executor = RecordingExecutor(module, args.block_size, agentic=args.workload == 'agentic',
+                                     keep_messages=True)
+        drive_manager(manager, executor, args.time)
+        logging.disable(logging.NOTSET)
+        return recorded_entries(sorted(executor.calls, key=lambda c: c.time), args.freeze_responses)
+    if args.workload == 'sharegpt':
+        return sharegpt_entries(args.file, args.qps or 1.0)
+    return mooncake_entries(args.file)
+
+
+def write_manifest(path: Path, entries: Iterator[Dict[str, Any]], header: Dict[str, Any]) -> Dict[str, Any]:
+    """Writes the header and the entries; the header's counts are filled in afterwards."""
+    body = path.with_name(path.name + ".tmp")
+    num_requests = 0
+    duration = 0.0
+    users = set()
+    with open(body, "w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            num_requests += 1
+            duration = max(duration, entry["offset"])
+            users.add(entry["user_id"])
+    header = {**header, "requests": num_requests, "users": len(users), "duration": duration}
+    with open(path, "w", encoding="utf-8") as out, open(body, "r", encoding="utf-8") as f:
+        out.write(json.dumps(header) + "\n")
+        for line in f:
+            out.write(line)
+    body.unlink()
+    return header
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compile a workload into a request manifest for replay.")
+    add_workload_args(parser)
+    parser.add_argument("--freeze-responses", action="store_true", default=False,
+                        help="Store placeholder answers of max_tokens tokens as the previous responses, "
+                        "so that multi-turn histories are identical on every baseline")
+    parser.add_argument("--output", type=Path, required=True, help="Manifest file to write (JSONL)")
+    args = parser.parse_args()
+    resolve_workload_args(parser, args)
+    args.output = args.output.resolve()
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+    sys.path.insert(0, str(WORKLOADS_DIR))
+    params = {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()
+              if k not in ('workload', 'output', 'block_size')}
+    header = {"manifest_version": MANIFEST_VERSION, "workload": args.workload, "params": params}
+    if args.workload == 'mooncake':
+        header["block_text"] = MOONCAKE_BLOCK_TEXT
+    header = write_manifest(args.output, workload_entries(args), header)
+    print(f"Compiled {header['requests']} requests of {header['users']} users over "
+          f"{header['duration']:.1f}s into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Offline KV-cache capacity simulator: per-tier prefix-cache hit ratios of a workload
+against tier sizes, for LRU, LFU and ARC eviction.
+
+Replays the block-hash stream of a workload (the request streams of prefix_analyzer.py:
+`hash_ids` of conversation_trace.jsonl, or blocks derived from synthetic, ShareGPT and
+agentic prompts) against a multi-tier cache, e.g. the GPU prefix cache plus the LMCache
+CPU and disk tiers:
+  - every tier stores every block the engine computes or loads (write-through, as LMCache
+    stores to all its backends) and evicts on its own with the chosen policy
+  - a request reuses the leading prompt blocks found in any tier; each reused block is
+    served by the fastest tier holding it
+  - tier sizes are given in GB and converted to tokens with the KV-cache bytes per token
+    of the model (--model, --model-config or --kv-bytes-per-token)
+
+Every combination of the --gpu-gb / --cpu-gb / --disk-gb sizes and --policies is one point
+of the output curve. LRU points all come from a single stack-distance pass (Mattson), LFU
+and ARC simulate each distinct tier size once, so even the full Mooncake trace takes seconds.
+
+  python3 3-workloads/kv_cache_sim.py mooncake --model meta-llama/Llama-3.1-8B-Instruct \\
+      --gpu-gb 20 --cpu-gb 0 20 60 120 --disk-gb 0 500 --output mooncake-cache.csv
+"""
+import argparse
+import glob
+import itertools
+import json
+import os
+import sys
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from prefix_analyzer import (  # noqa: E402
+    Fenwick, Request, add_workload_args, block_size_of, load_requests, resolve_workload_args,
+)
+
+GB = 1024 ** 3
+TIERS = ('gpu', 'cpu', 'disk')
+POLICIES = ('lru', 'lfu', 'arc')
+
+# (layers, KV heads, head dim) of the models used in the bench specs, when no config.json is at hand
+MODEL_SHAPES = {
+    'meta-llama/Llama-3.1-8B-Instruct': (32, 8, 128),
+    'meta-llama/Llama-3.1-70B-Instruct': (80, 8, 128),
+    'meta-llama/Llama-3.2-1B-Instruct': (16, 8, 64),
+    'meta-llama/Llama-3.2-3B-Instruct': (28, 8, 128),
+    'mistralai/Mistral-7B-Instruct-v0.3': (32, 8, 128),
+    'Qwen/Qwen2.5-7B-Instruct': (28, 4, 128),
+    'Qwen/Qwen3-8B': (36, 8, 128),
+}
+
+
+def kv_bytes_per_token(model: Optional[str], model_config: Optional[str], dtype_bytes: int) -> int:
+    """K and V of every layer: 2 * layers * KV heads * head dim * bytes per element."""
+    config = None
+    if model_config is None and model is not None:
+        # config.json of the model in the local Hugging Face cache, if downloaded before
+        hf_home = os.environ.get('HF_HOME', os.path.expanduser('~/.cache/huggingface'))
+        cached = glob.glob(os.path.join(hf_home, 'hub', f"models--{model.replace('/', '--')}",
+                                        'snapshots', '*', 'config.json'))
+        model_config = cached[0] if cached else None
+    if model_config is not None:
+        with open(model_config, 'r') as f:
+            config = json.load(f)
+        config = config.get('text_config', config)
+        num_heads = config['num_attention_heads']
+        shape = (config['num_hidden_layers'], config.get('num_key_value_heads', num_heads),
+                 config.get('head_dim') or config['hidden_size'] // num_heads)
+    elif model in MODEL_SHAPES:
+        shape = MODEL_SHAPES[model]
+    else:
+        raise ValueError(f"Unknown model {model}: pass --model-config <config.json> or --kv-bytes-per-token")
+    layers, kv_heads, head_dim = shape
+    return 2 * layers * kv_heads * head_dim * dtype_bytes
+
+
+# ------------------------------------------------------------------ eviction policies
+
+class LFUCache:
+    """Least frequently used, ties broken by recency (O(1) frequency buckets)."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.freq: Dict[int, int] = {}
+        self.buckets: Dict[int, OrderedDict] = defaultdict(OrderedDict)
+        self.min_freq = 0
+
+    def __contains__(self, block: int) -> bool:
+        return block in self.freq
+
+    def access(self, block: int) -> None:
+        freq = self.freq.get(block)
+        if freq is not None:
+            bucket = self.buckets[freq]
+            del bucket[block]
+            if not bucket:
+                del self.buckets[freq]
+                if self.min_freq == freq:
+                    self.min_freq = freq + 1
+            self.freq[block] = freq + 1
+            self.buckets[freq + 1][block] = None
+            return
+        if len(self.freq) >= self.capacity:
+            bucket = self.buckets[self.min_freq]
+            victim, _ = bucket.popitem(last=False)
+            if not bucket:
+                del self.buckets[self.min_freq]
+            del self.freq[victim]
+        self.freq[block] = 1
+        self.buckets[1][block] = None
+        self.min_freq = 1
+
+
+class ARCCache:
+    """Adaptive Replacement Cache (Megiddo and Modha, FAST '03)."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.t1: OrderedDict = OrderedDict()
+        self.t2: OrderedDict = OrderedDict()
+        self.b1: OrderedDict = OrderedDict()
+        self.b2: OrderedDict = OrderedDict()
+        self.p = 0.0
+
+    def __contains__(self, block: int) -> bool:
+        return block in self.t1 or block in self.t2
+
+    def _replace(self, block: int) -> None:
+        if self.t1 and (len(self.t1) > self.p or (block in self.b2 and len(self.t1) == self.p)
+                        or not self.t2):
+            victim, _ = self.t1.popitem(last=False)
+            self.b1[victim] = None
+        else:
+            victim, _ = self.t2.popitem(last=False)
+            self.b2[victim] = None
+
+    def access(self, block: int) -> None:
+        c = self.capacity
+        if block in self.t1:
+            del self.t1[block]
+            self.t2[block] = None
+            return
+        if block in self.t2:
+            self.t2.move_to_end(block)
+            return
+        if block in self.b1:
+            self.p = min(c, self.p + max(len(self.b2) / len(self.b1), 1))
+            self._replace(block)
+            del self.b1[block]
+            self.t2[block] = None
+            return
+        if block in self.b2:
+            self.p = max(0.0, self.p - max(len(self.b1) / len(self.b2), 1))
+            self._replace(block)
+            del self.b2[block]
+            self.t2[block] = None
+            return
+        l1 = len(self.t1) + len(self.b1)
+        total = l1 + len(self.t2) + len(self.b2)
+        if l1 == c:
+            if len(self.t1) < c:
+                self.b1.popitem(last=False)
+                self._replace(block)
+            else:
+                self.t1.popitem(last=False)
+        elif total >= c:
+            if total == 2 * c:
+                self.b2.popitem(last=False)
+            self._replace(block)
+        self.t1[block] = None
+
+
+CACHE_CLASSES = {'lfu': LFUCache, 'arc': ARCCache}
+
+
+# ------------------------------------------------------------------ simulation
+
+class BlockStream:
+    """The workload's block accesses as dense arrays."""
+
+    def __init__(self, requests: List[Request], block_size: int):
+        ids: Dict[int, int] = {}
+        self.requests = requests
+        self.block_size = block_size
+        # per request: its prompt blocks (looked up) followed by the blocks it adds
+        self.touches: List[List[int]] = []
+        lookup_weights = []
+        for request in requests:
+            blocks = [ids.setdefault(b, len(ids)) for b in request.blocks]
+            added = [ids.setdefault(b, len(ids)) for b in request.cached_blocks[len(request.blocks):]]
+            self.touches.append(blocks + added)
+            # tokens each prompt block stands for (the last one may be partial)
+            lookup_weights.extend(min(block_size, request.prompt_tokens - i * block_size)
+                                  for i in range(len(blocks)))
+        self.num_lookups = np.array([len(r.blocks) for r in requests])
+        self.lookup_weights = np.maximum(np.array(lookup_weights, dtype=float), 0)
+        self.prompt_tokens = sum(r.prompt_tokens for r in requests)
+
+    def stack_distances(self) -> np.ndarray:
+        """LRU stack distance (distinct blocks, itself included) of every lookup, inf on first use."""
+        fenwick = Fenwick(sum(len(t) for t in self.touches))
+        last_access: Dict[int, int] = {}
+        distances = []
+        position = 0
+        for touches, num_lookups in zip(self.touches, self.num_lookups):
+            for block in touches[:num_lookups]:
+                previous = last_access.get(block)
+                distances.append(np.inf if previous is None else
+                                 fenwick.prefix_sum(position) - fenwick.prefix_sum(previous + 1) + 1)
+            for block in touches:
+                previous = last_access.get(block)
+                if previous is not None:
+                    fenwick.add(previous, -1)
+                fenwick.add(position, 1)
+                last_access[block] = position
+                position += 1
+        return np.array(distances, dtype=float)
+
+    def simulate(self, policy: str, capacity_blocks: int) -> np.ndarray:
+        """Whether each lookup finds its block in a cache of capacity_blocks blocks."""
+        cache = CACHE_CLASSES[policy](capacity_blocks)
+        present = []
+        for touches, num_lookups in zip(self.touches, self.num_lookups):
+            present.extend(block in cache for block in touches[:num_lookups])
+            for block in touches:
+                cache.access(block)
+        return np.array(present, dtype=bool)
+
+
+class CapacitySimulator:
+
+    def __init__(self, stream: BlockStream, bytes_per_block: int):
+        self.stream = stream
+        self.bytes_per_block = bytes_per_block
+        self._distances: Optional[np.ndarray] = None
+        self._presence: Dict[Any, np.ndarray] = {}
+
+    def capacity_blocks(self, size_gb: float) -> int:
+        return int(size_gb * GB // self.bytes_per_block)
+
+    def presence(self, policy: str, capacity_blocks: int) -> np.ndarray:
+        if policy == 'lru':
+            if self._distances is None:
+                self._distances = self.stream.stack_distances()
+            return self._distances <= capacity_blocks
+        key = (policy, capacity_blocks)
+        if key not in self._presence:
+            self._presence[key] = self.stream.simulate(policy, capacity_blocks)
+        return self._presence[key]
+
+    def run(self, policy: str, sizes_gb: Dict[str, float]) -> Dict[str, Any]:
+        """Token hit ratio of each tier (fastest tier first) for one configuration."""
+        tiers = [(name, self.capacity_blocks(size)) for name, size in sizes_gb.items()]
+        tiers = [(name, capacity) for name, capacity in tiers if capacity > 0]
+        num = len(self.stream.lookup_weights)
+        # index of the fastest tier holding each lookup, len(tiers) if none
+        serving_tier = np.full(num, len(tiers))
+        for i, (_, capacity) in reversed(list(enumerate(tiers))):
+            serving_tier[self.presence(policy, capacity)] = i
+
+        # only the leading blocks found somewhere are reused
+        found = serving_tier < len(tiers)
+        reused = np.zeros(num, dtype=bool)
+        start = 0
+        for num_lookups in self.stream.num_lookups:
+            segment = found[start:start + num_lookups]
+            prefix = num_lookups if segment.all() else int(np.argmin(segment))
+            reused[start:start + prefix] = True
+            start += num_lookups
+
+        row = {'policy': policy, **{f"{name}_gb": size for name, size in sizes_gb.items()}}
+        total_hit = 0.0
+        for i, (name, _) in enumerate(tiers):
+            hit = self.stream.lookup_weights[reused & (serving_tier == i)].sum()
+            row[f"{name}_hit_ratio"] = hit / self.stream.prompt_tokens
+            total_hit += hit
+        for name in sizes_gb:
+            row.setdefault(f"{name}_hit_ratio", 0.0)
+        row['hit_ratio'] = total_hit / self.stream.prompt_tokens
+        return row
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Simulate per-tier KV-cache hit ratios of a workload.")
+    add_workload_args(parser)
+    parser.add_argument("--model", type=str, default="meta-llama/Llama-3.1-8B-Instruct",
+                        help="Model whose KV-cache size per token converts GB to tokens (default: %(default)s)")
+    parser.add_argument("--model-config", type=str, default=None, help="config.json of the model")
+    parser.add_argument("--kv-bytes-per-token", type=int, default=None,
+                        help="KV-cache bytes per token (overrides --model / --model-config)")
+    parser.add_argument("--dtype-bytes", type=int, default=2, help="Bytes per KV element (default: %(default)s)")
+    for tier, default in zip(TIERS, ([0.0], [0.0, 10.0, 20.0, 40.0, 80.0], [0.0])):
+        parser.add_argument(f"--{tier}-gb", type=float, nargs="+", default=default,
+                            help=f"{tier.upper()} tier sizes in GB (default: %(default)s)")
+    parser.add_argument("--policies", nargs="+", choices=POLICIES, default=list(POLICIES))
+    parser.add_argument("--output", type=str, default=None, help="Also write the curve to this CSV file")
+    args = parser.parse_args()
+    resolve_workload_args(parser, args)
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+    output = Path(args.output).resolve() if args.output else None
+    block_size = block_size_of(args)
+    bytes_per_token = args.kv_bytes_per_token or kv_bytes_per_token(args.model, args.model_config,
+                                                                      args.dtype_bytes)
+
+    stream = BlockStream(load_requests(args), block_size)
+    simulator = CapacitySimulator(stream, bytes_per_token * block_size)
+    print(f"{len(stream.requests)} requests, {stream.prompt_tokens} prompt tokens, "
+          f"{bytes_per_token / 1024:.0f} KiB of KV cache per token")
+
+    rows = []
+    for policy in args.policies:
+        for sizes in itertools.product(args.gpu_gb, args.cpu_gb, args.disk_gb):
+            rows.append(simulator.run(policy, dict(zip(TIERS, sizes))))
+    curve = pd.DataFrame(rows)
+
+    print("============ KV Cache Capacity Simulation ============")
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        formatters = {column: (lambda v: f"{v:.4f}") if column.endswith('hit_ratio') else (lambda v: f"{v:g}")
+                      for column in curve.columns if column != 'policy'}
+        print(curve.to_string(index=False, formatters=formatters))
+    print("======================================================")
+    if output is not None:
+        curve.to_csv(output, index=False)
+        print(f"Capacity curve written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Self-benchmark of the load generator: how fast can each workload's RequestExecutor drive
+requests when the engine costs nothing?
+
+Every workload's RequestExecutor is driven closed-loop (each simulated user sends its next
+request as soon as the previous one finishes) against a zero-latency mock engine
+(2-serving-engines/mock-engine) at increasing user counts, and reports:
+  - requests/s and output tokens/s the client manages to launch and parse
+  - client CPU time per request (all threads of the client process)
+  - scheduling skew: delay between asking the executor to send a request and the request
+    coroutine actually starting on the event loop (P50 / P99)
+
+With --save-baseline the results are stored as JSON; with --baseline a later run is compared
+against them and the script exits with status 1 when the client overhead regressed by more
+than --tolerance percent, separating client regressions from engine regressions.
+
+  python3 3-workloads/loadgen_bench.py --users 1 8 32 128 --save-baseline loadgen-baseline.json
+  python3 3-workloads/loadgen_bench.py --users 1 8 32 128 --baseline loadgen-baseline.json
+
+Each workload runs in its own process, so the CPU accounting covers only that executor. The
+mock engine is a single Python process as well: at high user counts the requests/s may be
+bounded by it, CPU per request and skew remain client-side measurements.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import multiprocessing
+import platform
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+WORKLOADS_DIR = Path(__file__).resolve().parent
+MOCK_ENGINE = WORKLOADS_DIR.parent / '2-serving-engines' / 'mock-engine' / 'mock_engine.py'
+
+DRIVERS = {
+    'synthetic': 'synthetic/multi-round-qa.py',
+    'sharegpt': 'sharegpt/workload_execution/sharegpt-qa.py',
+    'agentic': 'agentic/agentic-qa.py',
+    'mooncake': 'mooncake/mooncake-qa.py',
+    'replay': 'replay/replay-qa.py',
+    'rag': 'rag/rag-qa.py',
+}
+
+# metric -> (higher is better, absolute change ignored as noise)
+COMPARED_METRICS = {
+    'requests_per_s': (True, 0.0),
+    'cpu_ms_per_request': (False, 0.05),
+    'p99_skew_ms': (False, 1.0),
+}
+
+
+def make_launcher(workload: str, module, base_url: str, model: str) -> Callable:
+    """launch(user_id, prompt, max_tokens, on_finish) on top of the workload's own executor."""
+    if workload == 'replay':
+        # the replay awaits its executor on its own event loop: run it on the drivers' loop thread
+        executor = module.RequestExecutor(base_url, [model])
+        loop = importlib.import_module('utils').AsyncLoopWrapper.GetOrStartLoop()
+
+        def launch(user_id, prompt, max_tokens, on_finish):
+            future = asyncio.run_coroutine_threadsafe(
+                executor.request([{"role": "user", "content": prompt}], max_tokens, 0, user_id), loop)
+            future.add_done_callback(lambda f: on_finish(f.result()))
+    elif workload == 'rag':
+        executor = module.RequestExecutor(base_url, "EMPTY", model)
+
+        def launch(user_id, prompt, max_tokens, on_finish):
+            query = module.Query(chunk_ids=[], messages=[{"role": "user", "content": prompt}],
+                                 max_tokens=max_tokens, reused_chunks=0, prefix_reused_chunks=0)
+            executor.launch_request(query, on_finish)
+    elif workload == 'sharegpt':
+        executor = module.RequestExecutor(base_url, "EMPTY", model)
+
+        def launch(user_id, prompt, max_tokens, on_finish):
+            executor.launch_request(prompt, max_tokens, on_finish)
+    elif workload == 'agentic':
+        executor = module.RequestExecutor(base_url=base_url, model=[model])
+
+        def launch(user_id, prompt, max_tokens, on_finish):
+            executor.launch_request([{"role": "user", "content": prompt}], max_tokens,
+                                    lambda response, agent_id: on_finish(response), agentID=0,
+                                    extra_headers={"x-user-id": str(user_id)})
+    else:
+        executor = module.RequestExecutor(base_url=base_url, model=model)
+
+        def launch(user_id, prompt, max_tokens, on_finish):
+            chat_history = module.ChatHistory()
+            chat_history.on_user_query(prompt)
+            executor.launch_request(chat_history, max_tokens, on_finish,
+                                    extra_headers={"x-user-id": str(user_id)})
+    return launch
+
+
+class ClosedLoop:
+    """num_users users, each sending its next request as soon as the previous one finished."""
+
+    def __init__(self, launch: Callable, num_users: int, prompt_len: int, output_len: int):
+        self.launch = launch
+        self.num_users = num_users
+        self.prompt_text = "hi " * prompt_len
+        self.output_len = output_len
+        self.lock = threading.Lock()
+        self.stopped = False
+        self.in_flight = 0
+        self.num_launched = 0
+        self.skews: List[float] = []
+        self.generation_tokens = 0
+        self.num_finished = 0
+        self.last_finish = 0.0
+
+    def _send(self, user_id: int) -> None:
+        with self.lock:
+            if self.stopped:
+                return
+            self.in_flight += 1
+            self.num_launched += 1
+            request_id = self.num_launched
+        scheduled = time.time()
+        prompt = f"user {user_id} request {request_id}: {self.prompt_text}"
+        self.launch(user_id, prompt, self.output_len,
+                    lambda response: self._on_finish(user_id, scheduled, response))
+
+    def _on_finish(self, user_id: int, scheduled: float, response) -> None:
+        with self.lock:
+            self.in_flight -= 1
+            if response is not None:
+                self.num_finished += 1
+                self.skews.append(response.launch_time - scheduled)
+                self.generation_tokens += response.generation_tokens
+                self.last_finish = max(self.last_finish, response.finish_time)
+        self._send(user_id)
+
+    def run(self, duration: float, drain_timeout: float = 10.0) -> Dict[str, Any]:
+        cpu_start = time.process_time()
+        start = time.time()
+        for user_id in range(self.num_users):
+            self._send(user_id)
+        time.sleep(duration)
+        with self.lock:
+            self.stopped = True
+        deadline = time.time() + drain_timeout
+        while self.in_flight > 0 and time.time() < deadline:
+            time.sleep(0.01)
+        cpu = time.process_time() - cpu_start
+        elapsed = max(self.last_finish - start, 1e-9)
+
+        skews_ms = np.array(self.skews) * 1000 if self.skews else np.array([np.nan])
+        return {
+            'users': self.num_users,
+            'requests': self.num_finished,
+            # requests still in flight after the drain timeout count as failed
+            'errors': self.num_launched - self.num_finished,
+            'requests_per_s': self.num_finished / elapsed,
+            'output_tokens_per_s': self.generation_tokens / elapsed,
+            'cpu_ms_per_request': cpu * 1000 / self.num_finished if self.num_finished else np.nan,
+            'p50_skew_ms': float(np.percentile(skews_ms, 50)),
+            'p99_skew_ms': float(np.percentile(skews_ms, 99)),
+        }
+
+
+def bench_workload(workload: str, base_url: str, model: str, user_counts: List[int],
+                   duration: float, prompt_len: int, output_len: int) -> List[Dict[str, Any]]:
+    """Runs in a fresh process per workload (the drivers import their own `utils`)."""
+    import logging
+    from sweep import load_driver
+
+    # keep the per-request driver logs out of the measurement output
+    logging.disable(logging.INFO)
+    module = load_driver(WORKLOADS_DIR / DRIVERS[workload])
+    launch = make_launcher(workload, module, base_url, model)
+
+    # one untimed round to open the connections
+    ClosedLoop(launch, max(user_counts), prompt_len, output_len).run(1.0)
+    results = []
+    for num_users in user_counts:
+        results.append(ClosedLoop(launch, num_users, prompt_len, output_len).run(duration))
+    # the driver's utils (not every driver re-exports AsyncLoopWrapper)
+    importlib.import_module('utils').AsyncLoopWrapper.StopLoop()
+    return results
+
+
+def start_mock_engine(port: int, output_len: int) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, str(MOCK_ENGINE), "--host", "127.0.0.1", "--port", str(port),
+         "--prefill-ms-per-token", "0", "--decode-ms-per-token", "0", "--batch-slowdown", "0",
+         "--default-max-tokens", str(output_len)],
+        stdout=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1)
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("The zero-latency mock engine did not start")
+
+
+def compare_to_baseline(results: Dict[str, List[Dict[str, Any]]], baseline: Dict[str, Any],
+                        tolerance_pct: float) -> List[str]:
+    """Prints the relative changes and returns the regressions beyond tolerance_pct."""
+    regressions = []
+    print("============ Comparison to baseline ============")
+    for workload, points in results.items():
+        baseline_points = {p['users']: p for p in baseline.get('results', {}).get(workload, [])}
+        for point in points:
+            base = baseline_points.get(point['users'])
+            if base is None:
+                continue
+            for metric, (higher_is_better, noise) in COMPARED_METRICS.items():
+                old, new = base[metric], point[metric]
+                if not old or np.isnan(old) or np.isnan(new):
+                    continue
+                change = (new - old) / old * 100
+                worse = new < old if higher_is_better else new > old
+                flag = ""
+                if worse and abs(change) > tolerance_pct and abs(new - old) > noise:
+                    flag = "  REGRESSION"
+                    regressions.append(f"{workload}/{point['users']} users/{metric}")
+                print(f"{workload:<10}{point['users']:>6} users  {metric:<20}{old:>10.3f} -> "
+                      f"{new:>10.3f} ({change:+.1f}%){flag}")
+    print("================================================")
+    return regressions
+
+
+def print_results(results: Dict[str, List[Dict[str, Any]]]) -> None:
+    print("============ Load generator self-benchmark ============")
+    print(f"{'workload':<10}{'users':>6}{'reqs':>8}{'errors':>7}{'reqs/s':>9}{'tokens/s':>10}"
+          f"{'CPU ms/req':>11}{'P50 skew ms':>12}{'P99 skew ms':>12}")
+    for workload, points in results.items():
+        for p in points:
+            print(f"{workload:<10}{p['users']:>6}{p['requests']:>8}{p['errors']:>7}"
+                  f"{p['requests_per_s']:>9.1f}{p['output_tokens_per_s']:>10.0f}"
+                  f"{p['cpu_ms_per_request']:>11.3f}{p['p50_skew_ms']:>12.3f}{p['p99_skew_ms']:>12.3f}")
+    print("=======================================================")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Measure the client-side overhead of the workload executors.")
+    parser.add_argument("--workloads", nargs="+", default=list(DRIVERS), choices=list(DRIVERS),
+                        help="Workloads whose executors are benchmarked (default: all)")
+    parser.add_argument("--users", nargs="+", type=int, default=[1, 8, 32, 128],
+                        help="Concurrent closed-loop users (default: %(default)s)")
+    parser.add_argument("--duration", type=float, default=10.0,
+                        help="Seconds per user count (default: %(default)s)")
+    parser.add_argument("--prompt-len", type=int, default=100,
+                        help="Prompt length in words (default: %(default)s)")
+    parser.add_argument("--output-len", type=int, default=64,
+                        help="Output tokens per request (default: %(default)s)")
+    parser.add_argument("--base-url", type=str, default=None,
+                        help="Use this zero-latency endpoint instead of starting the mock engine")
+    parser.add_argument("--port", type=int, default=30090,
+                        help="Port of the mock engine started by the benchmark (default: %(default)s)")
+    parser.add_argument("--model", type=str, default="mock-model")
+    parser.add_argument("--save-baseline", type=str, default=None, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", type=str, default=None, help="Compare against this baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=25.0,
+                        help="Allowed relative regression in percent (default: %(default)s)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    mock_engine = None
+    base_url = args.base_url
+    if base_url is None:
+        mock_engine = start_mock_engine(args.port, args.output_len)
+        base_url = f"http://127.0.0.1:{args.port}/v1/"
+
+    results = {}
+    try:
+        ctx = multiprocessing.get_context("spawn")
+        for workload in args.workloads:
+            print(f"Benchmarking the {workload} executor with {args.users} users...")
+            with ctx.Pool(1) as pool:
+                results[workload] = pool.apply(bench_workload, (
+                    workload, base_url, args.model, args.users, args.duration,
+                    args.prompt_len, args.output_len))
+    finally:
+        if mock_engine is not None:
+            mock_engine.terminate()
+            mock_engine.wait()
+
+    print_results(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({
+                "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "host": platform.node(),
+                "python": platform.python_version(),
+                "settings": {"users": args.users, "duration": args.duration,
+                             "prompt_len": args.prompt_len, "output_len": args.output_len},
+                "results": results,
+            }, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        if baseline.get("host") != platform.node():
+            print(f"[warn] Baseline was recorded on {baseline.get('host')}, comparisons across machines are not meaningful")
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Client overhead regressed beyond {args.tolerance:g}%: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
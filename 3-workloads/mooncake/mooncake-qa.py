@@ -4,10 +4,27 @@ import json
 import logging
 import time
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any, Dict, Optional
 import openai
 import pandas as pd
-from utils import AsyncLoopWrapper, init_logger
+from utils import (
+    AsyncLoopWrapper,
+    MetricsExporter,
+    SteadyStateWarmup,
+    add_convergence_args,
+    add_engine_metrics_args,
+    add_generation_mode_args,
+    add_metrics_args,
+    add_warmup_args,
+    build_convergence_monitor,
+    build_warmup,
+    cached_prompt_tokens,
+    generation_kwargs,
+    init_logger,
+    start_engine_scraper,
+    start_metrics_exporter,
+    write_warmup_report,
+)
 
 logger = init_logger(__name__, logging.INFO)
 import json
@@ -51,8 +68,6 @@ class WorkloadConfig:
     enable_user_id: bool
     # slowdown factor
     slowdown_factor: float = 1.0
-    # prefill only
-    prefill_only: bool = True
 
 
 @dataclass
@@ -69,8 +84,6 @@ class UserConfig:
     num_rounds: int
     # Whether to include user id in request header
     enable_user_id: bool
-    # prefill only
-    prefill_only: bool = True
 
     @staticmethod
     def new_user_config(user_id: int, workload_config: WorkloadConfig) -> "UserConfig":
@@ -81,7 +94,6 @@ class UserConfig:
             answer_len=workload_config.answer_len,
             num_rounds=workload_config.num_rounds,
             enable_user_id=workload_config.enable_user_id,
-            prefill_only=workload_config.prefill_only,
         )
 
 
@@ -119,10 +131,12 @@ class Response:
     generation_tokens: int
     launch_time: float
     finish_time: float
+    # prompt tokens served from the engine's prefix cache, None if not reported
+    cached_tokens: Optional[int] = None
 
 
 class RequestExecutor:
-    def __init__(self, base_url: str, model: str):
+    def __init__(self, base_url: str, model: str, generation_mode: str = "prefill"):
         # For vLLM server, we don't need an API key, but the client requires one
         self.client = openai.AsyncOpenAI(
             api_key="vllm_xxxxxxxxxxxxx",  # Dummy API key for vLLM server
@@ -132,6 +146,7 @@ class RequestExecutor:
         logging.info(f"Initialized OpenAI client with base_url={base_url} and model={model}")
         self.loop = AsyncLoopWrapper.GetOrStartLoop()
         self.request_history = []
+        self.generation_mode = generation_mode
 
     async def _async_launch_request(self, messages, max_tokens, extra_headers=None):
         start_time = time.time()
@@ -143,7 +158,7 @@ class RequestExecutor:
                 model=self.model,
                 temperature=0,
                 stream=True,
-                max_tokens=max_tokens,
+                **generation_kwargs(self.generation_mode, max_tokens),
                 stream_options={"include_usage": True},
                 extra_headers=extra_headers,
             )
@@ -157,6 +172,7 @@ class RequestExecutor:
                     words += chunk_message
             tokens_out = tok.usage.completion_tokens
             tokens_prefill = tok.usage.prompt_tokens
+            tokens_cached = cached_prompt_tokens(tok.usage)
 
             return Response(
                 body=words,
@@ -166,6 +182,7 @@ class RequestExecutor:
                 generation_tokens=tokens_out,
                 launch_time=start_time,
                 finish_time=time.time(),
+                cached_tokens=tokens_cached,
             )
         except openai.BadRequestError as e:
             logger.warning(f"BadRequestError: {e}")
@@ -204,9 +221,12 @@ class UserSession:
         self,
         mooncake_id,
         user_config: UserConfig,
+        scheduled_time: Optional[float] = None,
     ):
         self.user_config = user_config
         self.mooncake_id = mooncake_id
+        # When the trace says the request should be sent
+        self.scheduled_time = scheduled_time
         self.last_request_time = None
         self.chat_history = ChatHistory()
         self.question_id = 0
@@ -214,22 +234,34 @@ class UserSession:
         self.last_unfinished_log = 0
         self.prompt_lengths = []
         self.generation_lengths = []
+        self.cached_lengths = []
         self.ttfts = []
         self.generation_times = []
         self.launch_times = []
         self.finish_times = []
+        self.scheduled_times = []
+        self.send_times = []
+        self.dispatch_delays = []
+        self.missed_slots = []
+        # (scheduled time, send time, missed slots) of the request in flight
+        self.pending_schedule = None
         self.question_ids = []
         self.finished = False
-        self.prefill_only = user_config.prefill_only
         self.request_failed = False  # Flag to track if this session had request failures
 
     def _update_result(self, response: Response):
         self.prompt_lengths.append(response.prompt_tokens)
         self.generation_lengths.append(response.generation_tokens)
+        self.cached_lengths.append(response.cached_tokens)
         self.ttfts.append(response.ttft)
         self.generation_times.append(response.generation_time)
         self.launch_times.append(response.launch_time)
         self.finish_times.append(response.finish_time)
+        scheduled_time, send_time, missed_slots = self.pending_schedule
+        self.scheduled_times.append(scheduled_time)
+        self.send_times.append(send_time)
+        self.dispatch_delays.append(response.launch_time - send_time)
+        self.missed_slots.append(missed_slots)
         self.question_ids.append(self.question_id - 1)
 
     def _build_system_prompt(self):
@@ -259,10 +291,13 @@ class UserSession:
         logger.debug(
             f"User {self.user_config.user_id} issues request {self.question_id}"
         )
-        if self.prefill_only:
-            max_tokens = 1 # simulate prefill only
-        else:
-            max_tokens = mooncake_data[self.mooncake_id]["output_length"]
+        # the executor's generation mode caps it to 1 for prefill-only replays
+        max_tokens = mooncake_data[self.mooncake_id]["output_length"]
+        # The trace dictates the send time, the replay catches up instead of skipping
+        send_time = time.time()
+        scheduled_time = self.scheduled_time if self.scheduled_time is not None else timestamp
+        self.pending_schedule = (scheduled_time, send_time, 0)
+        MetricsExporter.RequestSent(scheduled_time, send_time)
         request_executor.launch_request(
             self.chat_history,
             max_tokens,
@@ -273,6 +308,7 @@ class UserSession:
         self.last_request_time = timestamp
 
     def _on_request_finished(self, response: Optional[Response]):
+        MetricsExporter.RequestFinished(response)
         if response is None:
             logger.warning(f"User {self.user_config.user_id} request failed (likely context length exceeded)")
             self.has_unfinished_request = False
@@ -304,12 +340,17 @@ class UserSession:
         df = pd.DataFrame()
         df["prompt_tokens"] = self.prompt_lengths
         df["generation_tokens"] = self.generation_lengths
+        df["cached_tokens"] = pd.array(self.cached_lengths, dtype="Int64")
         df["ttft"] = self.ttfts
         df["generation_time"] = self.generation_times
         df["user_id"] = self.user_config.user_id
         df["question_id"] = self.question_ids
         df["launch_time"] = self.launch_times
         df["finish_time"] = self.finish_times
+        df["scheduled_time"] = self.scheduled_times
+        df["send_time"] = self.send_times
+        df["dispatch_delay"] = self.dispatch_delays
+        df["missed_slots"] = self.missed_slots
         return df
 
 
@@ -332,10 +373,15 @@ class UserSessionManager:
     def _create_user_session(self, mooncake_id):
         self.user_id += 1
         user_config = UserConfig.new_user_config(self.user_id, self.workload_config)
-        user_session = UserSession(mooncake_id, user_config)
+        scheduled_time = self.initial_time + self._trace_offset(mooncake_id)
+        user_session = UserSession(mooncake_id, user_config, scheduled_time)
         self.sessions.append(user_session)
         return user_session
 
+    def _trace_offset(self, mooncake_id) -> float:
+        """Seconds after the start at which the trace sends this request."""
+        return (mooncake_data[mooncake_id]["timestamp"] / 1000) * self.workload_config.slowdown_factor
+
     def _remove_finished_sessions(self):
         sessions_to_remove = [s for s in self.sessions if s.finished]
         if len(sessions_to_remove) > 0:
@@ -358,8 +404,7 @@ class UserSessionManager:
         if (len(mooncake_data) > self.mooncake_request_to_send):
             if (
                 timestamp - self.initial_time
-                >= (mooncake_data[self.mooncake_request_to_send]["timestamp"] / 1000)
-                * self.workload_config.slowdown_factor
+                >= self._trace_offset(self.mooncake_request_to_send)
             ):
                 self._create_user_session(self.mooncake_request_to_send)
                 self.last_user_join = timestamp
@@ -440,12 +485,18 @@ class UserSessionManager:
         print("\n")
         return df
 
-    def summary(self, start_time: float, end_time: float) -> pd.DataFrame:
+    def get_results(self) -> pd.DataFrame:
+        """The per-request results of all finished requests so far"""
         if len(self.session_summaries) == 0 and len(self.sessions) == 0:
             return pd.DataFrame()
-        df = pd.concat(
+        return pd.concat(
             [s for s in self.session_summaries] + [s.summary() for s in self.sessions]
         )
+
+    def summary(self, start_time: float, end_time: float) -> pd.DataFrame:
+        df = self.get_results()
+        if len(df) == 0:
+            return df
         pending_queries = len([s for s in self.sessions if s.has_unfinished_request])
         start_time = max(self.start_time, start_time)
         end_time = min(end_time, df["finish_time"].max())
@@ -456,15 +507,30 @@ class UserSessionManager:
         return df
 
 
-def warmup_engine(executor):
-    logger.info("Warming up the engine")
-    for i in range(10):
-        chat_history = ChatHistory()
-        chat_history.on_user_query(
-            f"WARMUP: Hi, I'm user {i}. Here are some text: {'hi ' * 100}."
-        )
-        executor.launch_request(chat_history, 100, lambda x: None)
+def warmup_engine(
+    executor: RequestExecutor,
+    workload_config: WorkloadConfig,
+    warmup: SteadyStateWarmup,
+    init_user_id: int = 0,
+) -> Dict[str, Any]:
+    """
+    Warm the engine up with the opening of the trace itself, at the trace's own rate,
+    until TTFT and throughput are steady or for at most warmup.max_time seconds; the
+    benchmark then replays the trace from its start. Returns the warmup report.
+    """
+    logger.info("Warming up the engine with the opening of the trace")
+    step_interval = 0.1
+    start_time = time.time()
+    manager = UserSessionManager(
+        workload_config, init_user_id=init_user_id, time=start_time
+    )
+    while time.time() - start_time <= warmup.max_time:
+        manager.step(time.time(), executor)
+        time.sleep(step_interval)
+        if warmup.converged(manager.get_results, start_time, time.time()):
+            break
     AsyncLoopWrapper.WaitLoop()
+    return warmup.report(manager.get_results(), start_time, time.time())
 
 
 def parse_arguments() -> WorkloadConfig:
@@ -538,12 +604,19 @@ def parse_arguments() -> WorkloadConfig:
         default=1.0,
         help="The slowdown factor for Mooncake",
     )
+    # the trace is replayed prefill-only unless another mode is chosen
+    add_generation_mode_args(parser, default="prefill")
     parser.add_argument(
         "--prefill-only",
-        action="store_true",
-        default=True,
-        help="Whether to only prefill the request without sending it",
+        action="store_const",
+        const="prefill",
+        dest="generation_mode",
+        help="Same as --generation-mode prefill",
     )
+    add_convergence_args(parser)
+    add_warmup_args(parser)
+    add_metrics_args(parser)
+    add_engine_metrics_args(parser)
     args = parser.parse_args()
     return args
 
@@ -576,9 +649,8 @@ def main():
         logger = init_logger(__name__, level=logging.DEBUG)
     step_interval = 0.1
     executor = RequestExecutor(
-        base_url=args.base_url, model=args.model
+        base_url=args.base_url, model=args.model, generation_mode=args.generation_mode
     )
-    warmup_engine(executor)
     workload_config = WorkloadConfig(
         system_prompt_len=args.shared_system_prompt,
         user_info_len=args.user_history_prompt,
@@ -588,14 +660,22 @@ def main():
         model=args.model,
         enable_user_id=args.request_with_user_id,
         slowdown_factor=args.slowdown_factor,
-        prefill_only=args.prefill_only,
     )
+    warmup = build_warmup(args)
+    warmup_report = None
+    if warmup is not None:
+        warmup_report = warmup_engine(
+            executor, workload_config, warmup, init_user_id=args.init_user_id
+        )
+    start_metrics_exporter(args, "mooncake")
+    scraper = start_engine_scraper(args)
     start_time = time.time()
     manager = UserSessionManager(
         workload_config,
         init_user_id=args.init_user_id,
         time=start_time,
     )
+    convergence = build_convergence_monitor(args)
     num_steps = 0
     last_summary_time = start_time
     try:
@@ -608,12 +688,20 @@ def main():
                 last_summary_time = time.time()
             if args.time is not None and time.time() - start_time > args.time:
                 break
+            if convergence is not None and convergence.converged(
+                manager.get_results, start_time, time.time()
+            ):
+                logger.info("Metrics converged, stopping the benchmark")
+                break
     except KeyboardInterrupt:
         logger.info("Interrupted, waiting for the final result")
     AsyncLoopWrapper.StopLoop()
+    if scraper is not None:
+        scraper.stop()
     logger.info(f"Finished benchmarking, dumping summary to {args.output}")
     summary = manager.summary(0, time.time())
     summary.to_csv(args.output, index=False)
+    write_warmup_report(warmup_report, args.output)
 
 
 if __name__ == "__main__":
@@ -20,11 +20,25 @@ SYSTEM_PROMPT=$5 # Shared system prompt length
 CHAT_HISTORY=$6 # User specific chat history length
 ANSWER_LEN=$7 # Generation length per round
 
+# Run length of each benchmark: a fixed --time, or a convergence-driven stop
+# (--converge-metrics ...) bounded by --min-time and --time (set by run-bench.py)
+RUN_LENGTH_ARGS=${RUN_LENGTH_ARGS:---time 100}
+
+# Prometheus metrics (set by run-bench.py): --metrics-port 9400 serves the load generator's,
+# --engine-metrics-interval 5 scrapes the engine's every 5s (default 1s, 0 disables)
+METRICS_ARGS=${METRICS_ARGS:-}
+
+# Generation mode of the benchmark runs (set by run-bench.py): prefill (max_tokens 1) or
+# decode (exactly the workload's output lengths), prefill (max_tokens 1) by default
+GENERATION_MODE=${GENERATION_MODE:-}
+GENERATION_ARGS=${GENERATION_MODE:+--generation-mode $GENERATION_MODE}
+
 run_mooncake() {
     # $1: qps
     # $2: output file
 
-    # Real run
+    # Real run, after warming the engine up with the opening of the trace until TTFT and
+    # throughput are steady (at most 120 s)
     python3 ./mooncake-qa.py \
         --num-rounds $NUM_ROUNDS \
         --qps "$1" \
@@ -35,7 +49,10 @@ run_mooncake() {
         --base-url "$BASE_URL" \
         --output "$2" \
         --log-interval 30 \
-        --time 100 \
+        --warmup-time 120 \
+        $RUN_LENGTH_ARGS \
+        $METRICS_ARGS \
+        $GENERATION_ARGS \
         --slowdown-factor 1
 
     sleep 10
@@ -63,7 +80,8 @@ for qps in "${QPS_VALUES[@]}"; do
         SYSTEM_PROMPT="$SYSTEM_PROMPT" \
         CHAT_HISTORY="$CHAT_HISTORY" \
         ANSWER_LEN="$ANSWER_LEN" \
-        QPS="$qps"
+        QPS="$qps" \
+        ${GENERATION_MODE:+GENERATION_MODE=$GENERATION_MODE}
 
     # Change back to script directory
     cd "$SCRIPT_DIR"
@@ -0,0 +1,456 @@
+"""
+Offline prefix-reuse analysis of a workload's request stream (no engine, no GPU).
+
+Before spending GPU time, this answers how much prefix sharing a workload actually offers:
+  - the theoretical maximum prefix-cache hit ratio (infinite cache, prefix matching on
+    full blocks, generated tokens cached for the next turn as with vLLM's prefix caching)
+  - the reuse-distance distribution: for every block hit, the number of distinct tokens
+    touched since its previous use (= the LRU capacity in tokens needed for that hit) and
+    the time since its previous use
+  - the unique-token working set: distinct prompt + output tokens, and those reused at all
+
+The request streams are the ones the workloads send:
+  synthetic  the multi-round-qa.py UserSessionManager stepped in simulated time against an
+             instant engine (placeholder answers of ANSWER_LEN tokens)
+  sharegpt   the prompts of run.json in order at --qps
+  agentic    the agentic-qa.py UserSessionManager, from --trace-file or the generated config
+  mooncake   the `hash_ids` of conversation_trace.jsonl (512-token blocks, as replayed by
+             mooncake-qa.py)
+
+Prompts are tokenized as whitespace-separated words of the chat messages (each message
+starts with a role token), like the mock engine; --block-size 1 makes the block index an
+exact token-level prefix trie.
+
+  python3 3-workloads/prefix_analyzer.py synthetic --config '{"NUM_USERS": 350, "NUM_ROUNDS": 20,
+      "SYSTEM_PROMPT": 0, "CHAT_HISTORY": 20000, "ANSWER_LEN": 1000, "QPS": [0.7]}'
+  python3 3-workloads/prefix_analyzer.py sharegpt --file 3-workloads/sharegpt/run.json --qps 1
+  python3 3-workloads/prefix_analyzer.py mooncake --output mooncake-reuse.json
+"""
+import argparse
+import json
+import logging
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+WORKLOADS_DIR = Path(__file__).resolve().parent
+MOONCAKE_BLOCK_SIZE = 512
+PERCENTILES = (50, 90, 99)
+
+
+@dataclass
+class Request:
+    # Send time in seconds from the start of the run
+    time: float
+    session: int
+    prompt_tokens: int
+    # Chained hashes of the full prompt blocks (equal hashes <=> equal prefixes)
+    blocks: List[int]
+    # Chained hashes of the full blocks of prompt + generated tokens, cached after the request
+    cached_blocks: List[int] = field(default_factory=list)
+    # max_tokens of the request
+    output_tokens: int = 0
+
+
+@dataclass
+class RecordedCall:
+    """A request exactly as the driver sent it (kept for compile_manifest.py)."""
+    time: float
+    session: int
+    messages: List[Dict[str, Any]]
+    answer: str
+    max_tokens: int
+    agent_id: Optional[int] = None
+
+
+def message_tokens(messages: List[Dict[str, Any]]) -> List[str]:
+    tokens = []
+    for message in messages:
+        content = message.get("content") or ""
+        tokens.append(f"{message.get('role', 'user')}:")
+        tokens.extend(str(content).split())
+    return tokens
+
+
+def block_hashes(tokens: List[str], block_size: int) -> List[int]:
+    """Chained hashes of the full blocks (a trailing partial block is never cached)."""
+    hashes = []
+    prev = 0
+    for start in range(0, len(tokens) - block_size + 1, block_size):
+        prev = hash((prev, tuple(tokens[start:start + block_size])))
+        hashes.append(prev)
+    return hashes
+
+
+def chat_request(time: float, session: int, messages: List[Dict[str, Any]], answer: str,
+                 block_size: int, output_tokens: int) -> Request:
+    prompt = message_tokens(messages)
+    completed = message_tokens(list(messages) + [{"role": "assistant", "content": answer}])
+    return Request(time, session, len(prompt), block_hashes(prompt, block_size),
+                   block_hashes(completed, block_size), output_tokens)
+
+
+# ------------------------------------------------------------------ request streams
+
+class RecordingExecutor:
+    """
+    Stands in for a driver's RequestExecutor: records every request and answers it
+    instantly with a placeholder of max_tokens unique tokens. The answers are delivered
+    by complete_pending() after the driver's step, as the real callbacks would be.
+    With keep_messages the raw messages are kept (calls) instead of their block hashes.
+    """
+
+    def __init__(self, module, block_size: int, agentic: bool = False, keep_messages: bool = False):
+        self.module = module
+        self.block_size = block_size
+        self.agentic = agentic
+        self.keep_messages = keep_messages
+        self.now = 0.0
+        self.start_time = 0.0
+        self.requests: List[Request] = []
+        self.calls: List[RecordedCall] = []
+        self._pending = []
+
+    def launch_request(self, messages, max_tokens: int, finish_callback, *args, extra_headers=None):
+        if not self.agentic:
+            # synthetic passes its ChatHistory
+            messages = messages.get_messages_for_openai()
+        session = int((extra_headers or {}).get("x-user-id", 0))
+        answer = " ".join(f"r{len(self.requests) + len(self.calls)}t{i}" for i in range(max_tokens))
+        prompt_tokens = 0
+        if self.keep_messages:
+            # the drivers keep appending to their history list
+            self.calls.append(RecordedCall(self.now - self.start_time, session, list(messages), answer,
+                                           max_tokens, args[0] if self.agentic else None))
+        else:
+            self.requests.append(chat_request(self.now - self.start_time, session, messages,
+                                              answer, self.block_size, max_tokens))
+            prompt_tokens = self.requests[-1].prompt_tokens
+        response = dict(body=answer, ttft=0.0, generation_time=0.0,
+                        prompt_tokens=prompt_tokens, generation_tokens=max_tokens,
+                        launch_time=self.now, finish_time=self.now)
+        if self.agentic:
+            agent_id = args[0]
+            self._pending.append(lambda: finish_callback(self.module.Response(**response, agentID=agent_id),
+                                                         agent_id))
+        else:
+            self._pending.append(lambda: finish_callback(self.module.Response(**response)))
+
+    def complete_pending(self) -> None:
+        pending, self._pending = self._pending, []
+        for callback in pending:
+            callback()
+
+
+def drive_manager(manager, executor: RecordingExecutor, duration: float,
+                  step_interval: float = 0.1) -> List[Request]:
+    """Step a driver's UserSessionManager in simulated time, as its run_benchmark() does."""
+    # The managers compare against wall-clock timestamps, keep that magnitude
+    executor.start_time = executor.now = 1e9
+    while executor.now - executor.start_time < duration:
+        continue_flag = manager.step(executor.now, executor)
+        executor.complete_pending()
+        if continue_flag is False:
+            break
+        executor.now += step_interval
+    return executor.requests
+
+
+def synthetic_manager(config: Dict[str, Any], qps: Optional[float]):
+    """(driver module, UserSessionManager) of the synthetic workload."""
+    from sweep import load_driver
+    module = load_driver(WORKLOADS_DIR / 'synthetic' / 'multi-round-qa.py')
+    workload_config = module.WorkloadConfig(
+        num_users=config['NUM_USERS'],
+        system_prompt_len=config['SYSTEM_PROMPT'],
+        user_info_len=config['CHAT_HISTORY'],
+        answer_len=config['ANSWER_LEN'],
+        num_rounds=config['NUM_ROUNDS'],
+        qps=qps if qps is not None else config['QPS'][0],
+        model="analyzer",
+        enable_user_id=False,
+    )
+    manager = module.UserSessionManager(workload_config, init_user_id=1,
+                                        use_sharegpt=bool(config.get('USE_SHAREGPT', False)))
+    return module, manager
+
+
+def synthetic_requests(config: Dict[str, Any], qps: Optional[float], duration: float,
+                       block_size: int) -> List[Request]:
+    module, manager = synthetic_manager(config, qps)
+    return drive_manager(manager, RecordingExecutor(module, block_size), duration)
+
+
+def agentic_manager(config: Dict[str, Any], trace_file: Optional[Path], new_user_interval: Optional[float],
+                    whole_history: bool):
+    """(driver module, UserSessionManager) of the agentic workload."""
+    from sweep import load_driver
+    module = load_driver(WORKLOADS_DIR / 'agentic' / 'agentic-qa.py')
+    if new_user_interval is None:
+        new_user_interval = (config.get('NEW_USER_INTERVALS') or [2])[0]
+    workload_config = module.WorkloadConfig(
+        system_prompt_len=config.get('SYSTEM_PROMPT', 0),
+        user_info_len=config.get('CHAT_HISTORY', 0),
+        answer_len=config.get('ANSWER_LEN', 0),
+        num_rounds=config.get('NUM_ROUNDS', 0),
+        model=["analyzer"],
+        user_request_interval=1,
+        new_user_interval=new_user_interval,
+        num_agents=config.get('NUM_AGENTS', 1),
+        whole_history=whole_history,
+        trace_file=str(trace_file) if trace_file else None,
+    )
+    return module, module.UserSessionManager(workload_config)
+
+
+def agentic_requests(config: Dict[str, Any], trace_file: Optional[Path], new_user_interval: Optional[float],
+                     whole_history: bool, duration: float, block_size: int) -> List[Request]:
+    module, manager = agentic_manager(config, trace_file, new_user_interval, whole_history)
+    return drive_manager(manager, RecordingExecutor(module, block_size, agentic=True), duration)
+
+
+def sharegpt_requests(path: Path, qps: float, block_size: int) -> List[Request]:
+    with open(path, "r", encoding="utf-8") as f:
+        prompts = json.load(f)
+    requests = []
+    for i, entry in enumerate(prompts):
+        # sharegpt-qa.py prefixes every prompt with the QPS to avoid hits across runs
+        messages = [{"role": "user", "content": f"{qps} {entry['input']}"}]
+        requests.append(chat_request(i / qps, i, messages, "", block_size, entry["output_length"]))
+    return requests
+
+
+def mooncake_requests(path: Path, prefill_only: bool = True) -> List[Request]:
+    # mooncake-qa.py replays the trace prefill-only (max_tokens 1) by default
+    requests = []
+    with open(path, "r", encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            # hash_ids already identify prefixes; single-turn, so the output is never reused
+            requests.append(Request(record["timestamp"] / 1000, i, record["input_length"],
+                                    list(record["hash_ids"]), list(record["hash_ids"]),
+                                    1 if prefill_only else record["output_length"]))
+    return requests
+
+
+def load_requests(args: argparse.Namespace) -> List[Request]:
+    """The request stream selected on the command line (shared with the cache simulator)."""
+    logging.disable(logging.INFO)
+    config = json.loads(args.config) if getattr(args, 'config', None) else {}
+    if args.workload == 'synthetic':
+        requests = synthetic_requests(config, args.qps, args.time, args.block_size)
+    elif args.workload == 'agentic':
+        requests = agentic_requests(config, args.trace_file, args.new_user_interval,
+                                    args.whole_history, args.time, args.block_size)
+    elif args.workload == 'sharegpt':
+        requests = sharegpt_requests(args.file, args.qps or 1.0, args.block_size)
+    else:
+        requests = mooncake_requests(args.file)
+    logging.disable(logging.NOTSET)
+    return sorted(requests, key=lambda r: r.time)
+
+
+def block_size_of(args: argparse.Namespace) -> int:
+    return MOONCAKE_BLOCK_SIZE if args.workload == 'mooncake' else args.block_size
+
+
+# ------------------------------------------------------------------ analysis
+
+class Fenwick:
+
+    def __init__(self, size: int):
+        self.tree = [0] * (size + 1)
+
+    def add(self, index: int, delta: int) -> None:
+        index += 1
+        while index < len(self.tree):
+            self.tree[index] += delta
+            index += index & -index
+
+    def prefix_sum(self, index: int) -> int:
+        """Sum of positions [0, index)."""
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+
+def analyze(requests: List[Request], block_size: int) -> Dict[str, Any]:
+    """Prefix-reuse statistics of a request stream (sorted by time)."""
+    num_accesses = sum(len(r.blocks) + max(len(r.cached_blocks) - len(r.blocks), 0) for r in requests)
+    # Stack distances in O(log n) each: the tree marks the latest access of every block
+    fenwick = Fenwick(num_accesses)
+    last_access: Dict[int, int] = {}
+    last_time: Dict[int, float] = {}
+    reused = set()
+    stack_distances = []
+    reuse_times = []
+    position = 0
+
+    total_tokens = 0
+    hit_tokens = 0
+    requests_with_hit = 0
+
+    def touch(block: int, time: float) -> None:
+        nonlocal position
+        previous = last_access.get(block)
+        if previous is not None:
+            fenwick.add(previous, -1)
+        fenwick.add(position, 1)
+        last_access[block] = position
+        last_time[block] = time
+        position += 1
+
+    for request in requests:
+        total_tokens += request.prompt_tokens
+        num_hit = 0
+        for block in request.blocks:
+            previous = last_access.get(block)
+            if previous is None:
+                break
+            num_hit += 1
+            # distinct blocks touched since, plus the block itself
+            stack_distances.append(fenwick.prefix_sum(position) - fenwick.prefix_sum(previous + 1) + 1)
+            reuse_times.append(request.time - last_time[block])
+            reused.add(block)
+        hit_tokens += min(num_hit * block_size, request.prompt_tokens)
+        requests_with_hit += num_hit > 0
+
+        for block in request.blocks:
+            touch(block, request.time)
+        for block in request.cached_blocks[len(request.blocks):]:
+            touch(block, request.time)
+
+    distances_tokens = np.array(stack_distances, dtype=float) * block_size
+    reuse_times = np.array(reuse_times, dtype=float)
+    duration = requests[-1].time - requests[0].time if requests else 0.0
+
+    def percentiles(values: np.ndarray) -> Dict[str, float]:
+        if len(values) == 0:
+            return {f"p{p}": float("nan") for p in PERCENTILES}
+        return {f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES}
+
+    # histogram of the LRU capacity (tokens) each hit needs, in powers of two
+    histogram = {}
+    if len(distances_tokens):
+        edges = 2 ** np.arange(int(np.log2(block_size)), int(np.ceil(np.log2(distances_tokens.max()))) + 1)
+        counts, _ = np.histogram(distances_tokens, bins=np.append(edges, np.inf))
+        histogram = {int(edge): int(count) for edge, count in zip(edges, counts)}
+
+    return {
+        "requests": len(requests),
+        "duration_s": duration,
+        "block_size": block_size,
+        "prompt_tokens": int(total_tokens),
+        "max_hit_ratio": hit_tokens / total_tokens if total_tokens else float("nan"),
+        "hit_tokens": int(hit_tokens),
+        "requests_with_hit_ratio": requests_with_hit / len(requests) if requests else float("nan"),
+        "unique_tokens": len(last_access) * block_size,
+        "reused_unique_tokens": len(reused) * block_size,
+        "reuse_distance_tokens": percentiles(distances_tokens),
+        "reuse_time_s": percentiles(reuse_times),
+        "reuse_distance_histogram": histogram,
+    }
+
+
+def report(workload: str, stats: Dict[str, Any]) -> str:
+    lines = [
+        "============ Prefix Reuse Analysis ============",
+        f"Workload:                                {workload}",
+        f"Requests:                                {stats['requests']}",
+        f"Duration (s):                            {stats['duration_s']:.2f}",
+        f"Block size (tokens):                     {stats['block_size']}",
+        f"Prompt tokens:                           {stats['prompt_tokens']}",
+        f"Max prefix-cache hit ratio (%):          {stats['max_hit_ratio'] * 100:.2f}",
+        f"Requests with a prefix hit (%):          {stats['requests_with_hit_ratio'] * 100:.2f}",
+        "------------------Working Set------------------",
+        f"Unique tokens:                           {stats['unique_tokens']}",
+        f"Unique tokens reused at least once:      {stats['reused_unique_tokens']}",
+        "----------------Reuse Distance-----------------",
+    ]
+    for p in PERCENTILES:
+        label = f"P{p} reuse distance (tokens):"
+        lines.append(f"{label:<41}{stats['reuse_distance_tokens'][f'p{p}']:.0f}")
+    for p in PERCENTILES:
+        label = f"P{p} reuse time (s):"
+        lines.append(f"{label:<41}{stats['reuse_time_s'][f'p{p}']:.2f}")
+    if stats['reuse_distance_histogram']:
+        lines.append("LRU capacity needed (tokens)       block hits")
+        total = sum(stats['reuse_distance_histogram'].values())
+        cumulative = 0
+        for edge, count in stats['reuse_distance_histogram'].items():
+            cumulative += count
+            lines.append(f"  < {edge * 2:<31}{count:>10} ({cumulative / total * 100:6.2f}% cumulative)")
+    lines.append("===============================================")
+    return "\n".join(lines)
+
+
+def add_workload_args(parser: argparse.ArgumentParser) -> None:
+    """Arguments selecting a workload's request stream (also used by the cache simulator)."""
+    parser.add_argument("workload", choices=["synthetic", "sharegpt", "agentic", "mooncake"])
+    parser.add_argument("--config", type=str, default=None,
+                        help="Workload entry of bench-spec.yaml as JSON (synthetic, agentic)")
+    parser.add_argument("--qps", type=float, default=None,
+                        help="QPS (synthetic: default the first QPS of --config; sharegpt: default 1)")
+    parser.add_argument("--time", type=float, default=100,
+                        help="Simulated run length in seconds (synthetic, agentic; default: %(default)s)")
+    parser.add_argument("--file", type=Path, default=None,
+                        help="run.json (sharegpt) or conversation_trace.jsonl (mooncake)")
+    parser.add_argument("--trace-file", type=Path, default=None, help="Agentic trace file (JSONL)")
+    parser.add_argument("--new-user-interval", type=float, default=None,
+                        help="Agentic new-user interval (default: the first NEW_USER_INTERVALS of --config)")
+    parser.add_argument("--whole-history", action="store_true", default=False,
+                        help="Agentic sessions keep the whole history")
+    parser.add_argument("--block-size", type=int, default=16,
+                        help="Prefix-cache block size in tokens, 1 for a token-level trie "
+                        "(mooncake: the trace's 512-token hash_ids; default: %(default)s)")
+
+
+def resolve_workload_args(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    """Validate the workload arguments; paths become absolute (the drivers change directory)."""
+    defaults = {
+        'sharegpt': WORKLOADS_DIR / 'sharegpt' / 'run.json',
+        'mooncake': WORKLOADS_DIR / 'mooncake' / 'conversation_trace.jsonl',
+    }
+    if args.file is None and args.workload in defaults:
+        args.file = defaults[args.workload]
+    if args.file is not None:
+        args.file = args.file.resolve()
+    if args.trace_file is not None:
+        args.trace_file = args.trace_file.resolve()
+    if args.workload == 'synthetic' and args.config is None:
+        parser.error("synthetic needs --config")
+    if args.workload == 'agentic' and args.config is None and args.trace_file is None:
+        parser.error("agentic needs --config or --trace-file")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline prefix-reuse analysis of a workload's request stream.")
+    add_workload_args(parser)
+    parser.add_argument("--output", type=str, default=None, help="Also write the statistics to this JSON file")
+    args = parser.parse_args()
+    resolve_workload_args(parser, args)
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+    output = Path(args.output).resolve() if args.output else None
+    sys.path.insert(0, str(WORKLOADS_DIR))
+    requests = load_requests(args)
+    stats = analyze(requests, block_size_of(args))
+    print(report(args.workload, stats))
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump({"workload": args.workload, **stats}, f, indent=2)
+        print(f"Statistics written to {output}")
+
+
+if __name__ == "__main__":
+    main()
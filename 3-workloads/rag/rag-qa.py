@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+rag-qa.py – retrieval-augmented QA with controllable document-chunk reuse
+=========================================================================
+
+Every query carries K chunks retrieved from a corpus of N chunks, followed by a short
+question. The chunks are drawn without replacement from a Zipf(s) popularity
+distribution, so a few chunks are retrieved by most queries and the long tail rarely:
+  - a larger --zipf-s concentrates the retrievals on fewer chunks (more reuse)
+  - the chunks are listed in corpus order, unless --shuffle-prob shuffles them, in which
+    case the same chunks reappear at other positions: reused chunks, but no reused prefix
+
+The queries are sent open loop at a fixed QPS. Next to the columns of the other
+workloads, every request records how many of its chunks earlier queries already carried
+(`reused_chunks`) and how many of its leading chunks an earlier query started with
+(`prefix_reused_chunks`, what prefix caching can reuse), and the summary reports TTFT
+split by both reuse degrees.
+
+  python3 rag-qa.py --num-chunks 2000 --chunks-per-query 5 --zipf-s 1.1 --shuffle-prob 0.5 \\
+      --qps 2 --num-queries 600 --model <MODEL> --base-url http://localhost:30080/v1/
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import openai
+import pandas as pd
+
+from utils import (
+    AsyncLoopWrapper,
+    ConvergenceMonitor,
+    MetricsExporter,
+    SteadyStateWarmup,
+    TokenCounter,
+    add_convergence_args,
+    add_engine_metrics_args,
+    add_generation_mode_args,
+    add_metrics_args,
+    add_warmup_args,
+    build_convergence_monitor,
+    build_warmup,
+    cached_prompt_tokens,
+    generation_kwargs,
+    init_logger,
+    start_engine_scraper,
+    start_metrics_exporter,
+    write_warmup_report,
+)
+
+logger = init_logger(__name__, logging.INFO)
+
+# ---------------------------------------------------------------------------
+# CLI helpers
+# ---------------------------------------------------------------------------
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Send RAG queries with Zipf-distributed document-chunk reuse to an "
+                    "OpenAI-compatible endpoint and collect latency statistics.")
+
+    parser.add_argument("--base-url", required=True,
+                        help="Base URL of the OpenAI-compatible server")
+    parser.add_argument("--model", required=True,
+                        help="Model name (e.g. gpt-4o-mini)")
+    parser.add_argument("--qps", type=float, required=True,
+                        help="Target queries per second")
+    parser.add_argument("--num-chunks", type=int, default=1000,
+                        help="Number of chunks in the corpus (default: %(default)s)")
+    parser.add_argument("--chunk-len", type=int, default=512,
+                        help="Length of every chunk in tokens (default: %(default)s)")
+    parser.add_argument("--chunks-per-query", type=int, default=5,
+                        help="Chunks retrieved by every query (default: %(default)s)")
+    parser.add_argument("--zipf-s", type=float, default=1.0,
+                        help="Exponent of the Zipf chunk popularity, 0 = uniform (default: %(default)s)")
+    parser.add_argument("--shuffle-prob", type=float, default=0.0,
+                        help="Probability that a query lists its chunks in random order instead of "
+                        "corpus order (default: %(default)s)")
+    parser.add_argument("--question-len", type=int, default=32,
+                        help="Length of the question after the chunks in tokens (default: %(default)s)")
+    parser.add_argument("--answer-len", type=int, default=100,
+                        help="max_tokens of every query (default: %(default)s)")
+    parser.add_argument("--num-queries", type=int, default=1000,
+                        help="Number of queries to send (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed of the chunk retrievals (default: %(default)s)")
+    parser.add_argument("--corpus-tag", default=None,
+                        help="Tag heading every chunk, distinct tags give disjoint corpora "
+                        "(default: the QPS, to avoid cache hits across runs)")
+    parser.add_argument("--output", default="../../4-latest-results/rag-summary.csv",
+                        help="Output CSV filename (default: %(default)s)")
+    parser.add_argument("--log-interval", type=int, default=30,
+                        help="Seconds between progress logs (default: %(default)s)")
+    parser.add_argument("--time", type=int,
+                        help="Maximum time to run the benchmark in seconds")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Enable DEBUG logging")
+    add_convergence_args(parser)
+    add_metrics_args(parser)
+    add_engine_metrics_args(parser)
+    add_generation_mode_args(parser)
+    add_warmup_args(parser)
+    args = parser.parse_args()
+    if not 0 < args.chunks_per_query <= args.num_chunks:
+        parser.error("--chunks-per-query must be between 1 and --num-chunks")
+    if not 0 <= args.shuffle_prob <= 1:
+        parser.error("--shuffle-prob must be between 0 and 1")
+    return args
+
+# ---------------------------------------------------------------------------
+# Corpus and queries
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Query:
+    chunk_ids: List[int]
+    messages: List[Dict[str, Any]]
+    max_tokens: int
+    # chunks carried by an earlier query, anywhere in its prompt
+    reused_chunks: int
+    # leading chunks an earlier query started with, in the same order
+    prefix_reused_chunks: int
+
+
+class Corpus:
+    """N chunks of chunk_len tokens, retrieved K at a time by Zipf popularity."""
+
+    def __init__(self, num_chunks: int, chunk_len: int, zipf_s: float, tag: str):
+        self.num_chunks = num_chunks
+        self.chunk_len = chunk_len
+        self.tag = tag
+        weights = 1.0 / np.arange(1, num_chunks + 1) ** zipf_s
+        self.popularity = weights / weights.sum()
+
+    def chunk_text(self, chunk_id: int) -> str:
+        return f"[{self.tag} document {chunk_id}] " + " ".join(["hi"] * self.chunk_len)
+
+    def retrieve(self, rng: np.random.Generator, k: int, shuffle_prob: float) -> List[int]:
+        chunk_ids = rng.choice(self.num_chunks, size=k, replace=False, p=self.popularity)
+        if rng.random() < shuffle_prob:
+            rng.shuffle(chunk_ids)
+        else:
+            chunk_ids.sort()
+        return [int(chunk_id) for chunk_id in chunk_ids]
+
+
+def build_queries(args: argparse.Namespace, corpus: Corpus, num_queries: Optional[int] = None) -> List[Query]:
+    """All queries in send order (--num-queries by default), with their reuse degrees relative to the earlier ones."""
+    rng = np.random.default_rng(args.seed)
+    seen_chunks = set()
+    seen_prefixes = set()
+    queries = []
+    for i in range(args.num_queries if num_queries is None else num_queries):
+        chunk_ids = corpus.retrieve(rng, args.chunks_per_query, args.shuffle_prob)
+        reused = sum(chunk_id in seen_chunks for chunk_id in chunk_ids)
+        prefix_reused = 0
+        while prefix_reused < len(chunk_ids) and tuple(chunk_ids[:prefix_reused + 1]) in seen_prefixes:
+            prefix_reused += 1
+        seen_chunks.update(chunk_ids)
+        seen_prefixes.update(tuple(chunk_ids[:n]) for n in range(1, len(chunk_ids) + 1))
+
+        documents = "\n\n".join(corpus.chunk_text(chunk_id) for chunk_id in chunk_ids)
+        question = f"Question {i}: " + " ".join(["hi"] * args.question_len)
+        queries.append(Query(
+            chunk_ids=chunk_ids,
+            messages=[{"role": "user", "content": f"{documents}\n\n{question}"}],
+            max_tokens=args.answer_len,
+            reused_chunks=reused,
+            prefix_reused_chunks=prefix_reused,
+        ))
+    return queries
+
+# ---------------------------------------------------------------------------
+# Low-level request handling
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Response:
+    body: str
+    ttft: float
+    generation_time: float
+    prompt_tokens: int
+    generation_tokens: int
+    launch_time: float
+    finish_time: float
+    # prompt tokens served from the engine's prefix cache, None if not reported
+    cached_tokens: Optional[int] = None
+    # the stream carried no usage, the token counts come from the local tokenizer
+    tokens_counted_locally: bool = False
+
+
+class RequestExecutor:
+    """Thin wrapper over OpenAI async client that measures latency."""
+
+    def __init__(self, base_url: str, api_key: str, model: str, generation_mode: str = "mixed"):
+        self.client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url)
+        self.model = model
+        self.generation_mode = generation_mode
+        self.loop = AsyncLoopWrapper.GetOrStartLoop()
+
+    async def _async_request(self, messages, max_tokens: int) -> Response:
+        start = time.time()
+        first_token: Optional[float] = None
+        chunks = []
+
+        try:
+            stream = await self.client.chat.completions.create(
+                messages=messages,
+                model=self.model,
+                temperature=0,
+                stream=True,
+                **generation_kwargs(self.generation_mode, max_tokens),
+                stream_options={"include_usage": True},
+            )
+
+            usage = None
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if first_token is None:
+                        first_token = time.time()
+                    chunks.append(delta)
+        except Exception as e:
+            logger.error(f"Error in request: {str(e)}")
+            MetricsExporter.RequestFinished(None)
+            raise
+
+        finish = time.time()
+        body = "".join(chunks)
+        if usage is not None:
+            prompt_tokens, generation_tokens = usage.prompt_tokens, usage.completion_tokens
+        else:
+            prompt_tokens, generation_tokens = await TokenCounter.Count(self.model, messages, body)
+        return Response(
+            body=body,
+            ttft=(first_token or finish) - start,
+            generation_time=finish - (first_token or start),
+            prompt_tokens=prompt_tokens,
+            generation_tokens=generation_tokens,
+            launch_time=start,
+            finish_time=finish,
+            cached_tokens=cached_prompt_tokens(usage) if usage else None,
+            tokens_counted_locally=usage is None,
+        )
+
+    def launch_request(self, query: Query, on_finish) -> None:
+        fut = asyncio.run_coroutine_threadsafe(
+            self._async_request(query.messages, query.max_tokens), self.loop)
+        fut.add_done_callback(lambda f: on_finish(f.result()))
+
+# ---------------------------------------------------------------------------
+# Benchmark runner
+# ---------------------------------------------------------------------------
+
+class BenchmarkRunner:
+    """Dispatch queries at the desired QPS and collect latency metrics."""
+
+    def __init__(self, queries: List[Query], executor: RequestExecutor, qps: float,
+                 time_limit: Optional[int] = None, log_interval: int = 30,
+                 convergence: Optional[ConvergenceMonitor] = None):
+        self.queries = queries
+        self.executor = executor
+        self.qps = qps
+        self.time_limit = time_limit
+        self.log_interval = log_interval
+        self.convergence = convergence
+        # (query index, response, scheduled time, send time)
+        self.results: List[Tuple[int, Response, float, float]] = []
+        self._next_idx = 0
+        self.start_time = time.time()
+
+    def _on_finish(self, idx: int, resp: Response, scheduled: float, sent: float):
+        MetricsExporter.RequestFinished(resp)
+        self.results.append((idx, resp, scheduled, sent))
+
+    def run(self) -> pd.DataFrame:
+        logger.info("Benchmark started: %d queries at %.2f QPS", len(self.queries), self.qps)
+        last_log = self.start_time
+
+        while self._next_idx < len(self.queries):
+            now = time.time()
+            if self.time_limit is not None and now - self.start_time > self.time_limit:
+                logger.info(f"Time limit of {self.time_limit} seconds reached, stopping benchmark")
+                break
+
+            if self.convergence is not None and self.convergence.converged(
+                    self._results_df, self.start_time, now):
+                logger.info("Metrics converged, stopping benchmark")
+                break
+
+            if now - last_log > self.log_interval:
+                logger.info(f"Sent {self._next_idx} queries, {len(self.results)} finished")
+                last_log = now
+
+            scheduled = self.start_time + self._next_idx / self.qps
+            if now < scheduled:
+                time.sleep(0.001)
+                continue
+
+            idx = self._next_idx
+            sent = time.time()
+            MetricsExporter.RequestSent(scheduled, sent)
+            self.executor.launch_request(
+                self.queries[idx],
+                lambda resp, idx=idx, scheduled=scheduled, sent=sent: self._on_finish(idx, resp, scheduled, sent))
+            self._next_idx += 1
+
+        AsyncLoopWrapper.WaitLoop()  # wait for inflight requests
+        logger.info("All requests completed")
+
+        return self._results_df().sort_values("launch_time").reset_index(drop=True)
+
+    def _results_df(self) -> pd.DataFrame:
+        results = list(self.results)  # snapshot, callbacks append concurrently
+        queries = [self.queries[idx] for idx, _, _, _ in results]
+        return pd.DataFrame({
+            "prompt_tokens": [r.prompt_tokens for _, r, _, _ in results],
+            "generation_tokens": [r.generation_tokens for _, r, _, _ in results],
+            "cached_tokens": pd.array([r.cached_tokens for _, r, _, _ in results], dtype="Int64"),
+            "tokens_counted_locally": [r.tokens_counted_locally for _, r, _, _ in results],
+            "ttft": [r.ttft for _, r, _, _ in results],
+            "generation_time": [r.generation_time for _, r, _, _ in results],
+            "query_id": [idx for idx, _, _, _ in results],
+            "chunk_ids": [" ".join(map(str, q.chunk_ids)) for q in queries],
+            "reused_chunks": [q.reused_chunks for q in queries],
+            "prefix_reused_chunks": [q.prefix_reused_chunks for q in queries],
+            "launch_time": [r.launch_time for _, r, _, _ in results],
+            "finish_time": [r.finish_time for _, r, _, _ in results],
+            # intended send time on the fixed-QPS grid, when the request was handed to
+            # the executor and how long the event loop took to start it
+            "scheduled_time": [scheduled for _, _, scheduled, _ in results],
+            "send_time": [sent for _, _, _, sent in results],
+            "dispatch_delay": [r.launch_time - sent for _, r, _, sent in results],
+            # the dispatcher catches up instead of skipping slots
+            "missed_slots": [0] * len(results),
+        })
+
+def warmup_engine(args: argparse.Namespace, executor: RequestExecutor,
+                  warmup: SteadyStateWarmup) -> Dict[str, Any]:
+    """
+    Warm the engine up at the run's QPS with queries of the same shape over a corpus of
+    its own (tag "warmup"): the run's chunks must not be cached beforehand, or its reuse
+    degrees would not describe what the engine reused. Stops once TTFT and throughput are
+    steady or after warmup.max_time seconds. Returns the warmup report.
+    """
+    corpus = Corpus(args.num_chunks, args.chunk_len, args.zipf_s, "warmup")
+    queries = build_queries(args, corpus, int(warmup.max_time * args.qps) + 1)
+    logger.info("Warming up the engine with queries over the warmup corpus")
+    runner = BenchmarkRunner(queries, executor, args.qps, warmup.max_time, args.log_interval, warmup)
+    df = runner.run()
+    return warmup.report(df, runner.start_time, time.time())
+
+# ---------------------------------------------------------------------------
+# Summary helpers
+# ---------------------------------------------------------------------------
+
+def log_summary(df: pd.DataFrame):
+    duration = df["finish_time"].max() - df["launch_time"].min()
+    throughput = len(df) / duration if duration > 0 else 0
+    logger.info("Completed %d requests in %.2fs (%.2f QPS)", len(df), duration, throughput)
+    logger.info("Average TTFT: %.3fs", df["ttft"].mean())
+    for reused, group in df.groupby("reused_chunks"):
+        logger.info("  %d reused chunks: %d requests, average TTFT %.3fs", reused, len(group), group["ttft"].mean())
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def main():
+    args = parse_args()
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+
+    try:
+        corpus = Corpus(args.num_chunks, args.chunk_len, args.zipf_s,
+                        args.corpus_tag if args.corpus_tag is not None else str(args.qps))
+        queries = build_queries(args, corpus)
+        distinct = len({chunk_id for query in queries for chunk_id in query.chunk_ids})
+        logger.info(f"Built {len(queries)} queries over {distinct} of {args.num_chunks} chunks")
+
+        executor = RequestExecutor(args.base_url, "EMPTY", args.model, args.generation_mode)
+        warmup = build_warmup(args)
+        warmup_report = warmup_engine(args, executor, warmup) if warmup is not None else None
+
+        start_metrics_exporter(args, "rag")
+        scraper = start_engine_scraper(args)
+
+        runner = BenchmarkRunner(queries, executor, args.qps, args.time, args.log_interval,
+                                 build_convergence_monitor(args))
+        df = runner.run()
+        if scraper is not None:
+            scraper.stop()
+
+        df.to_csv(args.output, index=False)
+        write_warmup_report(warmup_report, args.output)
+        logger.info(f"Results written to {args.output}")
+
+        log_summary(df)
+    finally:
+        # Always stop the asyncio loop
+        AsyncLoopWrapper.StopLoop()
+        logger.info("Benchmark completed and asyncio loop stopped")
+
+if __name__ == "__main__":
+    main()
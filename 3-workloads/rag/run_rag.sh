@@ -0,0 +1,93 @@
+#!/bin/bash
+
+# Get the directory where this script is located
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+PROJECT_ROOT="$( cd "$SCRIPT_DIR/../../" && pwd )"
+cd "$SCRIPT_DIR"
+
+if [[ $# -lt 11 ]]; then
+    echo "Usage: $0 <model> <base url> <save file key> <num chunks> <chunk len> <chunks per query> <zipf s> <shuffle prob> <question len> <answer len> <num queries> [qps_values...]"
+    echo "Example: $0 meta-llama/Llama-3.1-8B-Instruct http://localhost:30080/v1/ rag-run1 1000 512 5 1.0 0.0 32 100 1000 1 2"
+    exit 1
+fi
+
+MODEL=$1
+BASE_URL=$2
+KEY=$3
+
+# CONFIGURATION
+NUM_CHUNKS=$4 # Chunks in the corpus
+CHUNK_LEN=$5 # Length of every chunk
+CHUNKS_PER_QUERY=$6 # Chunks retrieved by every query
+ZIPF_S=$7 # Exponent of the Zipf chunk popularity
+SHUFFLE_PROB=$8 # Probability of listing a query's chunks in random order
+QUESTION_LEN=$9 # Length of the question after the chunks
+ANSWER_LEN=${10} # Generation length per query
+NUM_QUERIES=${11} # Queries per benchmark
+
+# If QPS values are provided, use them; otherwise use default
+if [[ $# -gt 11 ]]; then
+    QPS_VALUES=("${@:12}")
+else
+    QPS_VALUES=(1)  # Default QPS value
+fi
+
+# Run length of each benchmark: by default all NUM_QUERIES queries are sent,
+# run-bench.py may set a --time limit or a convergence-driven stop (--converge-metrics ...)
+RUN_LENGTH_ARGS=${RUN_LENGTH_ARGS:-}
+
+# Prometheus metrics (set by run-bench.py): --metrics-port 9400 serves the load generator's,
+# --engine-metrics-interval 5 scrapes the engine's every 5s (default 1s, 0 disables)
+METRICS_ARGS=${METRICS_ARGS:-}
+
+# Generation mode of the benchmark runs (set by run-bench.py): prefill (max_tokens 1) or
+# decode (exactly the workload's output lengths), the workload's own output lengths by default
+GENERATION_MODE=${GENERATION_MODE:-}
+GENERATION_ARGS=${GENERATION_MODE:+--generation-mode $GENERATION_MODE}
+
+CORPUS_ARGS="--num-chunks $NUM_CHUNKS --chunk-len $CHUNK_LEN --chunks-per-query $CHUNKS_PER_QUERY --zipf-s $ZIPF_S --shuffle-prob $SHUFFLE_PROB --question-len $QUESTION_LEN --answer-len $ANSWER_LEN"
+
+run_benchmark() {
+    # $1: qps
+    # $2: output file
+
+    # the driver first warms the engine up on a corpus of its own (so the benchmark's chunks
+    # are not cached beforehand) until TTFT and throughput are steady, for at most 120 s
+    python3 ./rag-qa.py \
+        --qps "$1" \
+        --model "$MODEL" \
+        --base-url "$BASE_URL" \
+        --output "$2" \
+        --log-interval 30 \
+        $CORPUS_ARGS \
+        --num-queries "$NUM_QUERIES" \
+        --warmup-time 120 \
+        $RUN_LENGTH_ARGS \
+        $METRICS_ARGS \
+        $GENERATION_ARGS
+
+    sleep 10
+}
+
+for qps in "${QPS_VALUES[@]}"; do
+    output_file="../../4-latest-results/${KEY}_rag_output_${qps}.csv"
+    run_benchmark "$qps" "$output_file"
+
+    # Change to project root before running summarize.py
+    cd "$PROJECT_ROOT"
+    python3 "4-latest-results/post-processing/summarize.py" \
+        "${output_file#../../}" \
+        KEY="$KEY" \
+        WORKLOAD="rag" \
+        NUM_CHUNKS="$NUM_CHUNKS" \
+        CHUNK_LEN="$CHUNK_LEN" \
+        CHUNKS_PER_QUERY="$CHUNKS_PER_QUERY" \
+        ZIPF_S="$ZIPF_S" \
+        SHUFFLE_PROB="$SHUFFLE_PROB" \
+        QUESTION_LEN="$QUESTION_LEN" \
+        ANSWER_LEN="$ANSWER_LEN" \
+        QPS="$qps" \
+        ${GENERATION_MODE:+GENERATION_MODE=$GENERATION_MODE}
+    # Change back to script directory
+    cd "$SCRIPT_DIR"
+done
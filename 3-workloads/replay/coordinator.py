@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+coordinator.py – distributed replay across several load-generator nodes
+======================================================================
+
+One runner host cannot generate enough load for large multi-replica stacks. The
+coordinator splits a replay over --workers replay-qa.py processes, typically one per
+client node:
+  - every worker registers and gets the manifests and transformations, its shard of the
+    users (user_id % workers) and a common start time on the coordinator's clock (each
+    worker measures its clock offset to the coordinator first)
+  - after the run, every worker uploads its per-request CSV (its spool, already on the
+    coordinator's clock) and its TTFT / ITL / end-to-end latency histograms
+  - the coordinator merges the spools into one CSV with the columns of the other
+    workloads (plus `worker`) and prints the percentiles of the merged histograms
+
+  # on the runner host (the manifests must be readable at the same path on every node)
+  python3 coordinator.py --workers 4 --manifest /shared/mooncake.jsonl --copies 8 \\
+      --output ../../4-latest-results/<KEY>_replay_output_mooncake.csv
+  # on every client node
+  python3 replay-qa.py --coordinator http://<runner host>:30099 --base-url <URL> --model <MODEL>
+
+With --local-workers the coordinator starts the workers itself as local processes,
+standing in for the nodes.
+"""
+
+import argparse
+import json
+import logging
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from utils import (
+    LatencyHistogram,
+    add_convergence_args,
+    add_engine_metrics_args,
+    add_generation_mode_args,
+    add_metrics_args,
+    init_logger,
+    start_engine_scraper,
+)
+
+logger = init_logger(__name__, logging.INFO)
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PERCENTILES = (50, 90, 99)
+
+
+class Coordinator:
+    """Registration barrier, common start time and result collection of the workers."""
+
+    def __init__(self, num_workers: int, replay: Dict[str, Any], start_delay: float, spool_dir: Path):
+        self.num_workers = num_workers
+        self.replay = replay
+        self.start_delay = start_delay
+        self.spool_dir = spool_dir
+        self.condition = threading.Condition()
+        self.registered: List[str] = []
+        self.start_time: Optional[float] = None
+        self.spools: Dict[int, Path] = {}
+        self.reports: Dict[int, Dict[str, Any]] = {}
+
+    def register(self, host: str, timeout: float) -> Dict[str, Any]:
+        with self.condition:
+            if len(self.registered) >= self.num_workers:
+                raise ValueError(f"All {self.num_workers} workers already registered")
+            worker = len(self.registered)
+            self.registered.append(host)
+            logger.info(f"Worker {worker} registered from {host} "
+                        f"({len(self.registered)}/{self.num_workers})")
+            if len(self.registered) == self.num_workers:
+                self.start_time = time.time() + self.start_delay
+                self.condition.notify_all()
+            elif not self.condition.wait_for(lambda: self.start_time is not None, timeout):
+                raise TimeoutError("Not all workers registered in time")
+        return {"worker": worker, "num_workers": self.num_workers, "start_time": self.start_time,
+                "replay": self.replay}
+
+    def store_spool(self, worker: int, stream, length: int) -> None:
+        path = self.spool_dir / f"spool-{worker}.csv"
+        with open(path, "wb") as f:
+            remaining = length
+            while remaining > 0:
+                chunk = stream.read(min(remaining, 1 << 20))
+                if not chunk:
+                    break
+                f.write(chunk)
+                remaining -= len(chunk)
+        with self.condition:
+            self.spools[worker] = path
+            self.condition.notify_all()
+
+    def store_report(self, worker: int, report: Dict[str, Any]) -> None:
+        with self.condition:
+            self.reports[worker] = report
+            logger.info(f"Worker {worker} finished: {report['requests']} requests, {report['failed']} failed")
+            self.condition.notify_all()
+
+    def wait_done(self, timeout: float) -> bool:
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: len(self.reports) == self.num_workers and len(self.spools) == self.num_workers,
+                timeout)
+
+
+def make_handler(coordinator: Coordinator, register_timeout: float):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _reply(self, payload: Dict[str, Any], status: int = 200) -> None:
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self) -> bytes:
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        def _worker(self) -> int:
+            return int(self.path.rstrip("/").rsplit("/", 1)[1])
+
+        def do_GET(self):
+            if self.path == "/clock":
+                self._reply({"time": time.time()})
+            else:
+                self._reply({"error": "not found"}, 404)
+
+        def do_POST(self):
+            try:
+                if self.path == "/register":
+                    host = json.loads(self._body() or b"{}").get("host", self.client_address[0])
+                    self._reply(coordinator.register(host, register_timeout))
+                elif self.path.startswith("/histograms/"):
+                    coordinator.store_report(self._worker(), json.loads(self._body()))
+                    self._reply({})
+                else:
+                    self._reply({"error": "not found"}, 404)
+            except (ValueError, TimeoutError) as e:
+                self._reply({"error": str(e)}, 409)
+
+        def do_PUT(self):
+            if self.path.startswith("/spool/"):
+                coordinator.store_spool(self._worker(), self.rfile, int(self.headers.get("Content-Length", 0)))
+                self._reply({})
+            else:
+                self._reply({"error": "not found"}, 404)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return Handler
+
+
+def merge_spools(spools: List[Path], output: str) -> pd.DataFrame:
+    df = pd.concat([pd.read_csv(path) for path in spools], ignore_index=True)
+    df = df.sort_values("launch_time").reset_index(drop=True)
+    df.to_csv(output, index=False)
+    return df
+
+
+def merge_histograms(reports: List[Dict[str, Any]]) -> Dict[str, LatencyHistogram]:
+    merged: Dict[str, LatencyHistogram] = {}
+    for report in reports:
+        for name, data in report["histograms"].items():
+            histogram = LatencyHistogram.from_dict(data)
+            if name in merged:
+                merged[name].merge(histogram)
+            else:
+                merged[name] = histogram
+    return merged
+
+
+def print_summary(reports: Dict[int, Dict[str, Any]], hosts: List[str],
+                  histograms: Dict[str, LatencyHistogram]) -> None:
+    print("============ Distributed Replay ============")
+    for worker in sorted(reports):
+        print(f"Worker {worker:<3} {hosts[worker]:<24} {reports[worker]['requests']:>8} requests "
+              f"{reports[worker]['failed']:>5} failed")
+    print("-----------Merged latency (ms)-----------")
+    print(f"{'metric':<20}{'mean':>10}" + "".join(f"{f'P{p}':>10}" for p in PERCENTILES))
+    for name, histogram in histograms.items():
+        print(f"{name:<20}{histogram.mean() * 1000:>10.1f}"
+              + "".join(f"{histogram.quantile(p / 100) * 1000:>10.1f}" for p in PERCENTILES))
+    print("============================================")
+
+
+def start_local_workers(args: argparse.Namespace, url: str, spool_dir: Path) -> List[subprocess.Popen]:
+    workers = []
+    for i in range(args.workers):
+        cmd = [sys.executable, str(SCRIPT_DIR / "replay-qa.py"), "--coordinator", url,
+               "--base-url", args.base_url, "--model", *args.model,
+               "--output", str(spool_dir / f"local-worker-{i}.csv"), "--log-interval", str(args.log_interval)]
+        if args.metrics_port:
+            # one metrics endpoint per local worker
+            cmd += ["--metrics-port", str(args.metrics_port + i)]
+        workers.append(subprocess.Popen(cmd, cwd=SCRIPT_DIR))
+    return workers
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Coordinate a replay over several load-generator nodes.")
+    parser.add_argument("--workers", type=int, required=True, help="Number of replay-qa.py workers")
+    parser.add_argument("--manifest", required=True, nargs="+",
+                        help="Request manifest(s), readable at the same path on every worker")
+    parser.add_argument("--splice", choices=["overlay", "concat"], default="overlay")
+    parser.add_argument("--copies", type=int, default=1)
+    parser.add_argument("--copy-shift", type=float, default=0.0)
+    parser.add_argument("--time-scale", type=float, default=1.0)
+    parser.add_argument("--time", type=int, default=None, help="Maximum time to run the benchmark in seconds")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=30099)
+    parser.add_argument("--start-delay", type=float, default=5.0,
+                        help="Seconds between the last registration and the common start (default: %(default)s)")
+    parser.add_argument("--register-timeout", type=float, default=600.0,
+                        help="Seconds to wait for all workers to register (default: %(default)s)")
+    parser.add_argument("--output", default="../../4-latest-results/replay-summary.csv",
+                        help="Merged per-request CSV (default: %(default)s)")
+    parser.add_argument("--spool-dir", default=None,
+                        help="Where the workers' CSVs are stored (default: next to --output)")
+    parser.add_argument("--local-workers", action="store_true", default=False,
+                        help="Start the workers as local processes (needs --base-url and --model)")
+    parser.add_argument("--base-url", default=None,
+                        help="Base URL for the local workers, also locates the engine's /metrics")
+    parser.add_argument("--model", nargs="+", default=None, help="Model name(s) for the local workers")
+    parser.add_argument("--log-interval", type=int, default=30)
+    # accepted for the same command line as replay-qa.py, the workers cannot stop together on convergence
+    add_convergence_args(parser)
+    add_metrics_args(parser)
+    # the coordinator scrapes the engine for all workers, given --base-url or --engine-metrics-url
+    add_engine_metrics_args(parser)
+    add_generation_mode_args(parser)
+    args = parser.parse_args()
+    if args.converge_metrics:
+        logger.warning("Convergence-driven stops are not supported in distributed replays, "
+                       "the run is bounded by --time only")
+    if args.local_workers and (args.base_url is None or args.model is None):
+        parser.error("--local-workers needs --base-url and --model")
+    return args
+
+
+def main():
+    args = parse_args()
+    output = Path(args.output)
+    spool_dir = Path(args.spool_dir) if args.spool_dir else output.with_name(output.stem + "-spools")
+    spool_dir.mkdir(parents=True, exist_ok=True)
+    replay = {
+        "manifest": [str(Path(m).resolve()) for m in args.manifest],
+        "splice": args.splice, "copies": args.copies, "copy_shift": args.copy_shift,
+        "time_scale": args.time_scale, "time": args.time, "generation_mode": args.generation_mode,
+    }
+    coordinator = Coordinator(args.workers, replay, args.start_delay, spool_dir)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(coordinator, args.register_timeout))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{args.port}" if args.local_workers else f"http://{args.host}:{args.port}"
+    logger.info(f"Coordinator listening on {args.host}:{args.port}, waiting for {args.workers} workers")
+
+    local_workers = start_local_workers(args, url, spool_dir) if args.local_workers else []
+    scraper = start_engine_scraper(args) if args.base_url or args.engine_metrics_url else None
+    deadline = time.time() + args.register_timeout + args.start_delay + (args.time or 24 * 3600) + 600
+    try:
+        while not coordinator.wait_done(1.0):
+            if any(process.poll() not in (None, 0) for process in local_workers):
+                raise RuntimeError("A local worker failed")
+            if time.time() > deadline:
+                raise RuntimeError(f"Only {len(coordinator.reports)} of {args.workers} workers reported")
+        for process in local_workers:
+            process.wait()
+    finally:
+        for process in local_workers:
+            if process.poll() is None:
+                process.terminate()
+        server.shutdown()
+        if scraper is not None:
+            scraper.stop()
+
+    df = merge_spools([coordinator.spools[i] for i in sorted(coordinator.spools)], args.output)
+    logger.info(f"Merged {len(df)} requests of {args.workers} workers into {args.output}")
+    print_summary(coordinator.reports, coordinator.registered,
+                  merge_histograms([coordinator.reports[i] for i in sorted(coordinator.reports)]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,579 @@
+#!/usr/bin/env python3
+"""
+replay-qa.py – replays a request manifest (3-workloads/compile_manifest.py)
+==========================================================================
+
+Every request of the manifest is sent at its offset; requests marked after_previous wait
+for the previous response of their user as well, and get the conversation so far
+prepended as described by their `history`. The manifest is read as a stream, only the
+histories of the users are kept in memory.
+
+The stream can be transformed on the fly, still without materialising it:
+  --time-scale F       offsets multiplied by F (> 1 slows the trace down, < 1 compresses it)
+  --copies K           K copies of every manifest, copy k shifted by k * --copy-shift seconds,
+                       with its own users and prefix namespace (no cache hits across copies)
+  --manifest A B ...   several manifests spliced: merged by offset (--splice overlay) or
+                       one after the other (--splice concat)
+
+The whole replay runs on a single asyncio event loop: one dispatcher coroutine walks the
+manifest and one coroutine per active user chain sends its requests, without polling.
+The CSV has the columns of the other workloads, sorted by launch_time.
+
+With --coordinator the replay is one worker of a distributed run (coordinator.py): the
+coordinator assigns the manifests and a shard of the users, the common start time and
+the clock offset, and receives the per-request CSV and latency histograms afterwards.
+"""
+
+import argparse
+import asyncio
+import collections
+import heapq
+import itertools
+import json
+import logging
+import os
+import socket
+import time
+import urllib.request
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+import openai
+import pandas as pd
+
+from utils import (
+    ConvergenceMonitor,
+    LatencyHistogram,
+    MetricsExporter,
+    TokenCounter,
+    add_convergence_args,
+    add_engine_metrics_args,
+    add_generation_mode_args,
+    add_metrics_args,
+    build_convergence_monitor,
+    cached_prompt_tokens,
+    generation_kwargs,
+    init_logger,
+    start_engine_scraper,
+    start_metrics_exporter,
+)
+
+logger = init_logger(__name__, logging.INFO)
+
+# ---------------------------------------------------------------------------
+# CLI helpers
+# ---------------------------------------------------------------------------
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Replay a request manifest against an OpenAI-compatible "
+                    "endpoint and collect latency statistics.")
+
+    parser.add_argument("--manifest", nargs="+", default=None,
+                        help="Request manifest(s) written by compile_manifest.py (JSONL)")
+    parser.add_argument("--splice", choices=["overlay", "concat"], default="overlay",
+                        help="How several manifests are combined (default: %(default)s)")
+    parser.add_argument("--copies", type=int, default=1,
+                        help="Replay K copies of the trace with disjoint users and prefixes (default: %(default)s)")
+    parser.add_argument("--copy-shift", type=float, default=0.0,
+                        help="Seconds between the starts of consecutive copies (default: %(default)s)")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="Multiply all offsets, > 1 slows the trace down (default: %(default)s)")
+    parser.add_argument("--base-url", required=True,
+                        help="Base URL of the OpenAI-compatible server")
+    parser.add_argument("--model", required=True, nargs="+",
+                        help="Model name(s), indexed by the model_index of the requests")
+    parser.add_argument("--output", default="../../4-latest-results/replay-summary.csv",
+                        help="Output CSV filename (default: %(default)s)")
+    parser.add_argument("--log-interval", type=int, default=30,
+                        help="Seconds between progress logs (default: %(default)s)")
+    parser.add_argument("--time", type=int,
+                        help="Maximum time to run the benchmark in seconds")
+    parser.add_argument("--coordinator", default=None,
+                        help="URL of a coordinator.py: run as one worker of a distributed replay, "
+                        "the manifests, transformations and run length come from the coordinator")
+    parser.add_argument("--verbose", action="store_true",
+                        help="Enable DEBUG logging")
+    add_convergence_args(parser)
+    add_metrics_args(parser)
+    add_engine_metrics_args(parser)
+    add_generation_mode_args(parser)
+    args = parser.parse_args()
+    if args.manifest is None and args.coordinator is None:
+        parser.error("--manifest is required without --coordinator")
+    return args
+
+# ---------------------------------------------------------------------------
+# Manifest
+# ---------------------------------------------------------------------------
+
+def _parse_header(path: str, line: str) -> Dict[str, Any]:
+    header = json.loads(line) if line.strip() else {}
+    if "manifest_version" not in header:
+        raise ValueError(f"{path} is not a request manifest (missing header line)")
+    return header
+
+
+def read_manifest(path: str) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+    """(header, lazily parsed requests) of a manifest."""
+    f = open(path, "r", encoding="utf-8")
+    try:
+        header = _parse_header(path, f.readline())
+    except ValueError:
+        f.close()
+        raise
+
+    def entries() -> Iterator[Dict[str, Any]]:
+        with f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    return header, entries()
+
+
+def transformed_stream(entries: Iterator[Dict[str, Any]], time_scale: float, shift: float,
+                       slot: int, num_slots: int) -> Iterator[Dict[str, Any]]:
+    """Scaled and shifted offsets; slot > 0 gets its own users and prefix namespace."""
+    for entry in entries:
+        entry["offset"] = entry["offset"] * time_scale + shift
+        if num_slots > 1:
+            entry["user_id"] = entry["user_id"] * num_slots + slot
+        if slot > 0:
+            entry["namespace"] = f"c{slot}"
+        yield entry
+
+
+def open_manifests(paths: List[str], splice: str = "overlay", copies: int = 1, copy_shift: float = 0.0,
+                   time_scale: float = 1.0) -> Tuple[Dict[str, Any], Iterator[Dict[str, Any]]]:
+    """
+    (combined header, request stream) of the spliced and amplified manifests. Every copy
+    reads its manifest file independently and the streams are merged by offset, so the
+    memory use does not grow with the number of requests.
+    """
+    headers = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            headers.append(_parse_header(path, f.readline()))
+    num_slots = len(paths) * copies
+    streams = []
+    start = 0.0
+    for i, (path, header) in enumerate(zip(paths, headers)):
+        copy_streams = []
+        for k in range(copies):
+            _, entries = read_manifest(path)
+            copy_streams.append(transformed_stream(entries, time_scale, start + k * copy_shift,
+                                                   i * copies + k, num_slots))
+        streams.append(heapq.merge(*copy_streams, key=lambda e: e["offset"]))
+        if splice == "concat":
+            start += header.get("duration", 0.0) * time_scale + (copies - 1) * copy_shift
+    if splice == "concat":
+        stream = itertools.chain(*streams)
+        duration = start
+    else:
+        stream = heapq.merge(*streams, key=lambda e: e["offset"])
+        duration = max(h.get("duration", 0.0) for h in headers) * time_scale + (copies - 1) * copy_shift
+    block_texts = {h["block_text"] for h in headers if "block_text" in h}
+    if len(block_texts) > 1:
+        raise ValueError("The spliced manifests use different block texts")
+    header = {
+        "manifest_version": headers[0]["manifest_version"],
+        "workload": "+".join(h.get("workload", "?") for h in headers),
+        "requests": sum(h.get("requests", 0) for h in headers) * copies,
+        "users": sum(h.get("users", 0) for h in headers) * copies,
+        "duration": duration,
+    }
+    if block_texts:
+        header["block_text"] = block_texts.pop()
+    return header, stream
+
+
+def shard_stream(entries: Iterator[Dict[str, Any]], index: int, count: int) -> Iterator[Dict[str, Any]]:
+    """The requests of the users of shard index out of count (a user never spans shards)."""
+    for entry in entries:
+        if entry["user_id"] % count == index:
+            yield entry
+
+
+def expand_message(message: Dict[str, Any], block_text: str, namespace: Optional[str] = None) -> Dict[str, Any]:
+    """Message for the API: block references become their text."""
+    if "blocks" not in message:
+        return message
+    prefix = f"{namespace}-" if namespace else ""
+    content = "".join(f"{prefix}{block}{block_text}" for block in message["blocks"]) + message.get("suffix", "")
+    expanded = {k: v for k, v in message.items() if k not in ("blocks", "suffix")}
+    expanded["content"] = content
+    return expanded
+
+# ---------------------------------------------------------------------------
+# Low-level request handling
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Response:
+    body: str
+    ttft: float
+    generation_time: float
+    prompt_tokens: int
+    generation_tokens: int
+    launch_time: float
+    finish_time: float
+    # prompt tokens served from the engine's prefix cache, None if not reported
+    cached_tokens: Optional[int] = None
+    # the stream carried no usage, the token counts come from the local tokenizer
+    tokens_counted_locally: bool = False
+
+
+class RequestExecutor:
+    """OpenAI async client measuring latency, called directly on the replay's event loop."""
+
+    def __init__(self, base_url: str, models: List[str], generation_mode: str = "mixed"):
+        self.client = openai.AsyncOpenAI(api_key="EMPTY", base_url=base_url)
+        self.models = models
+        self.generation_mode = generation_mode
+
+    async def request(self, messages, max_tokens: int, model_index: int,
+                      user_id: int) -> Optional[Response]:
+        model = self.models[model_index % len(self.models)]
+        start = time.time()
+        first_token: Optional[float] = None
+        chunks = []
+        try:
+            stream = await self.client.chat.completions.create(
+                messages=messages,
+                model=model,
+                temperature=0,
+                stream=True,
+                **generation_kwargs(self.generation_mode, max_tokens),
+                stream_options={"include_usage": True},
+                extra_headers={"x-user-id": str(user_id)},
+            )
+            usage = None
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if first_token is None:
+                        first_token = time.time()
+                    chunks.append(delta)
+        except Exception as e:
+            logger.warning(f"Request of user {user_id} failed: {e}")
+            return None
+
+        finish = time.time()
+        body = "".join(chunks)
+        if usage is not None:
+            prompt_tokens, generation_tokens = usage.prompt_tokens, usage.completion_tokens
+        else:
+            prompt_tokens, generation_tokens = await TokenCounter.Count(model, messages, body)
+        return Response(
+            body=body,
+            ttft=(first_token or finish) - start,
+            generation_time=finish - (first_token or start),
+            prompt_tokens=prompt_tokens,
+            generation_tokens=generation_tokens,
+            launch_time=start,
+            finish_time=finish,
+            cached_tokens=cached_prompt_tokens(usage) if usage else None,
+            tokens_counted_locally=usage is None,
+        )
+
+# ---------------------------------------------------------------------------
+# Replay
+# ---------------------------------------------------------------------------
+
+@dataclass
+class UserState:
+    # Messages of the previous request (unexpanded) and its answer
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    answer: str = ""
+    # Requests waiting for the previous response
+    queue: Deque[Dict[str, Any]] = field(default_factory=collections.deque)
+    busy: bool = False
+    failed: bool = False
+
+
+class ReplayRunner:
+    """Sends the manifest's requests at their offsets and collects latency metrics."""
+
+    def __init__(self, header: Dict[str, Any], entries: Iterator[Dict[str, Any]],
+                 executor: RequestExecutor, time_limit: Optional[int] = None,
+                 convergence: Optional[ConvergenceMonitor] = None, log_interval: float = 30):
+        self.header = header
+        self.entries = entries
+        self.executor = executor
+        self.time_limit = time_limit
+        self.convergence = convergence
+        self.log_interval = log_interval
+        self.block_text = header.get("block_text", "")
+        self.users: Dict[int, UserState] = {}
+        # ((user id, question id), response, scheduled time, send time), without the
+        # messages so that the memory use stays small
+        self.results: List[Tuple[Tuple[int, int], Response, float, float]] = []
+        self.tasks = set()
+        self.num_sent = 0
+        self.num_failed = 0
+        self.num_skipped = 0
+        self.stopped = False
+        self.start_time = 0.0
+
+    def _build_messages(self, entry: Dict[str, Any], user: UserState) -> List[Dict[str, Any]]:
+        history = entry.get("history", "none")
+        if history == "none":
+            messages = entry["messages"]
+        else:
+            response = dict(entry.get("previous_response") or {"role": "assistant"})
+            response.setdefault("content", user.answer)
+            if history == "whole":
+                # the namespace is already in the first message of the conversation
+                return user.messages + [response] + entry["messages"]
+            messages = [response] + entry["messages"]
+        namespace = entry.get("namespace")
+        if namespace is not None and messages and "blocks" not in messages[0]:
+            first = dict(messages[0])
+            first["content"] = f"{namespace} {first.get('content') or ''}"
+            messages = [first] + messages[1:]
+        return messages
+
+    async def _run_user(self, user_id: int, user: UserState) -> None:
+        user.busy = True
+        entry = None
+        while user.queue and not self.stopped:
+            entry = user.queue.popleft()
+            scheduled = self.start_time + entry["offset"]
+            delay = scheduled - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.stopped:
+                break
+            messages = self._build_messages(entry, user)
+            sent = time.time()
+            self.num_sent += 1
+            MetricsExporter.RequestSent(scheduled, sent)
+            namespace = entry.get("namespace")
+            response = await self.executor.request(
+                [expand_message(m, self.block_text, namespace) for m in messages],
+                entry["max_tokens"], entry.get("model_index", 0), user_id)
+            MetricsExporter.RequestFinished(response)
+            if response is None:
+                # like the drivers, a failed session sends no further turns
+                self.num_failed += 1
+                self.num_skipped += len(user.queue)
+                user.queue.clear()
+                user.failed = True
+                break
+            self.results.append(((user_id, entry["question_id"]), response, scheduled, sent))
+            user.messages = messages
+            user.answer = response.body
+        user.busy = False
+        if not user.queue and entry is not None and not entry.get("continued") \
+                and self.users.get(user_id) is user:
+            # no further turns, free the history
+            del self.users[user_id]
+
+    def _dispatch(self, entry: Dict[str, Any]) -> None:
+        user_id = entry["user_id"]
+        user = self.users.get(user_id)
+        if entry.get("after_previous"):
+            if user is None or user.failed:
+                self.num_skipped += 1
+                return
+        else:
+            # an independent request starts a new conversation of the user
+            user = self.users[user_id] = UserState()
+        user.queue.append(entry)
+        if not user.busy:
+            task = asyncio.create_task(self._run_user(user_id, user))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _monitor(self) -> None:
+        last_log = time.time()
+        while not self.stopped:
+            await asyncio.sleep(1)
+            now = time.time()
+            if self.time_limit is not None and now - self.start_time > self.time_limit:
+                logger.info(f"Time limit of {self.time_limit} seconds reached, stopping benchmark")
+                self.stopped = True
+            elif self.convergence is not None and self.convergence.converged(
+                    self._results_df, self.start_time, now):
+                logger.info("Metrics converged, stopping benchmark")
+                self.stopped = True
+            if now - last_log > self.log_interval:
+                last_log = now
+                logger.info(f"{now - self.start_time:.0f}s: sent {self.num_sent}, finished "
+                            f"{len(self.results)}, failed {self.num_failed}, in flight "
+                            f"{self.num_sent - len(self.results) - self.num_failed}")
+
+    async def run(self, start_time: Optional[float] = None) -> pd.DataFrame:
+        """start_time: wall-clock time of offset 0 (default: now)."""
+        if start_time is not None and start_time > time.time():
+            logger.info(f"Waiting {start_time - time.time():.1f}s for the common start time")
+            await asyncio.sleep(start_time - time.time())
+        logger.info("Replay started: %s requests of %s users over %.1fs (%s manifest)",
+                    self.header.get("requests"), self.header.get("users"),
+                    self.header.get("duration", 0.0), self.header.get("workload"))
+        self.start_time = start_time if start_time is not None else time.time()
+        monitor = asyncio.create_task(self._monitor())
+        for entry in self.entries:
+            delay = self.start_time + entry["offset"] - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.stopped:
+                break
+            self._dispatch(entry)
+
+        # wait for the in-flight requests and the queued turns
+        while self.tasks:
+            await asyncio.gather(*list(self.tasks))
+        self.stopped = True
+        monitor.cancel()
+        logger.info(f"All requests completed ({self.num_failed} failed, "
+                    f"{self.num_skipped} skipped after a failure)")
+
+        # Ensure deterministic ordering for downstream scripts/visualisation
+        return self._results_df().sort_values("launch_time").reset_index(drop=True)
+
+    def _results_df(self) -> pd.DataFrame:
+        results = list(self.results)
+        return pd.DataFrame({
+            "prompt_tokens": [r.prompt_tokens for _, r, _, _ in results],
+            "generation_tokens": [r.generation_tokens for _, r, _, _ in results],
+            "cached_tokens": pd.array([r.cached_tokens for _, r, _, _ in results], dtype="Int64"),
+            "tokens_counted_locally": [r.tokens_counted_locally for _, r, _, _ in results],
+            "ttft": [r.ttft for _, r, _, _ in results],
+            "generation_time": [r.generation_time for _, r, _, _ in results],
+            "user_id": [user_id for (user_id, _), _, _, _ in results],
+            "question_id": [question_id for (_, question_id), _, _, _ in results],
+            "launch_time": [r.launch_time for _, r, _, _ in results],
+            "finish_time": [r.finish_time for _, r, _, _ in results],
+            # send time dictated by the manifest, when the request was issued and how
+            # long the client took to start it
+            "scheduled_time": [scheduled for _, _, scheduled, _ in results],
+            "send_time": [sent for _, _, _, sent in results],
+            "dispatch_delay": [r.launch_time - sent for _, r, _, sent in results],
+            # the replay catches up instead of skipping requests
+            "missed_slots": [0] * len(results),
+        })
+
+# ---------------------------------------------------------------------------
+# Summary helpers
+# ---------------------------------------------------------------------------
+
+def log_summary(df: pd.DataFrame):
+    if len(df) == 0:
+        logger.warning("No request finished")
+        return
+    duration = df["finish_time"].max() - df["launch_time"].min()
+    throughput = len(df) / duration if duration > 0 else 0
+    logger.info("Completed %d requests in %.2fs (%.2f QPS)", len(df), duration, throughput)
+    logger.info("Average TTFT: %.3fs", df["ttft"].mean())
+    logger.info("Average TTFT from schedule: %.3fs",
+                (df["ttft"] + df["launch_time"] - df["scheduled_time"]).mean())
+
+def latency_histograms(df: pd.DataFrame) -> Dict[str, LatencyHistogram]:
+    """Mergeable histograms of the TTFT, ITL, end-to-end latency and TTFT from schedule."""
+    histograms = {name: LatencyHistogram() for name in ("ttft", "itl", "e2e", "ttft_from_schedule")}
+    for row in df.itertuples(index=False):
+        histograms["ttft"].observe(row.ttft)
+        # same ITL as summarize.py
+        if row.generation_tokens > 0:
+            histograms["itl"].observe(row.generation_time / row.generation_tokens)
+        histograms["e2e"].observe(row.finish_time - row.launch_time)
+        histograms["ttft_from_schedule"].observe(row.ttft + row.launch_time - row.scheduled_time)
+    return histograms
+
+# ---------------------------------------------------------------------------
+# Distributed worker
+# ---------------------------------------------------------------------------
+
+TIME_COLUMNS = ("launch_time", "finish_time", "scheduled_time", "send_time")
+
+
+def _call(url: str, data=None, method: Optional[str] = None, timeout: float = 30,
+          headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    request = urllib.request.Request(url, data=data, method=method, headers=headers or {})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read() or b"{}")
+
+
+def clock_offset(coordinator: str, samples: int = 5) -> float:
+    """Coordinator clock minus local clock, from the sample with the shortest round trip."""
+    best = None
+    for _ in range(samples):
+        sent = time.time()
+        remote = _call(f"{coordinator}/clock")["time"]
+        received = time.time()
+        if best is None or received - sent < best[0]:
+            best = (received - sent, remote - (sent + received) / 2)
+    return best[1]
+
+
+def run_worker(args: argparse.Namespace) -> None:
+    coordinator = args.coordinator.rstrip("/")
+    offset = clock_offset(coordinator)
+    # blocks until every worker registered
+    assignment = _call(f"{coordinator}/register", json.dumps({"host": socket.gethostname()}).encode(),
+                       timeout=3600)
+    # the coordinator scrapes the engine's /metrics for all workers
+    worker, num_workers = assignment["worker"], assignment["num_workers"]
+    replay = assignment["replay"]
+    logger.info(f"Worker {worker}/{num_workers}, clock offset to the coordinator {offset * 1000:.1f}ms")
+
+    header, entries = open_manifests(replay["manifest"], replay["splice"], replay["copies"],
+                                     replay["copy_shift"], replay["time_scale"])
+    executor = RequestExecutor(args.base_url, args.model,
+                               replay.get("generation_mode", args.generation_mode))
+    runner = ReplayRunner(header, shard_stream(entries, worker, num_workers), executor,
+                          replay.get("time"), None, args.log_interval)
+    df = asyncio.run(runner.run(assignment["start_time"] - offset))
+
+    # results on the coordinator's clock
+    for column in TIME_COLUMNS:
+        df[column] = df[column] + offset
+    df["worker"] = worker
+    df.to_csv(args.output, index=False)
+    logger.info(f"Results written to {args.output}")
+    log_summary(df)
+
+    # streamed from the file, the spool can be large
+    with open(args.output, "rb") as f:
+        _call(f"{coordinator}/spool/{worker}", f, method="PUT", timeout=600,
+              headers={"Content-Length": str(os.fstat(f.fileno()).st_size)})
+    histograms = {name: h.to_dict() for name, h in latency_histograms(df).items()}
+    _call(f"{coordinator}/histograms/{worker}", json.dumps({
+        "histograms": histograms, "requests": len(df), "failed": runner.num_failed,
+    }).encode(), method="POST")
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def main():
+    args = parse_args()
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+    start_metrics_exporter(args, "replay")
+    if args.coordinator is not None:
+        run_worker(args)
+        return
+
+    header, entries = open_manifests(args.manifest, args.splice, args.copies, args.copy_shift,
+                                     args.time_scale)
+    executor = RequestExecutor(args.base_url, args.model, args.generation_mode)
+    runner = ReplayRunner(header, entries, executor, args.time,
+                          build_convergence_monitor(args), args.log_interval)
+    scraper = start_engine_scraper(args)
+    df = asyncio.run(runner.run())
+    if scraper is not None:
+        scraper.stop()
+
+    df.to_csv(args.output, index=False)
+    logger.info(f"Results written to {args.output}")
+    log_summary(df)
+
+
+if __name__ == "__main__":
+    main()
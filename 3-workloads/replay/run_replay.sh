@@ -0,0 +1,83 @@
+#!/bin/bash
+
+# Get the directory where this script is located
+SCRIPT_DIR="$( cd "$( dirname "${BASH_SOURCE[0]}" )" && pwd )"
+PROJECT_ROOT="$( cd "$SCRIPT_DIR/../../" && pwd )"
+cd "$SCRIPT_DIR"
+
+if [[ $# -lt 4 ]]; then
+    echo "Usage: $0 <model> <base url> <save file key> <manifest> [manifest...]"
+    exit 1
+fi
+
+MODEL=$1
+BASE_URL=$2
+KEY=$3
+MANIFESTS=("${@:4}") # Request manifests written by 3-workloads/compile_manifest.py
+
+# Trace transformations (--time-scale, --copies, --copy-shift, --splice), set by run-bench.py
+TRANSFORM_ARGS=${TRANSFORM_ARGS:-}
+
+# Run length of each benchmark: by default the whole manifest is replayed,
+# run-bench.py may set a --time limit or a convergence-driven stop (--converge-metrics ...)
+RUN_LENGTH_ARGS=${RUN_LENGTH_ARGS:-}
+
+# Prometheus metrics (set by run-bench.py): --metrics-port 9400 serves the load generator's,
+# --engine-metrics-interval 5 scrapes the engine's every 5s (default 1s, 0 disables)
+METRICS_ARGS=${METRICS_ARGS:-}
+
+# Generation mode of the benchmark runs (set by run-bench.py): prefill (max_tokens 1) or
+# decode (exactly the workload's output lengths), the workload's own output lengths by default
+GENERATION_MODE=${GENERATION_MODE:-}
+GENERATION_ARGS=${GENERATION_MODE:+--generation-mode $GENERATION_MODE}
+
+NAME=$(basename "${MANIFESTS[0]}" .jsonl)
+if [[ ${#MANIFESTS[@]} -gt 1 ]]; then
+    NAME="${NAME}+$((${#MANIFESTS[@]} - 1))"
+fi
+if [[ -n "$TRANSFORM_ARGS" ]]; then
+    # e.g. mooncake_copies_4_time-scale_0.5
+    NAME="${NAME}_$(echo $TRANSFORM_ARGS | sed 's/--//g; s/ /_/g')"
+fi
+output_file="../../4-latest-results/${KEY}_replay_output_${NAME}.csv"
+
+# Distributed replay over several load-generator nodes (coordinator.py), set by run-bench.py:
+# WORKERS replay-qa.py workers, COORDINATOR_ARGS e.g. --local-workers or --port
+WORKERS=${WORKERS:-0}
+COORDINATOR_ARGS=${COORDINATOR_ARGS:-}
+
+if [[ "$WORKERS" -gt 0 ]]; then
+    python3 ./coordinator.py \
+        --workers "$WORKERS" \
+        --manifest "${MANIFESTS[@]}" \
+        $TRANSFORM_ARGS \
+        --model "$MODEL" \
+        --base-url "$BASE_URL" \
+        --output "$output_file" \
+        --log-interval 30 \
+        $COORDINATOR_ARGS \
+        $RUN_LENGTH_ARGS \
+        $METRICS_ARGS \
+        $GENERATION_ARGS
+else
+    python3 ./replay-qa.py \
+        --manifest "${MANIFESTS[@]}" \
+        $TRANSFORM_ARGS \
+        --model "$MODEL" \
+        --base-url "$BASE_URL" \
+        --output "$output_file" \
+        --log-interval 30 \
+        $RUN_LENGTH_ARGS \
+        $METRICS_ARGS \
+        $GENERATION_ARGS
+fi
+
+# Change to project root before running summarize.py
+cd "$PROJECT_ROOT"
+python3 "4-latest-results/post-processing/summarize.py" \
+    "${output_file#../../}" \
+    KEY="$KEY" \
+    WORKLOAD="replay" \
+    MANIFEST="${MANIFESTS[*]}" \
+    TRANSFORM="$TRANSFORM_ARGS" \
+    ${GENERATION_MODE:+GENERATION_MODE=$GENERATION_MODE}
@@ -0,0 +1,832 @@
+import asyncio
+import bisect
+import csv
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging import Logger
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+
+def build_format(color):
+    reset = "\x1b[0m"
+    underline = "\x1b[3m"
+    return (
+        f"{color}[%(asctime)s] %(levelname)s:{reset} %(message)s "
+        + f"{underline}(%(filename)s:%(lineno)d:%(name)s){reset}"
+    )
+
+
+class CustomFormatter(logging.Formatter):
+
+    grey = "\x1b[1m"
+    green = "\x1b[32;20m"
+    yellow = "\x1b[33;20m"
+    red = "\x1b[31;20m"
+    bold_red = "\x1b[31;1m"
+    reset = "\x1b[0m"
+
+    FORMATS = {
+        logging.DEBUG: build_format(grey),
+        logging.INFO: build_format(green),
+        logging.WARNING: build_format(yellow),
+        logging.ERROR: build_format(red),
+        logging.CRITICAL: build_format(bold_red),
+    }
+
+    def format(self, record):
+        log_fmt = self.FORMATS.get(record.levelno)
+        formatter = logging.Formatter(log_fmt)
+        return formatter.format(record)
+
+
+def init_logger(name: str, log_level=logging.DEBUG) -> Logger:
+    logger = logging.getLogger(name)
+
+    ch = logging.StreamHandler()
+    ch.setLevel(log_level)
+    ch.setFormatter(CustomFormatter())
+    logger.addHandler(ch)
+    logger.setLevel(logging.DEBUG)
+
+    return logger
+
+
+class AsyncLoopWrapper:
+    _loop: asyncio.AbstractEventLoop = None
+    _thread: threading.Thread = None
+    _logger = init_logger("AsyncLoopWrapper")
+
+    @classmethod
+    def WaitLoop(cls):
+        assert cls._loop is not None, "Loop is not started"
+
+        async def wait_for_tasks():
+            current_task = asyncio.current_task(cls._loop)
+            tasks = [
+                task
+                for task in asyncio.all_tasks(cls._loop)
+                if not task.done() and task is not current_task
+            ]
+            cls._logger.info(f"Waiting for {len(tasks)} tasks to finish")
+            if tasks:
+                await asyncio.gather(*tasks)
+
+        # Schedule the wait_for_tasks coroutine to be executed in the loop
+        future = asyncio.run_coroutine_threadsafe(wait_for_tasks(), cls._loop)
+        try:
+            # Wait for wait_for_tasks to complete
+            future.result()
+        except Exception as e:
+            cls._logger.error(f"Error while waiting for tasks: {e}")
+
+    @classmethod
+    def StartLoop(cls):
+        if cls._loop is not None:
+            cls._logger.warning("Loop is already started")
+            return
+
+        if cls._loop is None:
+            cls._loop = asyncio.new_event_loop()
+
+        def run_loop():
+            asyncio.set_event_loop(cls._loop)
+            cls._logger.debug("Starting the asyncio loop")
+            cls._loop.run_forever()
+
+        cls._thread = threading.Thread(target=run_loop)
+        cls._thread.start()
+
+    @classmethod
+    def StopLoop(cls):
+        assert cls._loop is not None, "Loop is not started"
+        assert cls._thread is not None, "Thread is not started"
+
+        def stop_loop():
+            cls._logger.debug("Stopping the loop!")
+            cls._loop.stop()
+
+        cls._logger.info("Waiting for remaining tasks to finish")
+        cls.WaitLoop()
+
+        cls._loop.call_soon_threadsafe(stop_loop)
+        cls._thread.join()
+
+    @classmethod
+    def GetLoop(cls) -> asyncio.AbstractEventLoop:
+        assert cls._loop is not None, "Loop is not started"
+        return cls._loop
+
+    @classmethod
+    def GetOrStartLoop(cls) -> asyncio.AbstractEventLoop:
+        if cls._loop is None:
+            cls.StartLoop()
+        return cls._loop
+
+
+class LatencyHistogram:
+    """
+    Latency histogram (seconds) with fixed log-spaced buckets, the same in every process:
+    histograms of several load generators merge by adding their counts. A bucket holds
+    the values <= its upper bound (Prometheus `le` semantics), the last one is unbounded.
+    """
+
+    # 1 ms to ~20 min in steps of 25%
+    DEFAULT_BOUNDS = tuple(round(0.001 * 1.25 ** i, 6) for i in range(64))
+
+    def __init__(self, bounds: Optional[Sequence[float]] = None):
+        self.bounds = list(bounds if bounds is not None else self.DEFAULT_BOUNDS)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        if other.bounds != self.bounds:
+            raise ValueError("Only histograms with the same buckets can be merged")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+
+    def quantile(self, q: float) -> float:
+        """q in [0, 1], linearly interpolated inside the bucket."""
+        if self.count == 0:
+            return float("nan")
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                if i == len(self.bounds):
+                    return self.bounds[-1]
+                low = self.bounds[i - 1] if i > 0 else 0.0
+                return low + (self.bounds[i] - low) * (rank - cumulative) / count
+            cumulative += count
+        return self.bounds[-1]
+
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else float("nan")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"bounds": self.bounds, "counts": self.counts, "count": self.count, "sum": self.sum}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencyHistogram":
+        histogram = cls(data["bounds"])
+        histogram.counts = list(data["counts"])
+        histogram.count = data["count"]
+        histogram.sum = data["sum"]
+        return histogram
+
+
+class MetricsExporter:
+    """
+    Optional live metrics of the load generator in the Prometheus text format, served at
+    http://<host>:<port>/metrics once Start() was called (--metrics-port): request counters,
+    the in-flight gauge, token counters and histograms of the TTFT, the inter-token latency
+    (per request: generation time / generated tokens, as in summarize.py), the end-to-end latency and the
+    scheduling lag (send time - intended send time). Before Start() the recording calls
+    return immediately.
+    """
+
+    PREFIX = "lmbench_"
+    COUNTERS = {
+        "requests_sent": "Requests sent to the engine",
+        "requests_finished": "Requests that finished successfully",
+        "requests_failed": "Requests that failed",
+        "prompt_tokens": "Prompt tokens of the finished requests",
+        "generation_tokens": "Generated tokens of the finished requests",
+        "cached_prompt_tokens": "Prompt tokens the engine reported as served from its prefix cache",
+    }
+    HISTOGRAMS = {
+        "ttft_seconds": "Time to first token",
+        "itl_seconds": "Mean inter-token latency of a request",
+        "e2e_latency_seconds": "End-to-end latency of a request",
+        "scheduling_lag_seconds": "Delay between the intended and the actual send time",
+    }
+
+    _lock = threading.Lock()
+    _server: ThreadingHTTPServer = None
+    _labels = ""
+    _counters: Dict[str, float] = {}
+    _histograms: Dict[str, LatencyHistogram] = {}
+    _logger = init_logger("MetricsExporter")
+
+    @classmethod
+    def Start(cls, port: int, workload: str, host: str = "0.0.0.0"):
+        cls._labels = f'{{workload="{workload}"}}'
+        cls._counters = {name: 0 for name in cls.COUNTERS}
+        cls._histograms = {name: LatencyHistogram() for name in cls.HISTOGRAMS}
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = cls.Render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        cls._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=cls._server.serve_forever, daemon=True).start()
+        cls._logger.info(f"Serving load generator metrics on http://{host}:{port}/metrics")
+
+    @classmethod
+    def Stop(cls):
+        if cls._server is not None:
+            cls._server.shutdown()
+            cls._server = None
+
+    @classmethod
+    def RequestSent(cls, scheduled_time: float, send_time: float):
+        if cls._server is None:
+            return
+        with cls._lock:
+            cls._counters["requests_sent"] += 1
+            cls._histograms["scheduling_lag_seconds"].observe(max(send_time - scheduled_time, 0.0))
+
+    @classmethod
+    def RequestFinished(cls, response):
+        """response: the driver's Response, None for a failed request"""
+        if cls._server is None:
+            return
+        with cls._lock:
+            if response is None:
+                cls._counters["requests_failed"] += 1
+                return
+            cls._counters["requests_finished"] += 1
+            cls._counters["prompt_tokens"] += response.prompt_tokens
+            cls._counters["generation_tokens"] += response.generation_tokens
+            cls._counters["cached_prompt_tokens"] += getattr(response, "cached_tokens", None) or 0
+            cls._histograms["ttft_seconds"].observe(response.ttft)
+            if response.generation_tokens > 0:
+                cls._histograms["itl_seconds"].observe(
+                    response.generation_time / response.generation_tokens)
+            cls._histograms["e2e_latency_seconds"].observe(response.finish_time - response.launch_time)
+
+    @classmethod
+    def Render(cls) -> str:
+        labels = cls._labels
+        lines = []
+        with cls._lock:
+            for name, help_text in cls.COUNTERS.items():
+                metric = f"{cls.PREFIX}{name}_total"
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter",
+                          f"{metric}{labels} {cls._counters[name]}"]
+            in_flight = (cls._counters["requests_sent"] - cls._counters["requests_finished"]
+                         - cls._counters["requests_failed"])
+            metric = f"{cls.PREFIX}requests_in_flight"
+            lines += [f"# HELP {metric} Requests sent and not finished yet", f"# TYPE {metric} gauge",
+                      f"{metric}{labels} {max(in_flight, 0)}"]
+            for name, help_text in cls.HISTOGRAMS.items():
+                histogram = cls._histograms[name]
+                metric = f"{cls.PREFIX}{name}"
+                lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+                cumulative = 0
+                bucket_labels = labels[:-1] + ","
+                for bound, count in zip(histogram.bounds, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{bucket_labels}le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{bucket_labels}le="+Inf"}} {histogram.count}')
+                lines += [f"{metric}_sum{labels} {histogram.sum}", f"{metric}_count{labels} {histogram.count}"]
+        return "\n".join(lines) + "\n"
+
+
+def add_metrics_args(parser) -> None:
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="Serve live load generator metrics in the Prometheus text format on this port",
+    )
+
+
+def start_metrics_exporter(args, workload: str) -> None:
+    if getattr(args, "metrics_port", None):
+        MetricsExporter.Start(args.metrics_port, workload)
+
+
+class EngineMetricsScraper:
+    """
+    Polls the serving engine's Prometheus /metrics endpoint (vLLM or SGLang) every
+    `interval` seconds from a background thread and appends one row per sample to a CSV
+    next to the per-request CSV (engine_metrics_path). Samples are stamped with
+    time.time(), the clock of the per-request launch_time / finish_time columns, so
+    summarize.py can average them over the window of the run.
+
+    The engines' metric names are mapped to common columns; series of several label sets
+    (models, replicas) are summed, or averaged for ratios. Columns an engine does not
+    export stay empty.
+    """
+
+    # column: (aggregation, candidate metric names, the first one present is used)
+    COLUMNS: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+        "num_running": ("sum", ("vllm:num_requests_running", "sglang:num_running_reqs")),
+        "num_waiting": ("sum", ("vllm:num_requests_waiting", "sglang:num_queue_reqs")),
+        "kv_cache_usage": ("mean", ("vllm:kv_cache_usage_perc", "vllm:gpu_cache_usage_perc",
+                                    "sglang:token_usage")),
+        "prefix_cache_queries": ("sum", ("vllm:prefix_cache_queries_total",
+                                         "vllm:gpu_prefix_cache_queries_total")),
+        "prefix_cache_hits": ("sum", ("vllm:prefix_cache_hits_total", "vllm:gpu_prefix_cache_hits_total")),
+        "prefix_cache_hit_rate": ("mean", ("vllm:gpu_prefix_cache_hit_rate", "sglang:cache_hit_rate")),
+        "preemptions": ("sum", ("vllm:num_preemptions_total", "sglang:num_retracted_reqs")),
+    }
+
+    def __init__(self, metrics_url: str, interval: float, output: str, timeout: float = 5.0):
+        self.metrics_url = metrics_url
+        self.interval = interval
+        self.output = output
+        self.timeout = timeout
+        self.num_samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._logger = init_logger("EngineMetricsScraper")
+
+    @staticmethod
+    def parse(text: str) -> Dict[str, List[float]]:
+        """Values of every series in a Prometheus text exposition, by metric name."""
+        series: Dict[str, List[float]] = {}
+        for line in text.splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if "{" in line:
+                name, rest = line.split("{", 1)
+                fields = rest.rsplit("}", 1)[1].split()
+            else:
+                name, *fields = line.split()
+            if not fields:
+                continue
+            try:
+                series.setdefault(name.strip(), []).append(float(fields[0]))
+            except ValueError:
+                continue
+        return series
+
+    def sample(self, text: str) -> Dict[str, Optional[float]]:
+        series = self.parse(text)
+        row: Dict[str, Optional[float]] = {}
+        for column, (aggregation, names) in self.COLUMNS.items():
+            values = next((series[name] for name in names if name in series), None)
+            if values is None:
+                row[column] = None
+            else:
+                row[column] = sum(values) / len(values) if aggregation == "mean" else sum(values)
+        return row
+
+    def _scrape(self) -> str:
+        with urllib.request.urlopen(self.metrics_url, timeout=self.timeout) as response:
+            return response.read().decode("utf-8", errors="replace")
+
+    def _run(self) -> None:
+        failures = 0
+        with open(self.output, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["timestamp", *self.COLUMNS])
+            next_time = time.time()
+            while not self._stop.is_set():
+                timestamp = time.time()
+                try:
+                    row = self.sample(self._scrape())
+                except Exception as e:
+                    failures += 1
+                    if failures == 1:
+                        self._logger.warning(f"Failed to scrape {self.metrics_url}: {e}")
+                else:
+                    writer.writerow([timestamp, *("" if v is None else v for v in row.values())])
+                    f.flush()
+                    self.num_samples += 1
+                next_time += self.interval
+                self._stop.wait(max(next_time - time.time(), 0.0))
+        if failures:
+            self._logger.warning(f"{failures} of {failures + self.num_samples} scrapes of "
+                                 f"{self.metrics_url} failed")
+
+    def start(self) -> "EngineMetricsScraper":
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._logger.info(f"Scraping {self.metrics_url} every {self.interval}s into {self.output}")
+        return self
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+
+def engine_metrics_path(output: str) -> str:
+    """Engine metrics CSV of a per-request CSV: <name>_engine_metrics.csv"""
+    return f"{os.path.splitext(output)[0]}_engine_metrics.csv"
+
+
+def engine_metrics_url(base_url: str) -> str:
+    """/metrics next to the OpenAI API, e.g. http://localhost:30080/v1/ -> http://localhost:30080/metrics"""
+    parts = urlsplit(base_url)
+    return f"{parts.scheme}://{parts.netloc}/metrics"
+
+
+def add_engine_metrics_args(parser) -> None:
+    parser.add_argument(
+        "--engine-metrics-interval",
+        type=float,
+        default=1.0,
+        help="Seconds between two scrapes of the engine's /metrics, 0 disables scraping (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--engine-metrics-url",
+        type=str,
+        default=None,
+        help="Prometheus endpoint of the engine (default: /metrics on the host of --base-url)",
+    )
+
+
+def start_engine_scraper(args) -> Optional[EngineMetricsScraper]:
+    """Starts scraping into the engine metrics CSV of args.output, None when disabled."""
+    if not getattr(args, "engine_metrics_interval", 0):
+        return None
+    url = args.engine_metrics_url or engine_metrics_url(args.base_url)
+    return EngineMetricsScraper(url, args.engine_metrics_interval, engine_metrics_path(args.output)).start()
+
+
+GENERATION_MODES = ("mixed", "prefill", "decode")
+
+
+def add_generation_mode_args(parser, default: str = "mixed") -> None:
+    parser.add_argument(
+        "--generation-mode",
+        choices=GENERATION_MODES,
+        default=default,
+        help="mixed: the workload's max_tokens; prefill: max_tokens 1 (prefill-only benchmark); "
+        "decode: exactly the workload's output lengths (ignore_eos and min_tokens, "
+        "decode-dominant benchmark) (default: %(default)s)",
+    )
+
+
+def generation_kwargs(mode: str, max_tokens: int) -> Dict[str, Any]:
+    """Output length arguments of chat.completions.create for a generation mode."""
+    if mode == "prefill":
+        return {"max_tokens": 1}
+    if mode == "decode":
+        # vLLM and SGLang take both as extra sampling parameters
+        return {"max_tokens": max_tokens, "extra_body": {"ignore_eos": True, "min_tokens": max_tokens}}
+    return {"max_tokens": max_tokens}
+
+
+def cached_prompt_tokens(usage) -> Optional[int]:
+    """
+    Prompt tokens the engine served from its prefix cache (usage.prompt_tokens_details.cached_tokens),
+    None when the engine does not report them (vLLM only does with --enable-prompt-tokens-details).
+    """
+    details = getattr(usage, "prompt_tokens_details", None)
+    if isinstance(details, dict):
+        return details.get("cached_tokens")
+    return getattr(details, "cached_tokens", None)
+
+
+class TokenCounter:
+    """
+    Local prompt and completion token counts for responses whose stream carries no usage,
+    instead of sending the request to the engine a second time. The model's tokenizer and
+    chat template are loaded once per model (from the Hugging Face cache, downloaded on
+    first use); without transformers or a tokenizer for the model, words are counted.
+    """
+
+    _lock = threading.Lock()
+    _tokenizers: Dict[str, Any] = {}
+    _logger = init_logger("TokenCounter")
+
+    @classmethod
+    def GetTokenizer(cls, model: str):
+        with cls._lock:
+            if model not in cls._tokenizers:
+                try:
+                    from transformers import AutoTokenizer
+                    cls._tokenizers[model] = AutoTokenizer.from_pretrained(model)
+                except Exception as e:
+                    cls._logger.warning(f"No tokenizer for {model}, estimating token counts from words: {e}")
+                    cls._tokenizers[model] = None
+            return cls._tokenizers[model]
+
+    @classmethod
+    def CountPrompt(cls, model: str, messages: List[Dict[str, Any]]) -> int:
+        tokenizer = cls.GetTokenizer(model)
+        if tokenizer is None:
+            return sum(len(str(message.get("content") or "").split()) for message in messages)
+        if getattr(tokenizer, "chat_template", None):
+            # return_dict=False: the token ids, not a BatchEncoding (the default of newer releases)
+            return len(tokenizer.apply_chat_template(messages, tokenize=True, add_generation_prompt=True,
+                                                     return_dict=False))
+        return len(tokenizer.encode("\n".join(str(message.get("content") or "") for message in messages)))
+
+    @classmethod
+    def CountText(cls, model: str, text: str) -> int:
+        tokenizer = cls.GetTokenizer(model)
+        if tokenizer is None:
+            return len(text.split())
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    @classmethod
+    async def Count(cls, model: str, messages: List[Dict[str, Any]], text: str) -> Tuple[int, int]:
+        """(prompt tokens, completion tokens), tokenized off the event loop"""
+        return await asyncio.to_thread(
+            lambda: (cls.CountPrompt(model, messages), cls.CountText(model, text)))
+
+
+class ConvergenceMonitor:
+    """
+    Decides when a run has collected enough requests: the run may stop once the
+    relative width of the confidence interval (CI width / estimate) of every chosen
+    metric is below ci_width, and at least min_time seconds have passed.
+
+    Latency percentiles are bootstrapped over the finished requests, the throughput
+    uses batch means over fixed windows of the run.
+    """
+
+    SUPPORTED_METRICS = ("throughput", "mean_ttft", "p50_ttft", "p90_ttft", "p99_ttft", "p99_itl")
+
+    _logger = init_logger("ConvergenceMonitor")
+
+    def __init__(
+        self,
+        metrics,
+        ci_width: float,
+        min_time: float = 0,
+        confidence: float = 0.95,
+        window: float = 10.0,
+        check_interval: float = 10.0,
+        n_boot: int = 200,
+    ):
+        for metric in metrics:
+            if metric not in self.SUPPORTED_METRICS:
+                raise ValueError(
+                    f"Unsupported convergence metric {metric}, "
+                    f"choose from {', '.join(self.SUPPORTED_METRICS)}"
+                )
+        self.metrics = list(metrics)
+        self.ci_width = ci_width
+        self.min_time = min_time
+        self.confidence = confidence
+        self.window = window
+        self.check_interval = check_interval
+        self.n_boot = n_boot
+        self.rng = np.random.default_rng(0)
+        self.last_check = 0
+        self.widths = {}
+
+    def _bootstrap_ci(self, values: np.ndarray, q: Optional[float]):
+        """CI of the mean (q is None) or of the q-th percentile of values."""
+        # The tail needs enough samples before its bootstrap CI means anything
+        min_samples = 20 if q is None else max(20, int(np.ceil(5 / (1 - q / 100))))
+        if len(values) < min_samples:
+            return None
+        idx = self.rng.integers(0, len(values), size=(self.n_boot, len(values)))
+        if q is None:
+            point, boot = values.mean(), values[idx].mean(axis=1)
+        else:
+            point, boot = np.percentile(values, q), np.percentile(values[idx], q, axis=1)
+        alpha = (1 - self.confidence) / 2
+        low, high = np.quantile(boot, [alpha, 1 - alpha])
+        return point, low, high
+
+    def _throughput_ci(self, finish_times: np.ndarray, start_time: float, now: float):
+        # Only complete windows count
+        num_windows = int((now - start_time) // self.window)
+        if num_windows < 5:
+            return None
+        bins = ((finish_times - start_time) // self.window).astype(int)
+        counts = np.bincount(bins[(bins >= 0) & (bins < num_windows)], minlength=num_windows)
+        rates = counts / self.window
+        point = rates.mean()
+        # normal approximation of the batch means, at the monitor's confidence
+        z = statistics.NormalDist().inv_cdf(0.5 + self.confidence / 2)
+        half = z * rates.std(ddof=1) / np.sqrt(num_windows)
+        return point, point - half, point + half
+
+    def _ci(self, metric: str, df, start_time: float, now: float):
+        if metric == "throughput":
+            return self._throughput_ci(df["finish_time"].to_numpy(), start_time, now)
+        if metric.endswith("_itl"):
+            values = (df["generation_time"] / df["generation_tokens"]).to_numpy()
+            values = values[np.isfinite(values)]
+        else:
+            values = df["ttft"].to_numpy()
+        stat = metric.split("_")[0]
+        return self._bootstrap_ci(values, None if stat == "mean" else float(stat[1:]))
+
+    def converged(self, get_results, start_time: float, now: float) -> bool:
+        """get_results: returns the per-request results finished so far (only called when a check is due)"""
+        if now - start_time < self.min_time or now - self.last_check < self.check_interval:
+            return False
+        self.last_check = now
+        df = get_results()
+        if df is None or len(df) == 0:
+            return False
+
+        self.widths = {}
+        for metric in self.metrics:
+            ci = self._ci(metric, df, start_time, now)
+            if ci is None:
+                self.widths[metric] = float("inf")
+                continue
+            point, low, high = ci
+            self.widths[metric] = (high - low) / abs(point) if point else float("inf")
+
+        done = all(width <= self.ci_width for width in self.widths.values())
+        self._logger.info(
+            "Relative CI widths after %.0fs: %s (target %.3f)%s",
+            now - start_time,
+            ", ".join(f"{m}={w:.3f}" for m, w in self.widths.items()),
+            self.ci_width,
+            " -> converged" if done else "",
+        )
+        return done
+
+
+def add_convergence_args(parser) -> None:
+    parser.add_argument(
+        "--converge-metrics",
+        nargs="+",
+        default=None,
+        choices=ConvergenceMonitor.SUPPORTED_METRICS,
+        help="Stop the run once the confidence intervals of these metrics are narrow "
+        "enough (bounded by --min-time and --time)",
+    )
+    parser.add_argument(
+        "--converge-ci-width",
+        type=float,
+        default=0.1,
+        help="Target relative width of the confidence intervals (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0,
+        help="Minimum run time in seconds when --converge-metrics is set",
+    )
+
+
+def build_convergence_monitor(args):
+    if not args.converge_metrics:
+        return None
+    return ConvergenceMonitor(
+        args.converge_metrics, args.converge_ci_width, min_time=args.min_time
+    )
+
+
+class SteadyStateWarmup:
+    """
+    Decides when a warmup has settled the engine: the warmup sends the run's own prefixes
+    (shared system prompt, the first rounds of the run's users) and may stop once the mean
+    TTFT and the output throughput of the last complete window (by finish time) are both
+    within tolerance of the window before, or after max_time seconds.
+
+    Same converged() interface as ConvergenceMonitor, so the run loops take either.
+    """
+
+    _logger = init_logger("SteadyStateWarmup")
+
+    def __init__(
+        self,
+        max_time: float,
+        window: float = 10.0,
+        tolerance: float = 0.1,
+        min_requests: int = 5,
+    ):
+        self.max_time = max_time
+        self.window = window
+        self.tolerance = tolerance
+        self.min_requests = min_requests
+        self.checked_windows = 0
+        self.windows: List[Tuple[float, float, int]] = []
+        self.steady = False
+
+    def _window_stats(self, df, start_time: float, num_windows: int):
+        """(mean TTFT, output tokens/s, requests) of every complete window"""
+        bins = ((df["finish_time"] - start_time) // self.window).astype(int)
+        stats = []
+        for i in range(num_windows):
+            in_window = df[bins == i]
+            mean_ttft = in_window["ttft"].mean() if len(in_window) else float("nan")
+            throughput = in_window["generation_tokens"].sum() / self.window
+            stats.append((mean_ttft, throughput, len(in_window)))
+        return stats
+
+    def _close(self, previous: float, current: float) -> bool:
+        return bool(previous > 0 and abs(current - previous) <= self.tolerance * previous)
+
+    def converged(self, get_results, start_time: float, now: float) -> bool:
+        """get_results: returns the per-request results finished so far (only called when a window completes)"""
+        num_windows = int((now - start_time) // self.window)
+        if num_windows < 2 or num_windows == self.checked_windows:
+            return False
+        self.checked_windows = num_windows
+        df = get_results()
+        if df is None or len(df) == 0:
+            return False
+
+        self.windows = self._window_stats(df, start_time, num_windows)
+        (prev_ttft, prev_tput, prev_n), (ttft, tput, n) = self.windows[-2:]
+        self.steady = (
+            min(prev_n, n) >= self.min_requests
+            and self._close(prev_ttft, ttft)
+            and self._close(prev_tput, tput)
+        )
+        self._logger.info(
+            "Warmup window %d: mean TTFT %.1f ms (previous %.1f), %.1f tok/s (previous %.1f)%s",
+            num_windows,
+            ttft * 1000,
+            prev_ttft * 1000,
+            tput,
+            prev_tput,
+            " -> steady" if self.steady else "",
+        )
+        return self.steady
+
+    def report(self, df, start_time: float, end_time: float) -> Dict[str, Any]:
+        """
+        Warmup metrics of summarize.py from the warmup's per-request results; the last
+        complete window describes the warmed-up engine.
+        """
+        num_windows = int((end_time - start_time) // self.window)
+        if len(df) and num_windows:
+            self.windows = self._window_stats(df, start_time, num_windows)
+        ttft, tput, _ = self.windows[-1] if self.windows else (float("nan"), float("nan"), 0)
+        num_requests = len(df)
+        report = {
+            "warmup_s": end_time - start_time,
+            "warmup_steady": self.steady,
+            "warmup_requests": num_requests,
+            "warmup_final_ttft_ms": ttft * 1000,
+            "warmup_final_output_throughput": tput,
+        }
+        self._logger.info(
+            "Warmup took %.1fs (%d requests, %s)",
+            report["warmup_s"],
+            num_requests,
+            "steady" if self.steady else f"not steady within {self.max_time:.0f}s",
+        )
+        return report
+
+
+def add_warmup_args(parser) -> None:
+    parser.add_argument(
+        "--warmup-time",
+        type=float,
+        default=0,
+        help="Warm the engine up with the run's own prefixes for at most this many seconds "
+        "before the benchmark, stopping early once TTFT and throughput are steady (0: no warmup)",
+    )
+    parser.add_argument(
+        "--warmup-window",
+        type=float,
+        default=10.0,
+        help="Window in seconds over which the warmup compares TTFT and throughput "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--warmup-tolerance",
+        type=float,
+        default=0.1,
+        help="Relative change between two windows below which the engine counts as "
+        "steady (default: %(default)s)",
+    )
+
+
+def build_warmup(args) -> Optional[SteadyStateWarmup]:
+    if not args.warmup_time:
+        return None
+    return SteadyStateWarmup(args.warmup_time, args.warmup_window, args.warmup_tolerance)
+
+
+def warmup_report_path(output: str) -> str:
+    """Warmup report of a per-request CSV: <name>_warmup.json"""
+    return f"{os.path.splitext(output)[0]}_warmup.json"
+
+
+def write_warmup_report(report: Optional[Dict[str, Any]], output: str) -> None:
+    """Write the report next to the per-request CSV, or drop a stale one if there was no warmup"""
+    path = warmup_report_path(output)
+    if report is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
@@ -0,0 +1,203 @@
+"""
+Saturation search for the maximum sustainable QPS of a workload.
+
+Instead of a hand-picked QPS list, the search probes QPS values adaptively:
+  1. bracketing: starting from START, the QPS is multiplied (or divided) by GROWTH
+     until one probe holds the SLOs and another one violates them
+  2. bisection: the bracket [highest passing, lowest failing] is halved until its
+     relative width is below TOLERANCE
+
+A probe passes when the P99 TTFT / P99 ITL SLOs hold and the achieved request rate
+is at least MIN_ACHIEVED_RATIO of the target. The knee point is the highest passing
+QPS; every probe is kept to report the latency-versus-load curve.
+
+Configured per workload in bench-spec.yaml, e.g.:
+
+  LMCacheSynthetic:
+    - NUM_USERS: 320
+      ...
+      QPS_SEARCH:
+        START: 2
+        MAX: 64
+        TTFT_P99_SLO_MS: 2000
+        ITL_P99_SLO_MS: 100
+"""
+from dataclasses import dataclass, asdict, field
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class SearchConfig:
+    # First QPS to probe
+    start: float = 1.0
+    # Bounds of the search
+    min_qps: float = 0.05
+    max_qps: float = 128.0
+    # Multiplicative step of the bracketing phase
+    growth: float = 2.0
+    # Stop bisecting once (lowest failing / highest passing - 1) <= tolerance
+    tolerance: float = 0.1
+    # Upper bound on the number of probes (each probe is a full benchmark run)
+    max_probes: int = 10
+    # SLOs (None disables the check)
+    ttft_p99_slo_ms: Optional[float] = 2000.0
+    itl_p99_slo_ms: Optional[float] = None
+    # The achieved request rate must track the target
+    min_achieved_ratio: float = 0.9
+
+    @staticmethod
+    def from_spec(spec: Dict[str, Any]) -> "SearchConfig":
+        """Build the config from the QPS_SEARCH block of a workload in bench-spec.yaml."""
+        mapping = {
+            'START': 'start',
+            'MIN': 'min_qps',
+            'MAX': 'max_qps',
+            'GROWTH': 'growth',
+            'TOLERANCE': 'tolerance',
+            'MAX_PROBES': 'max_probes',
+            'TTFT_P99_SLO_MS': 'ttft_p99_slo_ms',
+            'ITL_P99_SLO_MS': 'itl_p99_slo_ms',
+            'MIN_ACHIEVED_RATIO': 'min_achieved_ratio',
+        }
+        kwargs = {}
+        for key, val in (spec or {}).items():
+            if key not in mapping:
+                raise ValueError(f"Unsupported QPS_SEARCH key: {key}")
+            kwargs[mapping[key]] = val
+        config = SearchConfig(**kwargs)
+        if config.growth <= 1:
+            raise ValueError("QPS_SEARCH GROWTH must be greater than 1")
+        if not config.min_qps <= config.start <= config.max_qps:
+            raise ValueError("QPS_SEARCH START must lie within [MIN, MAX]")
+        return config
+
+
+@dataclass
+class ProbeResult:
+    target_qps: float
+    achieved_qps: float
+    num_requests: int
+    mean_ttft_ms: float
+    p50_ttft_ms: float
+    p99_ttft_ms: float
+    p99_itl_ms: float
+    passed: bool
+    reason: str = ""
+
+
+@dataclass
+class SearchResult:
+    # Highest QPS that held the SLOs (None if even the lowest probe failed)
+    knee_qps: Optional[float]
+    # Every probe, sorted by target QPS
+    curve: List[ProbeResult] = field(default_factory=list)
+
+
+def evaluate_probe(df: pd.DataFrame, target_qps: float, config: SearchConfig) -> ProbeResult:
+    """Check a probe's per-request results against the SLOs."""
+    if df is None or df.empty:
+        return ProbeResult(target_qps, 0.0, 0, np.nan, np.nan, np.nan, np.nan, False, "no successful requests")
+
+    launch_span = df["launch_time"].max() - df["launch_time"].min()
+    achieved_qps = (len(df) - 1) / launch_span if launch_span > 0 else 0.0
+    ttft_ms = df["ttft"] * 1000
+    itl_ms = (df["generation_time"] / df["generation_tokens"] * 1000)
+    itl_ms = itl_ms.replace([float('inf'), -float('inf')], np.nan).dropna()
+    p99_itl = float(np.percentile(itl_ms, 99)) if len(itl_ms) else np.nan
+
+    result = ProbeResult(
+        target_qps=target_qps,
+        achieved_qps=achieved_qps,
+        num_requests=len(df),
+        mean_ttft_ms=float(ttft_ms.mean()),
+        p50_ttft_ms=float(np.percentile(ttft_ms, 50)),
+        p99_ttft_ms=float(np.percentile(ttft_ms, 99)),
+        p99_itl_ms=p99_itl,
+        passed=True,
+    )
+
+    violations = []
+    if config.ttft_p99_slo_ms is not None and result.p99_ttft_ms > config.ttft_p99_slo_ms:
+        violations.append(f"P99 TTFT {result.p99_ttft_ms:.0f}ms > {config.ttft_p99_slo_ms:g}ms")
+    if config.itl_p99_slo_ms is not None and not p99_itl <= config.itl_p99_slo_ms:
+        violations.append(f"P99 ITL {p99_itl:.1f}ms > {config.itl_p99_slo_ms:g}ms")
+    if achieved_qps < config.min_achieved_ratio * target_qps:
+        violations.append(f"achieved {achieved_qps:.2f} < {config.min_achieved_ratio:g} x {target_qps:g} QPS")
+    if violations:
+        result.passed = False
+        result.reason = "; ".join(violations)
+    return result
+
+
+def search_max_qps(
+    probe: Callable[[float], Optional[pd.DataFrame]],
+    config: SearchConfig,
+    log: Callable[[str], None] = print,
+) -> SearchResult:
+    """
+    probe: runs the workload at the given QPS and returns its per-request dataframe
+    """
+    curve: List[ProbeResult] = []
+    highest_pass: Optional[float] = None
+    lowest_fail: Optional[float] = None
+    qps = config.start
+
+    for _ in range(config.max_probes):
+        # QPS values end up in file names, keep them short
+        qps = round(qps, 3)
+        log(f"[saturation search] probing QPS={qps}")
+        result = evaluate_probe(probe(qps), qps, config)
+        curve.append(result)
+        log(f"[saturation search] QPS={qps}: achieved {result.achieved_qps:.2f} reqs/s, "
+            f"P99 TTFT {result.p99_ttft_ms:.0f}ms -> {'PASS' if result.passed else 'FAIL (' + result.reason + ')'}")
+
+        if result.passed:
+            highest_pass = qps if highest_pass is None else max(highest_pass, qps)
+        else:
+            lowest_fail = qps if lowest_fail is None else min(lowest_fail, qps)
+
+        if highest_pass is not None and lowest_fail is not None:
+            # bisection
+            if lowest_fail / highest_pass - 1 <= config.tolerance:
+                break
+            qps = (highest_pass + lowest_fail) / 2
+        elif lowest_fail is None:
+            # bracketing upwards
+            if highest_pass >= config.max_qps:
+                log(f"[saturation search] SLOs still hold at the maximum QPS {config.max_qps}")
+                break
+            qps = min(highest_pass * config.growth, config.max_qps)
+        else:
+            # bracketing downwards
+            if lowest_fail <= config.min_qps:
+                log(f"[saturation search] SLOs are violated even at the minimum QPS {config.min_qps}")
+                break
+            qps = max(lowest_fail / config.growth, config.min_qps)
+    else:
+        log(f"[saturation search] stopped after {config.max_probes} probes")
+
+    curve.sort(key=lambda r: r.target_qps)
+    return SearchResult(knee_qps=highest_pass, curve=curve)
+
+
+def report(result: SearchResult, output_path: Optional[str] = None) -> str:
+    """Format the latency-versus-load curve (and write it as CSV if output_path is given)."""
+    lines = ["============ Saturation search ============"]
+    lines.append(f"{'target QPS':>10}{'achieved':>10}{'requests':>10}{'P50 TTFT':>10}{'P99 TTFT':>10}{'P99 ITL':>10}  result")
+    for r in result.curve:
+        lines.append(f"{r.target_qps:>10g}{r.achieved_qps:>10.2f}{r.num_requests:>10}"
+                     f"{r.p50_ttft_ms:>10.0f}{r.p99_ttft_ms:>10.0f}{r.p99_itl_ms:>10.1f}  "
+                     f"{'PASS' if r.passed else 'FAIL: ' + r.reason}")
+    knee = "none (SLOs violated at every probed QPS)" if result.knee_qps is None else f"{result.knee_qps:g} QPS"
+    lines.append(f"Knee point (max sustainable QPS): {knee}")
+    lines.append("===========================================")
+    text = "\n".join(lines)
+
+    if output_path:
+        pd.DataFrame([asdict(r) for r in result.curve]).assign(
+            knee_qps=result.knee_qps
+        ).to_csv(output_path, index=False)
+    return text
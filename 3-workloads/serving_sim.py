@@ -0,0 +1,425 @@
+"""
+Discrete-event simulation of the serving stack, to pre-screen bench-spec configurations
+(replicaCount, tensorParallelSize, maxModelLen, QPS) without a cluster.
+
+The requests are the workloads' own streams (prefix_analyzer.py: the synthetic and agentic
+drivers stepped offline, ShareGPT run.json, the Mooncake trace). A session's next request
+is sent once its previous one finished (late requests are delayed, never skipped). Each
+replica runs vLLM-style continuous batching:
+  - every iteration decodes one token for each running request and prefills waiting
+    prompts in chunks up to --max-batched-tokens (at most --max-num-seqs requests)
+  - iteration time = base + prefill cost * prefilled tokens + decode cost * decoding requests
+  - a request is admitted once its prompt + max_tokens fit in the free KV cache; prompts
+    beyond maxModelLen fail, as the engine would reject them
+  - with prefix caching, the leading prompt blocks of earlier requests on the replica
+    (LRU over the KV-cache capacity) are not prefilled again
+Requests are spread over the replicas round-robin or by session (--routing).
+
+The costs are fitted from past per-request CSVs of a real run with --calibrate (decode cost
+from ITL against the number of requests in flight, prefill cost from the TTFT of lightly
+loaded requests against their prompt length) and scaled to other tensor-parallel sizes.
+
+Every configuration writes the CSV schema summarize.py consumes, so the simulated runs can
+be compared with real ones as they are:
+
+  python3 3-workloads/serving_sim.py synthetic --config '{"NUM_USERS": 350, "NUM_ROUNDS": 20,
+      "SYSTEM_PROMPT": 0, "CHAT_HISTORY": 20000, "ANSWER_LEN": 1000}' --points 0.5 1 2 4 \\
+      --replicas 1 2 --tp 1 2 --calibrate 4-latest-results/stack_synthetic_output_0.7.csv
+"""
+import argparse
+import heapq
+import itertools
+import json
+import sys
+import zlib
+from collections import OrderedDict, deque
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+WORKLOADS_DIR = Path(__file__).resolve().parent
+POST_PROCESSING_DIR = WORKLOADS_DIR.parent / '4-latest-results' / 'post-processing'
+sys.path.insert(0, str(WORKLOADS_DIR))
+from kv_cache_sim import GB, kv_bytes_per_token  # noqa: E402
+from prefix_analyzer import (  # noqa: E402
+    Request, add_workload_args, block_size_of, load_requests, resolve_workload_args,
+)
+
+ARRIVAL, ITERATION_END = 0, 1
+
+
+@dataclass
+class CostModel:
+    base_ms: float = 5.0
+    prefill_ms_per_token: float = 0.05
+    decode_ms_per_seq: float = 0.2
+
+    @classmethod
+    def calibrate(cls, csv_paths: List[str]) -> "CostModel":
+        """Fit the costs to per-request CSVs of past runs (same engine and GPU)."""
+        df = pd.concat([pd.read_csv(path) for path in csv_paths], ignore_index=True)
+        df = df[(df["generation_tokens"] > 1) & (df["generation_time"] > 0)]
+        if len(df) < 10:
+            raise ValueError("Too few requests in the calibration CSVs")
+        # requests in flight at the middle of each request's decode and at its launch
+        launches = np.sort(df["launch_time"].to_numpy())
+        finishes = np.sort(df["finish_time"].to_numpy())
+
+        def in_flight(t: np.ndarray) -> np.ndarray:
+            return np.searchsorted(launches, t, side="right") - np.searchsorted(finishes, t, side="right")
+
+        decode_mid = (df["launch_time"] + df["ttft"] + df["finish_time"]).to_numpy() / 2
+        concurrency = in_flight(decode_mid)
+        itl_ms = (df["generation_time"] / (df["generation_tokens"] - 1)).to_numpy() * 1000
+        decode_ms_per_seq, base_ms = np.polyfit(concurrency, itl_ms, 1)
+        base_ms = max(base_ms, 0.0)
+        decode_ms_per_seq = max(decode_ms_per_seq, 0.0)
+
+        # prefill: the lightly loaded half, where TTFT is mostly the request's own prefill
+        light = in_flight(df["launch_time"].to_numpy()) <= np.median(in_flight(df["launch_time"].to_numpy()))
+        ttft_ms = df["ttft"].to_numpy()[light] * 1000 - base_ms
+        prompt_tokens = df["prompt_tokens"].to_numpy()[light]
+        prefill_ms_per_token = max(float(np.dot(prompt_tokens, ttft_ms) / np.dot(prompt_tokens, prompt_tokens)), 0.0)
+        return cls(float(base_ms), prefill_ms_per_token, float(decode_ms_per_seq))
+
+    def scaled(self, tp: int, calibration_tp: int, tp_scaling: float) -> "CostModel":
+        """Per-token costs shrink sublinearly with the tensor-parallel size."""
+        factor = (calibration_tp / tp) ** tp_scaling
+        return replace(self, prefill_ms_per_token=self.prefill_ms_per_token * factor,
+                       decode_ms_per_seq=self.decode_ms_per_seq * factor)
+
+
+@dataclass
+class ServingConfig:
+    replicas: int
+    tp: int
+    max_model_len: int
+    kv_cache_tokens: int
+    max_num_seqs: int = 256
+    max_batched_tokens: int = 8192
+    prefix_caching: bool = True
+    routing: str = "roundrobin"
+
+
+class SimRequest:
+
+    def __init__(self, request: Request, user_id: int, question_id: int, scheduled: float):
+        self.request = request
+        self.user_id = user_id
+        self.question_id = question_id
+        self.scheduled = scheduled
+        self.arrival = scheduled
+        self.output_tokens = max(request.output_tokens, 1)
+        self.kv_tokens = request.prompt_tokens + self.output_tokens
+        self.prefill_left = 0
+        self.cached_tokens = 0
+        self.first_token_time = None
+        self.finish_time = None
+
+
+class Replica:
+
+    def __init__(self, sim: "ServingSimulator", index: int):
+        self.sim = sim
+        self.index = index
+        self.config = sim.config
+        self.cost = sim.cost
+        self.waiting: deque = deque()
+        self.prefilling: List[SimRequest] = []
+        # (finish counter, seq, request) of the decoding requests
+        self.decoding: List[Any] = []
+        self.counter = 0
+        self.reserved_tokens = 0
+        self.prefix_cache: "OrderedDict[int, None]" = OrderedDict()
+        self.prefix_capacity = self.config.kv_cache_tokens // sim.block_size
+        # the iteration in progress: (start, duration, iterations, prefill chunks)
+        self.iteration = None
+        self.version = 0
+
+    def arrive(self, req: SimRequest, now: float) -> None:
+        if req.kv_tokens > self.config.max_model_len or req.kv_tokens > self.config.kv_cache_tokens:
+            self.sim.fail(req)
+            return
+        self.waiting.append(req)
+        if self.iteration is None:
+            self.schedule(now)
+            return
+        # cut a multi-iteration decode jump at the next iteration boundary
+        start, duration, iterations, chunks = self.iteration
+        done = int((now - start) // duration) + 1
+        if not chunks and done < iterations:
+            self.version += 1
+            self.iteration = (start, duration, done, chunks)
+            self.sim.push(start + done * duration, ITERATION_END, (self, self.version))
+
+    def _admit(self) -> None:
+        running = len(self.prefilling) + len(self.decoding)
+        while self.waiting and running < self.config.max_num_seqs:
+            req = self.waiting[0]
+            if self.reserved_tokens + req.kv_tokens > self.config.kv_cache_tokens:
+                break
+            self.waiting.popleft()
+            self.reserved_tokens += req.kv_tokens
+            cached = 0
+            if self.config.prefix_caching:
+                for block in req.request.blocks:
+                    if block not in self.prefix_cache:
+                        break
+                    self.prefix_cache.move_to_end(block)
+                    cached += 1
+            # at least the last prompt token is computed
+            req.prefill_left = max(req.request.prompt_tokens - cached * self.sim.block_size, 1)
+            req.cached_tokens = max(req.request.prompt_tokens - req.prefill_left, 0)
+            self.prefilling.append(req)
+            running += 1
+
+    def schedule(self, now: float) -> None:
+        self._admit()
+        num_decoding = len(self.decoding)
+        budget = self.config.max_batched_tokens - num_decoding
+        chunks = []
+        for req in self.prefilling:
+            if budget <= 0:
+                break
+            chunk = min(req.prefill_left, budget)
+            chunks.append((req, chunk))
+            budget -= chunk
+        if chunks:
+            prefill_tokens = sum(chunk for _, chunk in chunks)
+            iterations = 1
+        elif num_decoding:
+            prefill_tokens = 0
+            # nothing changes until the next request finishes (or arrives)
+            iterations = max(self.decoding[0][0] - self.counter, 1)
+        else:
+            self.iteration = None
+            return
+        duration = max(self.cost.base_ms + self.cost.prefill_ms_per_token * prefill_tokens
+                       + self.cost.decode_ms_per_seq * num_decoding, 1e-3) / 1000
+        self.version += 1
+        self.iteration = (now, duration, iterations, chunks)
+        self.sim.push(now + iterations * duration, ITERATION_END, (self, self.version))
+
+    def iteration_end(self, version: int, now: float) -> None:
+        if version != self.version:
+            return
+        _, _, iterations, chunks = self.iteration
+        self.counter += iterations
+        for req, chunk in chunks:
+            req.prefill_left -= chunk
+            if req.prefill_left == 0:
+                self.prefilling.remove(req)
+                req.first_token_time = now
+                if req.output_tokens == 1:
+                    self.finish(req, now)
+                else:
+                    heapq.heappush(self.decoding, (self.counter + req.output_tokens - 1,
+                                                   next(self.sim.seq), req))
+        while self.decoding and self.decoding[0][0] <= self.counter:
+            _, _, req = heapq.heappop(self.decoding)
+            self.finish(req, now)
+        self.iteration = None
+        self.schedule(now)
+
+    def finish(self, req: SimRequest, now: float) -> None:
+        self.reserved_tokens -= req.kv_tokens
+        if self.config.prefix_caching:
+            for block in req.request.cached_blocks:
+                self.prefix_cache[block] = None
+                self.prefix_cache.move_to_end(block)
+            while len(self.prefix_cache) > self.prefix_capacity:
+                self.prefix_cache.popitem(last=False)
+        req.finish_time = now
+        self.sim.complete(req, now)
+
+
+class ServingSimulator:
+
+    def __init__(self, config: ServingConfig, cost: CostModel, block_size: int):
+        self.config = config
+        self.cost = cost
+        self.block_size = block_size
+        self.events: List[Any] = []
+        self.seq = itertools.count()
+        self.replicas = [Replica(self, i) for i in range(config.replicas)]
+        self._round_robin = itertools.cycle(self.replicas)
+        self.sessions: Dict[int, deque] = {}
+        self.finished: List[SimRequest] = []
+        self.failed = 0
+
+    def push(self, time: float, kind: int, payload: Any) -> None:
+        heapq.heappush(self.events, (time, next(self.seq), kind, payload))
+
+    def route(self, req: SimRequest) -> Replica:
+        if self.config.routing == "session":
+            return self.replicas[zlib.crc32(str(req.user_id).encode()) % len(self.replicas)]
+        return next(self._round_robin)
+
+    def _send_next(self, session: int, now: float) -> None:
+        queue = self.sessions[session]
+        if queue:
+            req = queue.popleft()
+            req.arrival = max(req.scheduled, now)
+            self.push(req.arrival, ARRIVAL, req)
+
+    def complete(self, req: SimRequest, now: float) -> None:
+        self.finished.append(req)
+        self._send_next(req.user_id, now)
+
+    def fail(self, req: SimRequest) -> None:
+        # the drivers drop failed requests from their results
+        self.failed += 1
+        self._send_next(req.user_id, req.arrival)
+
+    def run(self, requests: List[Request], time_scale: float = 1.0) -> pd.DataFrame:
+        question_ids: Dict[int, int] = {}
+        for request in requests:
+            question_ids[request.session] = question_ids.get(request.session, 0) + 1
+            req = SimRequest(request, request.session, question_ids[request.session], request.time * time_scale)
+            self.sessions.setdefault(request.session, deque()).append(req)
+        for session in self.sessions:
+            self._send_next(session, 0.0)
+
+        while self.events:
+            now, _, kind, payload = heapq.heappop(self.events)
+            if kind == ARRIVAL:
+                self.route(payload).arrive(payload, now)
+            else:
+                replica, version = payload
+                replica.iteration_end(version, now)
+        return self.results()
+
+    def results(self) -> pd.DataFrame:
+        """Per-request rows in the drivers' CSV schema."""
+        rows = sorted(self.finished, key=lambda r: r.arrival)
+        return pd.DataFrame({
+            "prompt_tokens": [r.request.prompt_tokens for r in rows],
+            "generation_tokens": [r.output_tokens for r in rows],
+            "cached_tokens": [r.cached_tokens for r in rows],
+            "ttft": [r.first_token_time - r.arrival for r in rows],
+            "generation_time": [r.finish_time - r.first_token_time for r in rows],
+            "user_id": [r.user_id for r in rows],
+            "question_id": [r.question_id for r in rows],
+            "launch_time": [r.arrival for r in rows],
+            "finish_time": [r.finish_time for r in rows],
+            "scheduled_time": [r.scheduled for r in rows],
+            "send_time": [r.arrival for r in rows],
+            "dispatch_delay": 0.0,
+            "missed_slots": 0,
+        })
+
+
+def default_points(args: argparse.Namespace, config: Dict[str, Any]) -> List[float]:
+    if args.workload == 'agentic':
+        return config.get('NEW_USER_INTERVALS') or [args.new_user_interval or 2]
+    if args.workload == 'mooncake':
+        return [1.0]
+    return config.get('QPS') or [args.qps or 1.0]
+
+
+def workload_requests(args: argparse.Namespace, point: float) -> List[Request]:
+    """The request stream at one sweep point (QPS, new-user interval or trace slowdown)."""
+    if args.workload in ('synthetic', 'sharegpt'):
+        args.qps = point
+    elif args.workload == 'agentic':
+        args.new_user_interval = point
+    return load_requests(args)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Simulate serving configurations on a workload's request stream.")
+    add_workload_args(parser)
+    parser.add_argument("--points", type=float, nargs="+", default=None,
+                        help="QPS (synthetic, sharegpt), new-user intervals (agentic) or slowdown "
+                        "factors (mooncake); default: the QPS / NEW_USER_INTERVALS of --config")
+    parser.add_argument("--replicas", type=int, nargs="+", default=[1], help="replicaCount values")
+    parser.add_argument("--tp", type=int, nargs="+", default=[1], help="tensorParallelSize values")
+    parser.add_argument("--max-model-len", type=int, nargs="+", default=[16384], help="maxModelLen values")
+    parser.add_argument("--model", type=str, default="meta-llama/Llama-3.1-8B-Instruct",
+                        help="Model whose KV-cache size per token sizes the cache (default: %(default)s)")
+    parser.add_argument("--model-config", type=str, default=None, help="config.json of the model")
+    parser.add_argument("--kv-cache-gb", type=float, default=40.0,
+                        help="KV-cache memory per GPU in GB (default: %(default)s)")
+    parser.add_argument("--max-num-seqs", type=int, default=256)
+    parser.add_argument("--max-batched-tokens", type=int, default=8192)
+    parser.add_argument("--no-prefix-caching", action="store_true", default=False)
+    parser.add_argument("--routing", choices=["roundrobin", "session"], default="roundrobin")
+    parser.add_argument("--calibrate", type=str, nargs="+", default=None,
+                        help="Per-request CSVs of past runs to fit the prefill and decode costs to")
+    parser.add_argument("--calibration-tp", type=int, default=1,
+                        help="tensorParallelSize of the calibration runs (default: %(default)s)")
+    parser.add_argument("--tp-scaling", type=float, default=0.8,
+                        help="Per-token cost ~ (calibration TP / TP) ** this (default: %(default)s)")
+    parser.add_argument("--base-ms", type=float, default=None, help="Override the per-iteration cost")
+    parser.add_argument("--prefill-ms-per-token", type=float, default=None, help="Override the prefill cost")
+    parser.add_argument("--decode-ms-per-seq", type=float, default=None, help="Override the decode cost")
+    parser.add_argument("--output-dir", type=str, default=None,
+                        help="Write the per-request CSV of every configuration into this directory")
+    parser.add_argument("--output", type=str, default=None, help="Write the summary table to this CSV file")
+    args = parser.parse_args()
+    resolve_workload_args(parser, args)
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+    output_dir = Path(args.output_dir).resolve() if args.output_dir else None
+    output = Path(args.output).resolve() if args.output else None
+    if str(POST_PROCESSING_DIR) not in sys.path:
+        sys.path.insert(0, str(POST_PROCESSING_DIR))
+    from summarize import compute_metrics
+
+    cost = CostModel.calibrate(args.calibrate) if args.calibrate else CostModel()
+    overrides = {"base_ms": args.base_ms, "prefill_ms_per_token": args.prefill_ms_per_token,
+                 "decode_ms_per_seq": args.decode_ms_per_seq}
+    cost = replace(cost, **{k: v for k, v in overrides.items() if v is not None})
+    print(f"Cost model (TP {args.calibration_tp}): {cost}")
+
+    config = json.loads(args.config) if args.config else {}
+    bytes_per_token = kv_bytes_per_token(args.model, args.model_config, 2)
+    block_size = block_size_of(args)
+    if output_dir is not None:
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    rows = []
+    for point in args.points or default_points(args, config):
+        requests = workload_requests(args, point)
+        time_scale = point if args.workload == 'mooncake' else 1.0
+        for replicas, tp, max_model_len in itertools.product(args.replicas, args.tp, args.max_model_len):
+            serving = ServingConfig(
+                replicas=replicas, tp=tp, max_model_len=max_model_len,
+                kv_cache_tokens=int(args.kv_cache_gb * tp * GB // bytes_per_token),
+                max_num_seqs=args.max_num_seqs, max_batched_tokens=args.max_batched_tokens,
+                prefix_caching=not args.no_prefix_caching, routing=args.routing,
+            )
+            simulator = ServingSimulator(serving, cost.scaled(tp, args.calibration_tp, args.tp_scaling),
+                                         block_size)
+            df = simulator.run(requests, time_scale)
+            row = {"point": point, "replicas": replicas, "tp": tp, "max_model_len": max_model_len,
+                   "failed_requests": simulator.failed}
+            if len(df):
+                metrics = compute_metrics(df)
+                row.update({k: metrics[k] for k in (
+                    "successful_requests", "request_throughput", "output_token_throughput",
+                    "mean_ttft_ms", "p99_ttft_ms", "mean_itl_ms", "p99_itl_ms", "sent_request_rate",
+                    "p99_schedule_lag_ms")})
+            rows.append(row)
+            if output_dir is not None:
+                name = f"sim_{args.workload}_r{replicas}_tp{tp}_len{max_model_len}_output_{point}.csv"
+                df.to_csv(output_dir / name, index=False)
+
+    table = pd.DataFrame(rows)
+    print("============ Serving Simulation ============")
+    with pd.option_context('display.max_rows', None, 'display.width', 250):
+        print(table.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+    print("============================================")
+    if output is not None:
+        table.to_csv(output, index=False)
+        print(f"Summary written to {output}")
+
+
+if __name__ == "__main__":
+    main()
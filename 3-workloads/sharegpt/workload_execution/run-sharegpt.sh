@@ -27,33 +27,38 @@ else
     QPS_VALUES=(1.34)  # Default QPS value
 fi
 
-warm_up() {
-    # $1: qps
-    # $2: output file
+# Run length of each benchmark: by default all prompts of run.json are replayed,
+# run-bench.py may set a --time limit or a convergence-driven stop (--converge-metrics ...)
+RUN_LENGTH_ARGS=${RUN_LENGTH_ARGS:-}
 
-    python3 "${SCRIPT_DIR}/sharegpt-qa.py" \
-        --qps "$1" \
-        --model "$MODEL" \
-        --base-url "$BASE_URL" \
-        --output /tmp/warmup.csv \
-        --log-interval 30 \
-        --sharegpt-file "../warmup.json"
+# Prometheus metrics (set by run-bench.py): --metrics-port 9400 serves the load generator's,
+# --engine-metrics-interval 5 scrapes the engine's every 5s (default 1s, 0 disables)
+METRICS_ARGS=${METRICS_ARGS:-}
 
-    sleep 10
-}
+# Generation mode of the benchmark runs (set by run-bench.py): prefill (max_tokens 1) or
+# decode (exactly the workload's output lengths), the workload's own output lengths by default
+GENERATION_MODE=${GENERATION_MODE:-}
+GENERATION_ARGS=${GENERATION_MODE:+--generation-mode $GENERATION_MODE}
 
 run_benchmark() {
     # $1: qps
     # $2: output file
 
-    # Real run
+    # Real run, after warming the engine up with the prompts of warmup.json (disjoint from
+    # run.json, whose prompts would otherwise be cached) until TTFT and throughput are
+    # steady (at most 120 s)
     python3 "${SCRIPT_DIR}/sharegpt-qa.py" \
         --qps "$1" \
         --model "$MODEL" \
         --base-url "$BASE_URL" \
         --output "$2" \
         --log-interval 30 \
-        --sharegpt-file "../run.json"
+        --sharegpt-file "../run.json" \
+        --warmup-file "../warmup.json" \
+        --warmup-time 120 \
+        $RUN_LENGTH_ARGS \
+        $METRICS_ARGS \
+        $GENERATION_ARGS
 
     sleep 10
 }
@@ -61,7 +66,6 @@ run_benchmark() {
 # Run benchmarks for the specified QPS values
 for qps in "${QPS_VALUES[@]}"; do
     output_file="../../../4-latest-results/${KEY}_sharegpt_output_${qps}.csv"
-    warm_up "$qps"
     run_benchmark "$qps" "$output_file"
 
     # Change to project root before running summarize.py
@@ -73,7 +77,8 @@ for qps in "${QPS_VALUES[@]}"; do
         LIMIT="$LIMIT" \
         MIN_ROUNDS="$MIN_ROUNDS" \
         START_ROUND="$START_ROUND" \
-        QPS="$qps"
+        QPS="$qps" \
+        ${GENERATION_MODE:+GENERATION_MODE=$GENERATION_MODE}
     # Change back to script directory
     cd "$SCRIPT_DIR"
 done
\ No newline at end of file
@@ -14,12 +14,30 @@ import json
 import logging
 import time
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import random
 import openai
 import pandas as pd
 
-from utils import AsyncLoopWrapper, init_logger
+from utils import (
+    AsyncLoopWrapper,
+    ConvergenceMonitor,
+    MetricsExporter,
+    SteadyStateWarmup,
+    add_convergence_args,
+    add_engine_metrics_args,
+    add_generation_mode_args,
+    add_metrics_args,
+    add_warmup_args,
+    build_convergence_monitor,
+    build_warmup,
+    cached_prompt_tokens,
+    generation_kwargs,
+    init_logger,
+    start_engine_scraper,
+    start_metrics_exporter,
+    write_warmup_report,
+)
 
 logger = init_logger(__name__, logging.INFO)
 
@@ -34,6 +52,10 @@ def parse_args() -> argparse.Namespace:
 
     parser.add_argument("--sharegpt-file", default="round_robin_1000_5.json",
                         help="JSON file with ShareGPT prompts (default: %(default)s)")
+    parser.add_argument("--warmup-file", default="../warmup.json",
+                        help="JSON file with the ShareGPT prompts of the warmup (--warmup-time), "
+                        "disjoint from --sharegpt-file so the run's prompts are not cached "
+                        "beforehand (default: %(default)s)")
     parser.add_argument("--base-url", required=True,
                         help="Base URL of the OpenAI‑compatible server")
     parser.add_argument("--model", required=True,
@@ -48,6 +70,11 @@ def parse_args() -> argparse.Namespace:
                         help="Maximum time to run the benchmark in seconds")
     parser.add_argument("--verbose", action="store_true",
                         help="Enable DEBUG logging")
+    add_convergence_args(parser)
+    add_metrics_args(parser)
+    add_engine_metrics_args(parser)
+    add_generation_mode_args(parser)
+    add_warmup_args(parser)
     return parser.parse_args()
 
 # ---------------------------------------------------------------------------
@@ -63,17 +90,20 @@ class Response:
     generation_tokens: int
     launch_time: float
     finish_time: float
+    # prompt tokens served from the engine's prefix cache, None if not reported
+    cached_tokens: Optional[int] = None
 
 
 class RequestExecutor:
     """Thin wrapper over OpenAI async client that measures latency."""
 
-    def __init__(self, base_url: str, api_key: str, model: str):
+    def __init__(self, base_url: str, api_key: str, model: str, generation_mode: str = "mixed"):
         # Ensure base_url ends with /v1 for vLLM
         # if not base_url.endswith('/v1'):
         #     base_url = base_url.rstrip('/') + '/v1'
         self.client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url)
         self.model = model
+        self.generation_mode = generation_mode
         self.loop = AsyncLoopWrapper.GetOrStartLoop()
 
     async def _async_request(self, messages, max_tokens: int) -> Response:
@@ -87,7 +117,7 @@ class RequestExecutor:
                 model=self.model,
                 temperature=0,
                 stream=True,
-                max_tokens=max_tokens,
+                **generation_kwargs(self.generation_mode, max_tokens),
                 stream_options={"include_usage": True},
             )
 
@@ -109,9 +139,11 @@ class RequestExecutor:
                 generation_tokens=usage.completion_tokens,
                 launch_time=start,
                 finish_time=time.time(),
+                cached_tokens=cached_prompt_tokens(usage),
             )
         except Exception as e:
             logger.error(f"Error in request: {str(e)}")
+            MetricsExporter.RequestFinished(None)
             raise
 
     def launch_request(self, prompt: str, max_tokens: int, on_finish) -> None:
@@ -127,17 +159,21 @@ class RequestExecutor:
 class BenchmarkRunner:
     """Dispatch prompts at desired QPS and collect latency metrics."""
 
-    def __init__(self, prompts: List[dict], executor: RequestExecutor, qps: float, time_limit: Optional[int] = None):
+    def __init__(self, prompts: List[dict], executor: RequestExecutor, qps: float, time_limit: Optional[int] = None,
+                 convergence: Optional[ConvergenceMonitor] = None):
         self.prompts = prompts
         self.executor = executor
         self.qps = qps
         self.time_limit = time_limit
-        self.results: List[Response] = []
+        self.convergence = convergence
+        # (response, scheduled time, send time)
+        self.results: List[Tuple[Response, float, float]] = []
         self._next_idx = 0
         self.start_time = time.time()
 
-    def _on_finish(self, resp: Response):
-        self.results.append(resp)
+    def _on_finish(self, resp: Response, scheduled: float, sent: float):
+        MetricsExporter.RequestFinished(resp)
+        self.results.append((resp, scheduled, sent))
 
     def run(self) -> pd.DataFrame:
         logger.info("Benchmark started: %d prompts at %.2f QPS", len(self.prompts), self.qps)
@@ -148,6 +184,11 @@ class BenchmarkRunner:
                 logger.info(f"Time limit of {self.time_limit} seconds reached, stopping benchmark")
                 break
 
+            if self.convergence is not None and self.convergence.converged(
+                    self._results_df, self.start_time, time.time()):
+                logger.info("Metrics converged, stopping benchmark")
+                break
+
             scheduled = self.start_time + self._next_idx / self.qps
             if time.time() < scheduled:
                 time.sleep(0.001)
@@ -156,23 +197,49 @@ class BenchmarkRunner:
             entry = self.prompts[self._next_idx]
             prompt = str(self.qps) + " " + entry["input"] # To avoid cache hit cross run
             max_tokens = entry.get("output_length", 1)
-            self.executor.launch_request(prompt, max_tokens, self._on_finish)
+            sent = time.time()
+            MetricsExporter.RequestSent(scheduled, sent)
+            self.executor.launch_request(
+                prompt, max_tokens,
+                lambda resp, scheduled=scheduled, sent=sent: self._on_finish(resp, scheduled, sent))
             self._next_idx += 1
 
         AsyncLoopWrapper.WaitLoop()  # wait for inflight requests
         logger.info("All requests completed")
 
-        df = pd.DataFrame({
-            "prompt_tokens": [r.prompt_tokens for r in self.results],
-            "generation_tokens": [r.generation_tokens for r in self.results],
-            "ttft": [r.ttft for r in self.results],
-            "generation_time": [r.generation_time for r in self.results],
-            "launch_time": [r.launch_time for r in self.results],
-            "finish_time": [r.finish_time for r in self.results],
+        # Ensure deterministic ordering for downstream scripts/visualisation
+        return self._results_df().sort_values("launch_time").reset_index(drop=True)
+
+    def _results_df(self) -> pd.DataFrame:
+        results = list(self.results)  # snapshot, callbacks append concurrently
+        return pd.DataFrame({
+            "prompt_tokens": [r.prompt_tokens for r, _, _ in results],
+            "generation_tokens": [r.generation_tokens for r, _, _ in results],
+            "cached_tokens": pd.array([r.cached_tokens for r, _, _ in results], dtype="Int64"),
+            "ttft": [r.ttft for r, _, _ in results],
+            "generation_time": [r.generation_time for r, _, _ in results],
+            "launch_time": [r.launch_time for r, _, _ in results],
+            "finish_time": [r.finish_time for r, _, _ in results],
+            # intended send time on the fixed-QPS grid, when the request was handed to
+            # the executor and how long the event loop took to start it
+            "scheduled_time": [scheduled for _, scheduled, _ in results],
+            "send_time": [sent for _, _, sent in results],
+            "dispatch_delay": [r.launch_time - sent for r, _, sent in results],
+            # the dispatcher catches up instead of skipping slots
+            "missed_slots": [0] * len(results),
         })
 
-        # Ensure deterministic ordering for downstream scripts/visualisation
-        return df.sort_values("launch_time").reset_index(drop=True)
+def warmup_engine(prompts: List[dict], executor: RequestExecutor, qps: float,
+                  warmup: SteadyStateWarmup) -> Dict[str, Any]:
+    """
+    Warm the engine up at the run's QPS with prompts of their own (the run's prompts would
+    be cached beforehand), until TTFT and throughput are steady or for at most
+    warmup.max_time seconds. Returns the warmup report.
+    """
+    logger.info("Warming up the engine with %d warmup prompts", len(prompts))
+    runner = BenchmarkRunner(prompts, executor, qps, warmup.max_time, warmup)
+    df = runner.run()
+    return warmup.report(df, runner.start_time, time.time())
 
 # ---------------------------------------------------------------------------
 # Summary helpers
@@ -202,14 +269,27 @@ def main():
         logger.info(f"Loaded {len(prompts)} ShareGPT entries")
 
         # Initialize executor
-        executor = RequestExecutor(args.base_url, "EMPTY", args.model)
+        executor = RequestExecutor(args.base_url, "EMPTY", args.model, args.generation_mode)
+
+        warmup = build_warmup(args)
+        warmup_report = None
+        if warmup is not None:
+            with open(args.warmup_file, "r") as f:
+                warmup_report = warmup_engine(json.load(f), executor, args.qps, warmup)
+
+        start_metrics_exporter(args, "sharegpt")
+        scraper = start_engine_scraper(args)
 
         # Run benchmark
-        runner = BenchmarkRunner(prompts, executor, args.qps, args.time)
+        runner = BenchmarkRunner(prompts, executor, args.qps, args.time,
+                                 build_convergence_monitor(args))
         df = runner.run()
+        if scraper is not None:
+            scraper.stop()
 
         # Write results
         df.to_csv(args.output, index=False)
+        write_warmup_report(warmup_report, args.output)
         logger.info(f"Results written to {args.output}")
 
         # TODO: call the summarize script here
@@ -0,0 +1,349 @@
+"""
+In-process sweeps over the QPS (or new-user-interval) points of one workload config.
+
+The bash launchers start a fresh Python process for every warmup and every run, so each
+point re-parses its dataset, opens new connections and restarts the event loop. This
+driver runs all points in a single process instead:
+  - the dataset is loaded once
+  - one RequestExecutor (HTTP connection pool + event loop) serves every warmup and run
+  - every per-request CSV is summarised in-process (summarize.process_output)
+  - a QPS_SEARCH probes in-process as well
+
+  python3 3-workloads/sweep.py synthetic --model <model> --base-url <url> --key <key> \\
+      --config '{"NUM_USERS_WARMUP": 650, "NUM_USERS": 350, "NUM_ROUNDS": 20, ...,
+                 "QPS": [0.7, 1.0]}'
+
+--config is the workload entry of bench-spec.yaml as JSON (run-bench.py passes it when the
+entry sets IN_PROCESS_SWEEP: true). QPS / NEW_USER_INTERVALS, QPS_SEARCH, CONVERGENCE,
+METRICS_PORT and ENGINE_METRICS_INTERVAL behave as with the launchers (the live metrics
+are served once for the whole sweep). Output files are the same as the
+launchers': 4-latest-results/<KEY>_<workload>_output_<qps>.csv (plus its engine metrics
+CSV) and the summarised .results files.
+"""
+import abc
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from types import ModuleType
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+WORKLOADS_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = WORKLOADS_DIR.parent
+POST_PROCESSING_DIR = PROJECT_ROOT / '4-latest-results' / 'post-processing'
+
+sys.path.insert(0, str(WORKLOADS_DIR))
+from saturation_search import SearchConfig, search_max_qps, report  # noqa: E402
+
+
+@contextmanager
+def working_directory(path: Path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def load_driver(driver_path: Path) -> ModuleType:
+    """
+    Import a workload driver script (the file names are hyphenated) as a module.
+    The drivers resolve their data files and `utils` relative to their own directory,
+    so the sweep keeps that directory as working directory and first on sys.path.
+    """
+    os.chdir(driver_path.parent)
+    sys.path.insert(0, str(driver_path.parent))
+    spec = importlib.util.spec_from_file_location(driver_path.stem.replace('-', '_'), driver_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def summarize_in_process(csv_path: Path, **kwargs) -> None:
+    """Same as `python3 4-latest-results/post-processing/summarize.py <csv> KEY=... ...`."""
+    if str(POST_PROCESSING_DIR) not in sys.path:
+        sys.path.insert(0, str(POST_PROCESSING_DIR))
+    import summarize
+    # summarize.py writes its results relative to the project root
+    with working_directory(PROJECT_ROOT):
+        summarize.process_output(str(csv_path.relative_to(PROJECT_ROOT)), **kwargs)
+
+
+class Sweep(abc.ABC):
+    """
+    One workload config swept in a single process. Subclasses load their dataset and
+    executor once in setup() and run a single point (warmup + benchmark) in run_point().
+    """
+    # Name of the workload in the result file names
+    workload: str
+    # Driver script, relative to 3-workloads
+    driver: str
+    # Config key of the swept values and summary key of a single value
+    points_key: str = 'QPS'
+    point_param: str = 'QPS'
+    # Run length of a benchmark without CONVERGENCE (None: until the dataset is exhausted)
+    default_time: Optional[float] = 100
+    supports_search: bool = True
+    # Report of the last point's warmup (set by run_point, None without a steady-state warmup)
+    warmup_report: Optional[Dict[str, Any]] = None
+
+    def __init__(self, config: Dict[str, Any], model: str, base_url: str, key: str,
+                 cooldown: float = 0.0):
+        self.config = config
+        self.model = model
+        self.base_url = base_url
+        self.key = key
+        self.cooldown = cooldown
+        self.generation_mode = config.get('GENERATION_MODE', 'mixed')
+        self.metrics_port = config.get('METRICS_PORT')
+        self.module = load_driver(WORKLOADS_DIR / self.driver)
+        # the utils copy next to the driver (first on sys.path, already imported by it): the
+        # drivers do not re-export the helpers the sweep uses around them (engine metrics scraper, ...)
+        self.utils = importlib.import_module('utils')
+        self.setup()
+
+    @abc.abstractmethod
+    def setup(self) -> None:
+        """Load the dataset and create the executor, once per sweep."""
+
+    @abc.abstractmethod
+    def run_point(self, value: float, time_limit: Optional[float], convergence) -> pd.DataFrame:
+        """Warm up and run a single point, return its per-request results."""
+
+    @abc.abstractmethod
+    def summary_params(self) -> Dict[str, Any]:
+        """Workload parameters recorded with every summary."""
+
+    def run_length(self) -> Tuple[Optional[float], Any]:
+        """Time limit and (fresh) convergence monitor of one benchmark, as in run_length_env()."""
+        convergence = self.config.get('CONVERGENCE')
+        if not convergence:
+            return self.default_time, None
+        monitor = self.module.ConvergenceMonitor(
+            convergence.get('METRICS', ['p99_ttft', 'throughput']),
+            convergence.get('CI_WIDTH', 0.1),
+            min_time=convergence.get('MIN_TIME', 60),
+        )
+        return convergence.get('MAX_TIME', 600), monitor
+
+    def warmup(self):
+        """Steady-state warmup of one point, at most NUM_USERS_WARMUP / 2 seconds as in the launchers."""
+        return self.utils.SteadyStateWarmup(self.config['NUM_USERS_WARMUP'] // 2)
+
+    def start_engine_scraper(self, output_path: Path):
+        """Scrape the engine's /metrics next to the point's CSV, as the drivers' --engine-metrics-interval."""
+        interval = self.config.get('ENGINE_METRICS_INTERVAL', 1.0)
+        if not interval:
+            return None
+        return self.utils.EngineMetricsScraper(
+            self.utils.engine_metrics_url(self.base_url), interval,
+            self.utils.engine_metrics_path(str(output_path))).start()
+
+    def output_path(self, value: float) -> Path:
+        return PROJECT_ROOT / '4-latest-results' / f"{self.key}_{self.workload}_output_{value}.csv"
+
+    def measure(self, value: float) -> pd.DataFrame:
+        """Run one point, write its per-request CSV and summarise it."""
+        print(f"[sweep] Running {self.workload} with {self.point_param}={value}")
+        time_limit, convergence = self.run_length()
+        output_path = self.output_path(value)
+        scraper = self.start_engine_scraper(output_path)
+        try:
+            df = self.run_point(value, time_limit, convergence)
+        finally:
+            if scraper is not None:
+                scraper.stop()
+
+        df.to_csv(output_path, index=False)
+        self.utils.write_warmup_report(self.warmup_report, str(output_path))
+        print(f"[sweep] Results written to {output_path}")
+        params = self.summary_params()
+        if 'GENERATION_MODE' in self.config:
+            params['GENERATION_MODE'] = self.generation_mode
+        summarize_in_process(output_path, KEY=self.key, WORKLOAD=self.workload,
+                             **params, **{self.point_param: value})
+
+        # Idle time between points lets the engine settle, but long pauses also
+        # expire the pooled keep-alive connections
+        time.sleep(self.cooldown)
+        return df
+
+    def run(self) -> None:
+        if self.metrics_port:
+            self.utils.MetricsExporter.Start(self.metrics_port, self.workload)
+        try:
+            if 'QPS_SEARCH' in self.config:
+                if not self.supports_search:
+                    raise ValueError(f"QPS_SEARCH is not supported for the {self.workload} workload")
+                result = search_max_qps(self.measure, SearchConfig.from_spec(self.config['QPS_SEARCH']))
+                curve_path = PROJECT_ROOT / '4-latest-results' / f"{self.key}_{self.workload}_saturation.csv"
+                print(report(result, str(curve_path)))
+                print(f"Latency-versus-load curve written to {curve_path}")
+            else:
+                for value in self.config.get(self.points_key) or []:
+                    self.measure(value)
+        finally:
+            self.utils.MetricsExporter.Stop()
+            self.module.AsyncLoopWrapper.StopLoop()
+
+
+class SyntheticSweep(Sweep):
+    """Mirrors run_synthetic.sh."""
+    workload = 'synthetic'
+    driver = 'synthetic/multi-round-qa.py'
+
+    def setup(self) -> None:
+        self.executor = self.module.RequestExecutor(base_url=self.base_url, model=self.model,
+                                                    generation_mode=self.generation_mode)
+        self.use_sharegpt = bool(self.config.get('USE_SHAREGPT', False))
+        if self.use_sharegpt:
+            self.module.load_sharegpt_dataset()
+        # init-user-id starts at 1 and advances by NUM_USERS_WARMUP per point
+        self.init_user_id = 1
+
+    def _workload_config(self, num_users: int, num_rounds: int, qps: float):
+        return self.module.WorkloadConfig(
+            num_users=num_users,
+            system_prompt_len=self.config['SYSTEM_PROMPT'],
+            user_info_len=self.config['CHAT_HISTORY'],
+            answer_len=self.config['ANSWER_LEN'],
+            num_rounds=num_rounds,
+            qps=qps,
+            model=self.model,
+            enable_user_id=False,
+            open_loop=self.config.get('OPEN_LOOP', False),
+        )
+
+    def run_point(self, value: float, time_limit: Optional[float], convergence) -> pd.DataFrame:
+        workload_config = self._workload_config(self.config['NUM_USERS'], self.config['NUM_ROUNDS'], value)
+        # warmup with the run's own users (current init ID)
+        self.warmup_report = self.module.warmup_engine(
+            self.executor,
+            workload_config,
+            self.warmup(),
+            init_user_id=self.init_user_id,
+            use_sharegpt=self.use_sharegpt,
+        )
+        df = self.module.run_benchmark(
+            self.executor,
+            workload_config,
+            init_user_id=self.init_user_id,
+            use_sharegpt=self.use_sharegpt,
+            time_limit=time_limit,
+            convergence=convergence,
+        )
+        self.init_user_id += self.config['NUM_USERS_WARMUP']
+        return df
+
+    def summary_params(self) -> Dict[str, Any]:
+        return {name: self.config.get(name) for name in (
+            'NUM_USERS_WARMUP', 'NUM_USERS', 'NUM_ROUNDS', 'SYSTEM_PROMPT',
+            'CHAT_HISTORY', 'ANSWER_LEN')} | {'USE_SHAREGPT': self.use_sharegpt}
+
+
+class ShareGPTSweep(Sweep):
+    """Mirrors run-sharegpt.sh."""
+    workload = 'sharegpt'
+    driver = 'sharegpt/workload_execution/sharegpt-qa.py'
+    default_time = None
+
+    def setup(self) -> None:
+        self.executor = self.module.RequestExecutor(self.base_url, "EMPTY", self.model, self.generation_mode)
+        with open("../warmup.json", "r") as f:
+            self.warmup_prompts = json.load(f)
+        with open("../run.json", "r") as f:
+            self.run_prompts = json.load(f)
+        print(f"[sweep] Loaded {len(self.warmup_prompts)} warmup and {len(self.run_prompts)} run prompts")
+
+    def warmup(self):
+        """Steady-state warmup on the warmup prompts, at most 120 seconds as in run-sharegpt.sh."""
+        return self.utils.SteadyStateWarmup(120)
+
+    def run_point(self, value: float, time_limit: Optional[float], convergence) -> pd.DataFrame:
+        self.warmup_report = self.module.warmup_engine(self.warmup_prompts, self.executor, value, self.warmup())
+        return self.module.BenchmarkRunner(
+            self.run_prompts, self.executor, value, time_limit, convergence
+        ).run()
+
+    def summary_params(self) -> Dict[str, Any]:
+        return {name: self.config.get(name) for name in ('LIMIT', 'MIN_ROUNDS', 'START_ROUND')}
+
+
+class AgenticSweep(Sweep):
+    """Mirrors run_agentic.sh; the swept value is the new-user interval."""
+    workload = 'agentic'
+    driver = 'agentic/agentic-qa.py'
+    points_key = 'NEW_USER_INTERVALS'
+    point_param = 'NEW_USER_INTERVAL'
+    supports_search = False
+
+    def setup(self) -> None:
+        self.models = [self.model] * self.config['NUM_AGENTS']
+        self.executor = self.module.RequestExecutor(base_url=self.base_url, model=self.models,
+                                                    generation_mode=self.generation_mode)
+
+    def _workload_config(self, num_rounds: int, new_user_interval: float):
+        return self.module.WorkloadConfig(
+            system_prompt_len=self.config['SYSTEM_PROMPT'],
+            user_info_len=self.config['CHAT_HISTORY'],
+            answer_len=self.config['ANSWER_LEN'],
+            num_rounds=num_rounds,
+            model=self.models,
+            user_request_interval=1,
+            new_user_interval=new_user_interval,
+            num_agents=self.config['NUM_AGENTS'],
+            whole_history=False,
+        )
+
+    def run_point(self, value: float, time_limit: Optional[float], convergence) -> pd.DataFrame:
+        workload_config = self._workload_config(self.config['NUM_ROUNDS'], value)
+        self.warmup_report = self.module.warmup_engine(self.executor, workload_config, self.warmup())
+        return self.module.run_benchmark(
+            self.executor,
+            workload_config,
+            time_limit=time_limit,
+            convergence=convergence,
+        )
+
+    def summary_params(self) -> Dict[str, Any]:
+        return {name: self.config.get(name) for name in (
+            'NUM_USERS_WARMUP', 'NUM_AGENTS', 'NUM_ROUNDS', 'SYSTEM_PROMPT',
+            'CHAT_HISTORY', 'ANSWER_LEN')}
+
+
+SWEEPS = {
+    'synthetic': SyntheticSweep,
+    'sharegpt': ShareGPTSweep,
+    'agentic': AgenticSweep,
+}
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run all QPS points of a workload config in one process.")
+    parser.add_argument("workload", choices=list(SWEEPS), help="Workload to sweep")
+    parser.add_argument("--model", type=str, required=True, help="Model name")
+    parser.add_argument("--base-url", type=str, required=True, help="Base URL of the serving engine endpoint")
+    parser.add_argument("--key", type=str, required=True, help="Key embedded in the result file names")
+    parser.add_argument("--config", type=str, required=True,
+                        help="Workload entry of bench-spec.yaml as JSON")
+    parser.add_argument("--cooldown", type=float, default=0.0,
+                        help="Seconds to idle between runs (default: %(default)s)")
+    return parser.parse_args(argv)
+
+
+def main() -> None:
+    args = parse_args()
+    sweep = SWEEPS[args.workload](json.loads(args.config), args.model, args.base_url,
+                                  args.key, cooldown=args.cooldown)
+    sweep.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,12 +4,31 @@ import json
 import logging
 import time
 from dataclasses import dataclass
-from typing import Optional, List, Dict
+from typing import Any, Optional, List, Dict
 
 import openai
 import pandas as pd
 
-from utils import AsyncLoopWrapper, init_logger
+from utils import (
+    AsyncLoopWrapper,
+    ConvergenceMonitor,
+    MetricsExporter,
+    SteadyStateWarmup,
+    TokenCounter,
+    add_convergence_args,
+    add_engine_metrics_args,
+    add_generation_mode_args,
+    add_metrics_args,
+    add_warmup_args,
+    build_convergence_monitor,
+    build_warmup,
+    cached_prompt_tokens,
+    generation_kwargs,
+    init_logger,
+    start_engine_scraper,
+    start_metrics_exporter,
+    write_warmup_report,
+)
 
 logger = init_logger(__name__, logging.INFO)
 
@@ -40,6 +59,9 @@ class WorkloadConfig:
     # Whether to include user id in request header
     enable_user_id: bool
 
+    # Keep every user on a fixed request schedule and measure latency from it
+    open_loop: bool = False
+
 
 @dataclass
 class UserConfig:
@@ -64,6 +86,9 @@ class UserConfig:
     # Whether to include user id in request header
     enable_user_id: bool
 
+    # Open-loop schedule (see UserSession._launch_new_request)
+    open_loop: bool = False
+
     @staticmethod
     def new_user_config(user_id: int, workload_config: WorkloadConfig) -> "UserConfig":
         return UserConfig(
@@ -74,6 +99,7 @@ class UserConfig:
             gap_between_requests=workload_config.num_users / workload_config.qps,
             num_rounds=workload_config.num_rounds,
             enable_user_id=workload_config.enable_user_id,
+            open_loop=workload_config.open_loop,
         )
 
 
@@ -112,6 +138,10 @@ class Response:
     generation_tokens: int
     launch_time: float
     finish_time: float
+    # prompt tokens served from the engine's prefix cache, None if not reported
+    cached_tokens: Optional[int] = None
+    # the stream carried no usage, the token counts come from the local tokenizer
+    tokens_counted_locally: bool = False
 
 """
 curl http://localhost:30080/v1/chat/completions \
@@ -129,7 +159,7 @@ curl http://localhost:30080/v1/chat/completions \
 
 class RequestExecutor:
 
-    def __init__(self, base_url: str, model: str):
+    def __init__(self, base_url: str, model: str, generation_mode: str = "mixed"):
         # For vLLM server, we don't need an API key, but the client requires one
         self.client = openai.AsyncOpenAI(
             api_key="vllm_xxxxxxxxxxxxx",  # Dummy API key for vLLM server
@@ -139,6 +169,8 @@ class RequestExecutor:
         logging.info(f"Initialized OpenAI client with base_url={base_url} and model={model}")
         self.loop = AsyncLoopWrapper.GetOrStartLoop()
         self.request_history = []
+        self.warned_local_counts = False
+        self.generation_mode = generation_mode
 
     async def _async_launch_request(self, messages: List[Dict[str, str]],  max_tokens: int,
                                     extra_headers: Optional[Dict[str, str]] = None):
@@ -149,6 +181,7 @@ class RequestExecutor:
             words = ""
             tokens_out = 0
             tokens_prefill = 0
+            tokens_cached = None
             start_time = time.time()
             first_token_time = None
 
@@ -157,7 +190,7 @@ class RequestExecutor:
                 model=self.model,
                 messages=messages,
                 stream=True,
-                max_tokens=max_tokens,
+                **generation_kwargs(self.generation_mode, max_tokens),
                 temperature=0.0,
                 stream_options={"include_usage": True},
                 extra_headers=extra_headers,
@@ -174,30 +207,26 @@ class RequestExecutor:
                         first_token_time = time.time()
                     words += chunk.choices[0].delta.content
 
+            finish_time = time.time()
+
             # Handle token counts if available
             if hasattr(chunk, 'usage') and chunk.usage is not None:
                 tokens_out = chunk.usage.completion_tokens
                 tokens_prefill = chunk.usage.prompt_tokens
+                tokens_cached = cached_prompt_tokens(chunk.usage)
 
-            # If we didn't get token counts from streaming, try to get them from the final response
-            if tokens_out == 0 or tokens_prefill == 0:
-                print("No token counts from streaming, getting final response")
-                print(f"{tokens_out}, {tokens_prefill}")
-                try:
-                    final_response = await self.client.chat.completions.create(
-                        model=self.model,
-                        messages=messages,
-                        stream=False,
-                    )
-                    if hasattr(final_response, 'usage') and final_response.usage is not None:
-                        tokens_out = final_response.usage.completion_tokens
-                        tokens_prefill = final_response.usage.prompt_tokens
-                except Exception as e:
-                    logging.warning(f"Failed to get token counts from final response: {e}")
+            # Without token counts in the stream, count locally rather than sending
+            # the request again (which doubles the load and pollutes the cache)
+            counted_locally = tokens_out == 0 or tokens_prefill == 0
+            if counted_locally:
+                if not self.warned_local_counts:
+                    logging.warning("No token counts in the streamed usage, counting tokens locally")
+                    self.warned_local_counts = True
+                tokens_prefill, tokens_out = await TokenCounter.Count(self.model, messages, words)
 
             # # Calculate timing metrics
             ttft = first_token_time - start_time if first_token_time else 0
-            generation_time = time.time() - first_token_time if first_token_time else 0
+            generation_time = finish_time - first_token_time if first_token_time else 0
 
             return Response(
                 body=words,
@@ -206,12 +235,15 @@ class RequestExecutor:
                 prompt_tokens=tokens_prefill,
                 generation_tokens=tokens_out,
                 launch_time=start_time,
-                finish_time=time.time(),
+                finish_time=finish_time,
+                cached_tokens=tokens_cached,
+                tokens_counted_locally=counted_locally,
             )
 
         except Exception as e:
             logging.error(f"Error in _async_launch_request: {str(e)}")
             logging.error(f"Request details - model: {self.model}, messages: {messages}")
+            MetricsExporter.RequestFinished(None)
             raise
 
     def launch_request(
@@ -252,20 +284,35 @@ class UserSession:
 
         self.prompt_lengths = []
         self.generation_lengths = []
+        self.cached_lengths = []
+        self.counted_locally = []
         self.ttfts = []
         self.generation_times = []
         self.launch_times = []
         self.finish_times = []
+        self.scheduled_times = []
+        self.send_times = []
+        self.dispatch_delays = []
+        self.missed_slots = []
+        # (scheduled time, send time, missed slots) of the request in flight
+        self.pending_schedule = None
 
         self.finished = False
 
     def _update_result(self, response: Response):
         self.prompt_lengths.append(response.prompt_tokens)
         self.generation_lengths.append(response.generation_tokens)
+        self.cached_lengths.append(response.cached_tokens)
+        self.counted_locally.append(response.tokens_counted_locally)
         self.ttfts.append(response.ttft)
         self.generation_times.append(response.generation_time)
         self.launch_times.append(response.launch_time)
         self.finish_times.append(response.finish_time)
+        scheduled_time, send_time, missed_slots = self.pending_schedule
+        self.scheduled_times.append(scheduled_time)
+        self.send_times.append(send_time)
+        self.dispatch_delays.append(response.launch_time - send_time)
+        self.missed_slots.append(missed_slots)
 
     def _build_system_prompt(self):
 
@@ -319,6 +366,24 @@ class UserSession:
             max_tokens = min(max_tokens, self.user_config.answer_len)
         else:
             max_tokens = self.user_config.answer_len
+        # Intended send time on the session's schedule (one request every
+        # gap_between_requests); slots that pass while the previous request is
+        # still running are skipped by step() and counted as missed.
+        # In open-loop mode the schedule is never re-anchored on the late send:
+        # a late user owes every slot and sends them back to back, so the
+        # backlog shows up in the latencies measured from scheduled_time
+        gap = self.user_config.gap_between_requests
+        if self.last_request_time is None:
+            scheduled_time = timestamp
+        else:
+            scheduled_time = self.last_request_time + gap
+        send_time = time.time()
+        if self.user_config.open_loop:
+            missed_slots = 0
+        else:
+            missed_slots = int(max(send_time - scheduled_time, 0) // gap)
+        self.pending_schedule = (scheduled_time, send_time, missed_slots)
+        MetricsExporter.RequestSent(scheduled_time, send_time)
         request_executor.launch_request(
             self.chat_history,
             max_tokens,
@@ -326,9 +391,10 @@ class UserSession:
             extra_headers={"x-user-id": str(self.user_config.user_id)},
         )
         self.has_unfinished_request = True
-        self.last_request_time = timestamp
+        self.last_request_time = scheduled_time if self.user_config.open_loop else timestamp
 
     def _on_request_finished(self, response: Response):
+        MetricsExporter.RequestFinished(response)
         self.chat_history.on_system_response(response.body)
         self.has_unfinished_request = False
         logger.debug(
@@ -371,9 +437,11 @@ class UserSession:
         if timestamp - self.last_request_time > self.user_config.gap_between_requests:
             if self.has_unfinished_request:
                 if timestamp - self.last_unfinished_log > 10:
+                    behind = timestamp - self.last_request_time - self.user_config.gap_between_requests
                     logger.warning(
                         f"User {self.user_config.user_id} has an unfinished "
-                        "request and unable to fit the QPS requirement."
+                        "request and unable to fit the QPS requirement"
+                        + (f" ({behind:.1f}s behind schedule)." if self.user_config.open_loop else ".")
                     )
                     self.last_unfinished_log = timestamp
                 return
@@ -385,15 +453,32 @@ class UserSession:
         df = pd.DataFrame()
         df["prompt_tokens"] = self.prompt_lengths
         df["generation_tokens"] = self.generation_lengths
+        df["cached_tokens"] = pd.array(self.cached_lengths, dtype="Int64")
+        df["tokens_counted_locally"] = self.counted_locally
         df["ttft"] = self.ttfts
         df["generation_time"] = self.generation_times
         df["user_id"] = self.user_config.user_id
         df["question_id"] = range(1, len(self.prompt_lengths) + 1)
         df["launch_time"] = self.launch_times
         df["finish_time"] = self.finish_times
+        df["scheduled_time"] = self.scheduled_times
+        df["send_time"] = self.send_times
+        df["dispatch_delay"] = self.dispatch_delays
+        df["missed_slots"] = self.missed_slots
+        # Latencies from the intended send time (coordinated-omission corrected)
+        df["corrected_ttft"] = df["ttft"] + df["launch_time"] - df["scheduled_time"]
+        df["corrected_latency"] = df["finish_time"] - df["scheduled_time"]
         return df
 
 
+def load_sharegpt_dataset(filename: str = "ShareGPT.json") -> List[Dict]:
+    # Parsed once per process, so in-process sweeps don't reload it for every QPS
+    if not hasattr(load_sharegpt_dataset, "data"):
+        with open(filename, "r", encoding="utf-8") as file:
+            load_sharegpt_dataset.data = json.load(file)
+    return load_sharegpt_dataset.data
+
+
 class UserSessionManager:
 
     def __init__(
@@ -427,11 +512,9 @@ class UserSessionManager:
             self._load_sharegpt_data()
 
     def _load_sharegpt_data(self):
-        with open("ShareGPT.json", "r", encoding="utf-8") as file:
-            self.sharegpt_data = json.load(file)
         self.sharegpt_data = [
             d
-            for d in self.sharegpt_data
+            for d in load_sharegpt_dataset()
             if d["num_round"] > 2 * self.workload_config.num_rounds
         ]
         logger.info(f"There are {len(self.sharegpt_data)} users satisfying ")
@@ -534,6 +617,9 @@ class UserSessionManager:
             df["generation_tokens"] / df["generation_time"]
         ).mean()
         average_ttft = df["ttft"].mean()
+        average_corrected_ttft = (
+            df["corrected_ttft"].mean() if "corrected_ttft" in df.columns else None
+        )
         logger.info("Calculating performance summary")
         print("\n")
         print("==================== Performance summary ======================")
@@ -564,19 +650,31 @@ class UserSessionManager:
 
         print(f"  \033[33mAverage TTFT: \033[32m{average_ttft:.4f}s\033[0m\n")
 
+        if average_corrected_ttft is not None:
+            print(
+                "  \033[33mAverage TTFT from schedule: "
+                f"\033[32m{average_corrected_ttft:.4f}s\033[0m\n"
+            )
+
         print(f"Time range: {start_time} - {end_time} ({total_time:.2f}s)")
 
         print("===============================================================")
         print("\n")
         return df
 
-    def summary(self, start_time: float, end_time: float) -> pd.DataFrame:
+    def get_results(self) -> pd.DataFrame:
+        """The per-request results of all finished requests so far"""
         if len(self.session_summaries) == 0 and len(self.sessions) == 0:
             return pd.DataFrame()
-
-        df = pd.concat(
+        return pd.concat(
             [s for s in self.session_summaries] + [s.summary() for s in self.sessions]
         )
+
+    def summary(self, start_time: float, end_time: float) -> pd.DataFrame:
+        df = self.get_results()
+        if len(df) == 0:
+            return df
+
         pending_queries = len([s for s in self.sessions if s.has_unfinished_request])
         start_time = max(self.start_time, start_time)
         end_time = min(end_time, df["finish_time"].max())
@@ -588,16 +686,80 @@ class UserSessionManager:
         return df
 
 
-def warmup_engine(executor):
-    logger.info("Warming up the engine")
-    for i in range(10):
-        chat_history = ChatHistory()
-        chat_history.on_user_query(
-            f"WARMUP: Hi, I'm user {i}. Here are some text: {'hi ' * 100}."
-        )
-        executor.launch_request(chat_history, 100, lambda x: None)
+def run_benchmark(
+    executor: RequestExecutor,
+    workload_config: WorkloadConfig,
+    init_user_id: int = 0,
+    use_sharegpt: bool = False,
+    time_limit: Optional[float] = None,
+    log_interval: float = 30,
+    convergence: Optional[ConvergenceMonitor] = None,
+) -> pd.DataFrame:
+    """
+    Run the workload once on the given executor and return the per-request results.
+    The executor (and its connection pool) stays usable for further runs.
+    """
+    step_interval = 0.1
+
+    manager = UserSessionManager(
+        workload_config, init_user_id=init_user_id, use_sharegpt=use_sharegpt
+    )
+
+    num_steps = 0
+    start_time = time.time()
+    last_summary_time = start_time
+    try:
+        while True:
+            num_steps += 1
+            manager.step(time.time(), executor)
+            time.sleep(step_interval)
+
+            if time.time() - last_summary_time > log_interval:
+                manager.summary(last_summary_time, time.time())
+                last_summary_time = time.time()
+
+            if time_limit is not None and time.time() - start_time > time_limit:
+                break
+
+            if convergence is not None and convergence.converged(
+                manager.get_results, start_time, time.time()
+            ):
+                logger.info("Metrics converged, stopping the benchmark")
+                break
+
+    except KeyboardInterrupt:
+        logger.info("Interrupted, waiting for the final result")
 
     AsyncLoopWrapper.WaitLoop()
+    return manager.summary(0, time.time())
+
+
+def warmup_engine(
+    executor: RequestExecutor,
+    workload_config: WorkloadConfig,
+    warmup: SteadyStateWarmup,
+    init_user_id: int = 0,
+    use_sharegpt: bool = False,
+    log_interval: float = 30,
+) -> Dict[str, Any]:
+    """
+    Warm the engine up with the run's own users (same workload config and init_user_id):
+    the ramp-up sends the shared system prompt and every initial user's context, so the
+    benchmark starts on the prefixes it will hit. Stops once TTFT and throughput are
+    steady or after warmup.max_time seconds, and returns the warmup report.
+    """
+    logger.info("Warming up the engine with the run's prefixes")
+    start_time = time.time()
+    df = run_benchmark(
+        executor,
+        workload_config,
+        init_user_id=init_user_id,
+        use_sharegpt=use_sharegpt,
+        time_limit=warmup.max_time,
+        log_interval=log_interval,
+        convergence=warmup,
+    )
+    return warmup.report(df, start_time, time.time())
 
 
 def parse_arguments() -> WorkloadConfig:
@@ -672,6 +834,19 @@ def parse_arguments() -> WorkloadConfig:
     parser.add_argument(
         "--sharegpt", action="store_true", help="Whether to use ShareGPT dataset"
     )
+    parser.add_argument(
+        "--open-loop",
+        action="store_true",
+        default=False,
+        help="Keep every user on a fixed request schedule (late requests are sent "
+        "back to back instead of skipped) and report latencies from the intended "
+        "send time, correcting for coordinated omission",
+    )
+    add_convergence_args(parser)
+    add_warmup_args(parser)
+    add_metrics_args(parser)
+    add_engine_metrics_args(parser)
+    add_generation_mode_args(parser)
     args = parser.parse_args()
     return args
 
@@ -702,13 +877,11 @@ def main():
         return
 
     args = parse_arguments()
-    step_interval = 0.1
 
     executor = RequestExecutor(
-        base_url=args.base_url, model=args.model
+        base_url=args.base_url, model=args.model, generation_mode=args.generation_mode
     )
 
-    warmup_engine(executor)
     workload_config = WorkloadConfig(
         num_users=args.num_users,
         system_prompt_len=args.shared_system_prompt,
@@ -718,36 +891,42 @@ def main():
         qps=args.qps,
         model=args.model,
         enable_user_id=args.request_with_user_id,
+        open_loop=args.open_loop,
     )
 
-    manager = UserSessionManager(
-        workload_config, init_user_id=args.init_user_id, use_sharegpt=args.sharegpt
-    )
-
-    num_steps = 0
-    start_time = time.time()
-    last_summary_time = start_time
-    try:
-        while True:
-            num_steps += 1
-            manager.step(time.time(), executor)
-            time.sleep(step_interval)
-
-            if time.time() - last_summary_time > args.log_interval:
-                manager.summary(last_summary_time, time.time())
-                last_summary_time = time.time()
-
-            if args.time is not None and time.time() - start_time > args.time:
-                break
+    warmup = build_warmup(args)
+    warmup_report = None
+    if warmup is not None:
+        warmup_report = warmup_engine(
+            executor,
+            workload_config,
+            warmup,
+            init_user_id=args.init_user_id,
+            use_sharegpt=args.sharegpt,
+            log_interval=args.log_interval,
+        )
 
-    except KeyboardInterrupt:
-        logger.info("Interrupted, waiting for the final result")
+    start_metrics_exporter(args, "synthetic")
+    scraper = start_engine_scraper(args)
+    convergence = build_convergence_monitor(args)
+
+    summary = run_benchmark(
+        executor,
+        workload_config,
+        init_user_id=args.init_user_id,
+        use_sharegpt=args.sharegpt,
+        time_limit=args.time,
+        log_interval=args.log_interval,
+        convergence=convergence,
+    )
 
     AsyncLoopWrapper.StopLoop()
+    if scraper is not None:
+        scraper.stop()
 
     logger.info(f"Finished benchmarking, dumping summary to {args.output}")
-    summary = manager.summary(0, time.time())
     summary.to_csv(args.output, index=False)
+    write_warmup_report(warmup_report, args.output)
 
 
 if __name__ == "__main__":
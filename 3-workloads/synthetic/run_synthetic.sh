@@ -30,39 +30,37 @@ else
     QPS_VALUES=(0.7)  # Default QPS value
 fi
 
-# init-user-id starts at 1, will add 400 each iteration
-INIT_USER_ID=1
+# Run length of each benchmark: a fixed --time, or a convergence-driven stop
+# (--converge-metrics ...) bounded by --min-time and --time (set by run-bench.py)
+RUN_LENGTH_ARGS=${RUN_LENGTH_ARGS:---time 100}
 
-warmup() {
-    echo "Warming up with QPS=$((NUM_USERS_WARMUP / 2))..."
-    python3 "${SCRIPT_DIR}/multi-round-qa.py" \
-        --num-users 1 \
-        --num-rounds 2 \
-        --qps 2 \
-        --shared-system-prompt "$(echo -n "$SYSTEM_PROMPT" | wc -w)" \
-        --user-history-prompt "$(echo -n "$CHAT_HISTORY" | wc -w)" \
-        --answer-len $ANSWER_LEN \
-        --model "$MODEL" \
-        --base-url "$BASE_URL" \
-        --init-user-id "$INIT_USER_ID" \
-        --output /tmp/warmup.csv \
-        --log-interval 30 \
-        --time $((NUM_USERS_WARMUP / 2))
-}
+# Prometheus metrics (set by run-bench.py): --metrics-port 9400 serves the load generator's,
+# --engine-metrics-interval 5 scrapes the engine's every 5s (default 1s, 0 disables)
+METRICS_ARGS=${METRICS_ARGS:-}
+
+# Generation mode of the benchmark runs (set by run-bench.py): prefill (max_tokens 1) or
+# decode (exactly the workload's output lengths), the workload's own output lengths by default
+GENERATION_MODE=${GENERATION_MODE:-}
+GENERATION_ARGS=${GENERATION_MODE:+--generation-mode $GENERATION_MODE}
+
+# Request schedule of the benchmark runs, e.g. --open-loop (set by run-bench.py)
+SCHEDULE_ARGS=${SCHEDULE_ARGS:-}
+
+# init-user-id starts at 1 (or where run-bench.py's QPS search left off), will add
+# NUM_USERS_WARMUP each iteration
+INIT_USER_ID=${INIT_USER_ID:-1}
 
 run_benchmark() {
     local qps=$1
     local output_file="../../4-latest-results/${KEY}_synthetic_output_${qps}.csv"
 
-    # warmup with current init ID
-    warmup
-
-    # actual benchmark with same init ID
+    # the driver first warms the engine up with the run's own users (same init ID) until
+    # TTFT and throughput are steady, for at most NUM_USERS_WARMUP / 2 seconds
     echo "Running benchmark with QPS=$qps..."
     python3 "${SCRIPT_DIR}/multi-round-qa.py" \
         --num-users "$NUM_USERS" \
-        --shared-system-prompt "$(echo -n "$SYSTEM_PROMPT" | wc -w)" \
-        --user-history-prompt "$(echo -n "$CHAT_HISTORY" | wc -w)" \
+        --shared-system-prompt "$SYSTEM_PROMPT" \
+        --user-history-prompt "$CHAT_HISTORY" \
         --answer-len "$ANSWER_LEN" \
         --num-rounds "$NUM_ROUNDS" \
         --qps "$qps" \
@@ -70,7 +68,11 @@ run_benchmark() {
         --base-url "$BASE_URL" \
         --init-user-id "$INIT_USER_ID" \
         --output "$output_file" \
-        --time 100
+        --warmup-time $((NUM_USERS_WARMUP / 2)) \
+        $RUN_LENGTH_ARGS \
+        $METRICS_ARGS \
+        $GENERATION_ARGS \
+        $SCHEDULE_ARGS
 
     sleep 10
 
@@ -96,7 +98,8 @@ for qps in "${QPS_VALUES[@]}"; do
         CHAT_HISTORY="$CHAT_HISTORY" \
         ANSWER_LEN="$ANSWER_LEN" \
         QPS="$qps" \
-        USE_SHAREGPT="$USE_SHAREGPT"
+        USE_SHAREGPT="$USE_SHAREGPT" \
+        ${GENERATION_MODE:+GENERATION_MODE=$GENERATION_MODE}
 
     # Change back to script directory
     cd "$SCRIPT_DIR"
@@ -4,6 +4,13 @@ set -e
 # Replace all hf_token values with <YOUR_HF_TOKEN> in all .yaml files
 find . -type f -name "*.yaml" -exec sed -i 's/^\(\s*-*\s*hf_token:\s*\).*/\1<YOUR_HF_TOKEN>/' {} \;
 
+# Stop the local mock serving engine (if applicable)
+MOCK_ENGINE_PID_FILE="4-latest-results/mock-engine.pid"
+if [ -f "$MOCK_ENGINE_PID_FILE" ]; then
+  echo "Stopping the mock engine..."
+  kill "$(cat "$MOCK_ENGINE_PID_FILE")" 2>/dev/null || true
+  rm -f "$MOCK_ENGINE_PID_FILE"
+fi
 
 # Clean up GKE cluster (if applicable)
 
@@ -0,0 +1,256 @@
+"""
+Statistical run-to-run comparison of two per-request CSVs (any workload).
+
+For throughput, TTFT and ITL statistics the relative change from the baseline run
+to the candidate run is estimated together with a bootstrap confidence interval:
+  - latency percentiles resample the individual requests
+  - throughputs resample contiguous blocks of fixed windows of the run (moving block
+    bootstrap), since a throughput is a property of time windows rather than of single
+    requests and neighbouring windows are correlated; the estimate is total / duration
+    over the resampled windows, so a shorter last window is weighted by its actual span
+
+A change is a statistically significant regression when the whole confidence
+interval lies on the "worse" side of zero. The script exits with status 1 when a
+significant regression exceeds --threshold percent, so it can gate nightly runs.
+
+Usage:
+  python 4-latest-results/post-processing/compare.py \\
+      4-latest-results/stack_synthetic_output_0.7.csv \\
+      4-latest-results/lmcache_synthetic_output_0.7.csv --threshold 5
+"""
+import argparse
+import json
+import sys
+from dataclasses import dataclass, asdict
+from typing import Callable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class Comparison:
+    metric: str
+    baseline: float
+    candidate: float
+    change_pct: float
+    ci_low_pct: float
+    ci_high_pct: float
+    higher_is_better: bool
+    significant: bool
+    regression: bool
+    gated: bool
+
+
+def _itl_ms(df: pd.DataFrame) -> np.ndarray:
+    itl = (df["generation_time"] / df["generation_tokens"]) * 1000
+    return itl.replace([float('inf'), -float('inf')], np.nan).dropna().to_numpy()
+
+
+def _percentile(q: float) -> Callable[[np.ndarray], np.ndarray]:
+    return lambda samples: np.percentile(samples, q, axis=-1)
+
+
+def _mean(samples: np.ndarray) -> np.ndarray:
+    return samples.mean(axis=-1)
+
+
+# name -> (per-request values, statistic over the last axis); lower is better
+LATENCY_METRICS = {
+    "mean_ttft_ms": (lambda df: df["ttft"].to_numpy() * 1000, _mean),
+    "median_ttft_ms": (lambda df: df["ttft"].to_numpy() * 1000, _percentile(50)),
+    "p90_ttft_ms": (lambda df: df["ttft"].to_numpy() * 1000, _percentile(90)),
+    "p99_ttft_ms": (lambda df: df["ttft"].to_numpy() * 1000, _percentile(99)),
+    "mean_itl_ms": (_itl_ms, _mean),
+    "median_itl_ms": (_itl_ms, _percentile(50)),
+    "p90_itl_ms": (_itl_ms, _percentile(90)),
+    "p99_itl_ms": (_itl_ms, _percentile(99)),
+}
+
+# name -> column summed per window (None counts requests)
+THROUGHPUT_METRICS = {
+    "request_throughput": None,
+    "output_token_throughput": "generation_tokens",
+    "total_token_throughput": ("prompt_tokens", "generation_tokens"),
+}
+
+DEFAULT_METRICS = ["request_throughput", "output_token_throughput",
+                   "mean_ttft_ms", "median_ttft_ms", "p99_ttft_ms",
+                   "mean_itl_ms", "median_itl_ms", "p99_itl_ms"]
+
+
+def _bootstrap_rows(values: np.ndarray, statistic, n_boot: int, rng: np.random.Generator,
+                    chunk: int = 100, block: int = 1) -> np.ndarray:
+    """
+    Bootstrap distribution of statistic(values), computed in chunks to bound memory.
+    block > 1 resamples contiguous runs of `block` rows (moving block bootstrap).
+    """
+    n = len(values)
+    block = max(1, min(block, n))
+    num_blocks = int(np.ceil(n / block))
+    out = []
+    for start in range(0, n_boot, chunk):
+        size = min(chunk, n_boot - start)
+        starts = rng.integers(0, n - block + 1, size=(size, num_blocks))
+        idx = (starts[..., None] + np.arange(block)).reshape(size, -1)[:, :n]
+        out.append(statistic(values[idx]))
+    return np.concatenate(out)
+
+
+def _window_sums(df: pd.DataFrame, column, window: float) -> np.ndarray:
+    """
+    Per-window (total, span in seconds) of a throughput column over the run's finish
+    times; the last window only spans up to the last finish.
+    """
+    start = df["launch_time"].min()
+    end = df["finish_time"].max()
+    num_windows = max(1, int(np.ceil((end - start) / window)))
+    bins = np.minimum(((df["finish_time"] - start) // window).astype(int), num_windows - 1)
+    if column is None:
+        values = np.ones(len(df))
+    elif isinstance(column, tuple):
+        values = df[list(column)].sum(axis=1).to_numpy()
+    else:
+        values = df[column].to_numpy()
+    totals = np.bincount(bins, weights=values, minlength=num_windows)
+    spans = np.full(num_windows, float(window))
+    spans[-1] = max(end - start - (num_windows - 1) * window, 1e-9)
+    return np.stack([totals, spans], axis=-1)
+
+
+def _rate(values: np.ndarray) -> np.ndarray:
+    """Total / duration of (total, span) window rows (along the second to last axis)."""
+    return values[..., 0].sum(axis=-1) / values[..., 1].sum(axis=-1)
+
+
+def _block_length(num_windows: int) -> int:
+    # the usual n^(1/3) rule for the moving block bootstrap
+    return max(1, int(round(num_windows ** (1 / 3))))
+
+
+def compare_runs(
+    baseline_df: pd.DataFrame,
+    candidate_df: pd.DataFrame,
+    metrics: Optional[List[str]] = None,
+    n_boot: int = 2000,
+    confidence: float = 0.95,
+    threshold_pct: float = 5.0,
+    window: float = 10.0,
+    seed: int = 0,
+) -> List[Comparison]:
+    rng = np.random.default_rng(seed)
+    alpha = (1 - confidence) / 2
+    results = []
+    for metric in metrics or DEFAULT_METRICS:
+        if metric in LATENCY_METRICS:
+            values_fn, statistic = LATENCY_METRICS[metric]
+            base_values, cand_values = values_fn(baseline_df), values_fn(candidate_df)
+            higher_is_better = False
+        elif metric in THROUGHPUT_METRICS:
+            column = THROUGHPUT_METRICS[metric]
+            base_values = _window_sums(baseline_df, column, window)
+            cand_values = _window_sums(candidate_df, column, window)
+            statistic = _rate
+            higher_is_better = True
+        else:
+            raise ValueError(f"Unsupported metric: {metric}")
+
+        if len(base_values) == 0 or len(cand_values) == 0:
+            print(f"[warn] Skipping {metric}: no samples")
+            continue
+
+        base_point = float(statistic(base_values))
+        cand_point = float(statistic(cand_values))
+        base_block = cand_block = 1
+        if metric in THROUGHPUT_METRICS:
+            base_block, cand_block = _block_length(len(base_values)), _block_length(len(cand_values))
+        base_boot = _bootstrap_rows(base_values, statistic, n_boot, rng, block=base_block)
+        cand_boot = _bootstrap_rows(cand_values, statistic, n_boot, rng, block=cand_block)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change_boot = (cand_boot - base_boot) / base_boot * 100
+        change_boot = change_boot[np.isfinite(change_boot)]
+        change = (cand_point - base_point) / base_point * 100 if base_point else float("nan")
+        ci_low, ci_high = np.quantile(change_boot, [alpha, 1 - alpha]) if len(change_boot) else (np.nan, np.nan)
+
+        significant = bool(ci_low > 0 or ci_high < 0)
+        worse = change < 0 if higher_is_better else change > 0
+        regression = significant and worse
+        results.append(Comparison(
+            metric=metric,
+            baseline=base_point,
+            candidate=cand_point,
+            change_pct=change,
+            ci_low_pct=float(ci_low),
+            ci_high_pct=float(ci_high),
+            higher_is_better=higher_is_better,
+            significant=significant,
+            regression=regression,
+            gated=regression and abs(change) > threshold_pct,
+        ))
+    return results
+
+
+def print_comparison(results: List[Comparison], confidence: float, threshold_pct: float) -> None:
+    print("============ Run-to-run comparison ============")
+    print(f"{'metric':<26}{'baseline':>12}{'candidate':>12}{'change %':>10}"
+          f"   {int(confidence * 100)}% CI of change %")
+    for r in results:
+        flag = ""
+        if r.gated:
+            flag = f"  \033[31mREGRESSION (> {threshold_pct:g}%)\033[0m"
+        elif r.regression:
+            flag = "  \033[33mregression\033[0m"
+        elif r.significant:
+            flag = "  \033[32mimprovement\033[0m"
+        print(f"{r.metric:<26}{r.baseline:>12.2f}{r.candidate:>12.2f}{r.change_pct:>+10.2f}"
+              f"   [{r.ci_low_pct:+.2f}, {r.ci_high_pct:+.2f}]{flag}")
+    print("===============================================")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compare two per-request benchmark CSVs with bootstrap confidence intervals.")
+    parser.add_argument("baseline", type=str, help="Per-request CSV of the reference run")
+    parser.add_argument("candidate", type=str, help="Per-request CSV of the run under test")
+    parser.add_argument("--metrics", nargs="+", default=DEFAULT_METRICS,
+                        choices=list(LATENCY_METRICS) + list(THROUGHPUT_METRICS),
+                        help="Metrics to compare (default: throughputs, TTFT and ITL)")
+    parser.add_argument("--threshold", type=float, default=5.0,
+                        help="Exit non-zero when a significant regression exceeds this many percent (default: %(default)s)")
+    parser.add_argument("--confidence", type=float, default=0.95,
+                        help="Confidence level of the intervals (default: %(default)s)")
+    parser.add_argument("--n-boot", type=int, default=2000,
+                        help="Number of bootstrap resamples (default: %(default)s)")
+    parser.add_argument("--window", type=float, default=10.0,
+                        help="Window length in seconds for the throughput block bootstrap (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: %(default)s)")
+    parser.add_argument("--json", type=str, default=None, help="Also write the comparison to this JSON file")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    baseline_df = pd.read_csv(args.baseline)
+    candidate_df = pd.read_csv(args.candidate)
+    if baseline_df.empty or candidate_df.empty:
+        print("ERROR: One of the runs has no successful requests.")
+        sys.exit(2)
+
+    results = compare_runs(baseline_df, candidate_df, args.metrics, args.n_boot,
+                           args.confidence, args.threshold, args.window, args.seed)
+    print_comparison(results, args.confidence, args.threshold)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"baseline": args.baseline, "candidate": args.candidate,
+                       "threshold_pct": args.threshold, "confidence": args.confidence,
+                       "results": [asdict(r) for r in results]}, f, indent=2)
+        print(f"Comparison written to {args.json}")
+
+    gated = [r.metric for r in results if r.gated]
+    if gated:
+        print(f"Significant regressions beyond {args.threshold:g}%: {', '.join(gated)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+Local SQLite store for benchmark results.
+
+summarize.py records every processed run here next to the human readable
+.results file:
+
+  runs      one row per run: bench-spec, baseline, model, workload, KEY, QPS
+            and the full workload parameters (JSON)
+  metrics   the summary metrics of the run (long format: run_id, name, value)
+  requests  optionally, the per-request rows of the run's CSV
+
+Usage:
+  python 4-latest-results/post-processing/results_db.py best --metric p99_ttft_ms \\
+      --model meta-llama/Llama-3.1-8B-Instruct --workload synthetic
+  python 4-latest-results/post-processing/results_db.py list --baseline Helm-ProductionStack
+  python 4-latest-results/post-processing/results_db.py show 12
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+# The runner keeps its results in ~/srv/runner-db/, so the database lives there too
+DEFAULT_DB_PATH = "~/srv/runner-db/results.db"
+
+# Metrics for which a larger value is better (everything else is a latency)
+HIGHER_IS_BETTER = {
+    "successful_requests",
+    "request_throughput",
+    "output_token_throughput",
+    "total_token_throughput",
+    "prefill_token_throughput",
+    "decode_token_throughput",
+    "mean_prefill_speed",
+    "mean_decode_speed",
+    "intended_request_rate",
+    "sent_request_rate",
+    "on_time_ratio",
+    "cache_hit_token_ratio",
+    "cache_hit_request_ratio",
+    "engine_prefix_cache_hit_rate",
+}
+
+# Per-request columns kept in the requests table (missing columns are stored as NULL)
+REQUEST_COLUMNS = {
+    "user_id": "INTEGER",
+    "question_id": "INTEGER",
+    "prompt_tokens": "INTEGER",
+    "generation_tokens": "INTEGER",
+    "ttft": "REAL",
+    "generation_time": "REAL",
+    "launch_time": "REAL",
+    "finish_time": "REAL",
+    "scheduled_time": "REAL",
+    "send_time": "REAL",
+    "dispatch_delay": "REAL",
+    "missed_slots": "INTEGER",
+    "cached_tokens": "INTEGER",
+    "tokens_counted_locally": "INTEGER",
+    "reused_chunks": "INTEGER",
+    "prefix_reused_chunks": "INTEGER",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at      TEXT NOT NULL,
+    timestamp       TEXT,
+    results_file    TEXT,
+    csv_file        TEXT,
+    key             TEXT,
+    baseline        TEXT,
+    model           TEXT,
+    workload        TEXT,
+    qps             REAL,
+    workload_params TEXT,
+    bench_spec      TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_model ON runs (model);
+CREATE INDEX IF NOT EXISTS idx_runs_baseline ON runs (baseline);
+CREATE INDEX IF NOT EXISTS idx_runs_workload ON runs (workload);
+CREATE INDEX IF NOT EXISTS idx_runs_model_workload ON runs (model, workload);
+
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    name   TEXT NOT NULL,
+    value  REAL,
+    PRIMARY KEY (run_id, name)
+);
+CREATE INDEX IF NOT EXISTS idx_metrics_name_value ON metrics (name, value);
+
+CREATE TABLE IF NOT EXISTS requests (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_requests_run ON requests (run_id);
+"""
+
+
+def get_db_path(db_path: Optional[str] = None) -> str:
+    """Resolve the database path: explicit argument > LMBENCH_RESULTS_DB > default."""
+    path = db_path or os.environ.get("LMBENCH_RESULTS_DB") or DEFAULT_DB_PATH
+    return os.path.expanduser(path)
+
+
+def connect(db_path: Optional[str] = None) -> sqlite3.Connection:
+    path = get_db_path(db_path)
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    _ensure_request_columns(conn)
+    return conn
+
+
+def _ensure_request_columns(conn: sqlite3.Connection) -> None:
+    """Add any per-request column that an older database does not have yet."""
+    existing = {row["name"] for row in conn.execute("PRAGMA table_info(requests)")}
+    for column, sql_type in REQUEST_COLUMNS.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE requests ADD COLUMN {column} {sql_type}")
+    conn.commit()
+
+
+def _baseline_and_model(bench_spec: Optional[Dict[str, Any]]) -> Tuple[Optional[str], Optional[str]]:
+    serving = (bench_spec or {}).get('Serving') or {}
+    baseline = serving.get('Baseline')
+    baseline_config = (serving.get(baseline) or {}) if baseline else {}
+    return baseline, baseline_config.get('modelURL')
+
+
+def _to_float(value: Any) -> Optional[float]:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if pd.isna(value) else value
+
+
+def record_run(
+    metrics: Dict[str, Any],
+    workload_params: Dict[str, Any],
+    bench_spec: Optional[Dict[str, Any]] = None,
+    bench_spec_text: str = "",
+    timestamp: Optional[str] = None,
+    results_file: Optional[str] = None,
+    csv_file: Optional[str] = None,
+    df: Optional[pd.DataFrame] = None,
+    db_path: Optional[str] = None,
+    baseline: Optional[str] = None,
+    model: Optional[str] = None,
+) -> int:
+    """
+    Store one benchmark run and return its run_id.
+    The per-request rows are only stored when df is given. baseline / model override
+    the ones of bench_spec (e.g. for the cells of a serving matrix).
+    """
+    spec_baseline, spec_model = _baseline_and_model(bench_spec)
+    baseline = baseline or spec_baseline
+    model = model or spec_model
+    # Agentic runs are parameterized by the new user interval instead of QPS
+    qps = workload_params.get('QPS', workload_params.get('NEW_USER_INTERVAL'))
+
+    conn = connect(db_path)
+    try:
+        cur = conn.execute(
+            "INSERT INTO runs (created_at, timestamp, results_file, csv_file, key, baseline, "
+            "model, workload, qps, workload_params, bench_spec) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                datetime.now().isoformat(timespec="seconds"),
+                timestamp,
+                results_file,
+                csv_file,
+                workload_params.get('KEY'),
+                baseline,
+                model,
+                workload_params.get('WORKLOAD'),
+                _to_float(qps),
+                json.dumps(workload_params, default=str),
+                bench_spec_text,
+            ),
+        )
+        run_id = cur.lastrowid
+
+        conn.executemany(
+            "INSERT INTO metrics (run_id, name, value) VALUES (?, ?, ?)",
+            [(run_id, name, _to_float(value)) for name, value in metrics.items()],
+        )
+
+        if df is not None and not df.empty:
+            columns = list(REQUEST_COLUMNS)
+            rows = df.reindex(columns=columns)
+            rows = rows.astype(object).where(rows.notna(), None)
+            conn.executemany(
+                f"INSERT INTO requests (run_id, {', '.join(columns)}) "
+                f"VALUES (?, {', '.join('?' for _ in columns)})",
+                [(run_id, *row) for row in rows.itertuples(index=False, name=None)],
+            )
+
+        conn.commit()
+    finally:
+        conn.close()
+    return run_id
+
+
+def query_runs(
+    conn: sqlite3.Connection,
+    metric: Optional[str] = None,
+    model: Optional[str] = None,
+    workload: Optional[str] = None,
+    baseline: Optional[str] = None,
+    key: Optional[str] = None,
+    qps: Optional[float] = None,
+    order: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> List[sqlite3.Row]:
+    """
+    Select runs matching the filters. When metric is given, only runs reporting that
+    metric are returned, best first (ascending for latencies, descending for throughputs).
+    """
+    where, params = [], []
+    for column, value in (("r.model", model), ("r.workload", workload),
+                          ("r.baseline", baseline), ("r.key", key), ("r.qps", qps)):
+        if value is not None:
+            where.append(f"{column} = ?")
+            params.append(value)
+
+    if metric:
+        if order is None:
+            order = "desc" if metric in HIGHER_IS_BETTER else "asc"
+        sql = ("SELECT r.*, m.value AS metric_value FROM runs r "
+               "JOIN metrics m ON m.run_id = r.run_id AND m.name = ? AND m.value IS NOT NULL ")
+        params.insert(0, metric)
+        order_by = f"m.value {order.upper()}"
+    else:
+        sql = "SELECT r.*, NULL AS metric_value FROM runs r "
+        order_by = "r.run_id DESC"
+
+    if where:
+        sql += "WHERE " + " AND ".join(where) + " "
+    sql += f"ORDER BY {order_by}"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return conn.execute(sql, params).fetchall()
+
+
+def _print_runs(rows: List[sqlite3.Row], metric: Optional[str]) -> None:
+    if not rows:
+        print("No matching runs found.")
+        return
+    header = f"{'run_id':>6}  {'timestamp':<13}  {'key':<8}  {'baseline':<22}  {'workload':<10}  {'qps':>6}  model"
+    if metric:
+        header = f"{metric:>16}  " + header
+    print(header)
+    for row in rows:
+        qps = "" if row["qps"] is None else f"{row['qps']:g}"
+        line = (f"{row['run_id']:>6}  {row['timestamp'] or '':<13}  {row['key'] or '':<8}  "
+                f"{row['baseline'] or '':<22}  {row['workload'] or '':<10}  {qps:>6}  {row['model'] or ''}")
+        if metric:
+            line = f"{row['metric_value']:>16.2f}  " + line
+        print(line)
+
+
+def _show_run(conn: sqlite3.Connection, run_id: int) -> None:
+    run = conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+    if run is None:
+        print(f"Run {run_id} not found.")
+        sys.exit(1)
+    print(f"==================== Run {run_id} ======================")
+    for column in ("timestamp", "key", "baseline", "model", "workload", "qps", "results_file", "csv_file"):
+        print(f"{column}: {run[column]}")
+    print("==================== Workload config ======================")
+    for k, v in json.loads(run["workload_params"] or "{}").items():
+        print(f"{k}: {v}")
+    print("==================== Metrics ======================")
+    for row in conn.execute("SELECT name, value FROM metrics WHERE run_id = ? ORDER BY name", (run_id,)):
+        print(f"{row['name']}: {row['value']}")
+    num_requests = conn.execute("SELECT COUNT(*) FROM requests WHERE run_id = ?", (run_id,)).fetchone()[0]
+    print(f"Stored per-request rows: {num_requests}")
+    print("===========================================================")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Query the local benchmark results database.")
+    parser.add_argument("--db", type=str, default=None,
+                        help=f"Path to the results database (default: $LMBENCH_RESULTS_DB or {DEFAULT_DB_PATH})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_filters(p):
+        p.add_argument("--model", type=str, help="Filter by model URL")
+        p.add_argument("--workload", type=str, help="Filter by workload (sharegpt, synthetic, mooncake, agentic, replay, rag)")
+        p.add_argument("--baseline", type=str, help="Filter by serving baseline (e.g. Helm-ProductionStack)")
+        p.add_argument("--key", type=str, help="Filter by result KEY (e.g. stack, sglang)")
+        p.add_argument("--qps", type=float, help="Filter by QPS (or new user interval for agentic)")
+
+    best = subparsers.add_parser("best", help="Rank runs by a summary metric, best first")
+    best.add_argument("--metric", type=str, default="p99_ttft_ms",
+                      help="Metric to rank by (default: %(default)s)")
+    best.add_argument("--order", choices=["asc", "desc"], default=None,
+                      help="Override the ranking order (default: by metric type)")
+    best.add_argument("--limit", type=int, default=5, help="Number of runs to show (default: %(default)s)")
+    add_filters(best)
+
+    list_runs = subparsers.add_parser("list", help="List stored runs, most recent first")
+    list_runs.add_argument("--limit", type=int, default=20, help="Number of runs to show (default: %(default)s)")
+    add_filters(list_runs)
+
+    show = subparsers.add_parser("show", help="Show the metadata and metrics of one run")
+    show.add_argument("run_id", type=int)
+
+    subparsers.add_parser("metrics", help="List the metric names stored in the database")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    conn = connect(args.db)
+    try:
+        if args.command == "best":
+            rows = query_runs(conn, args.metric, args.model, args.workload, args.baseline,
+                              args.key, args.qps, args.order, args.limit)
+            _print_runs(rows, args.metric)
+        elif args.command == "list":
+            rows = query_runs(conn, None, args.model, args.workload, args.baseline,
+                              args.key, args.qps, None, args.limit)
+            _print_runs(rows, None)
+        elif args.command == "show":
+            _show_run(conn, args.run_id)
+        elif args.command == "metrics":
+            for row in conn.execute("SELECT DISTINCT name FROM metrics ORDER BY name"):
+                print(row["name"])
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
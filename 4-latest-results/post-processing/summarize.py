@@ -1,6 +1,7 @@
 import pandas as pd
+import json
 import sys
-from typing import Optional
+from typing import Any, Dict, Optional
 import os
 import io
 import contextlib
@@ -8,12 +9,281 @@ from datetime import datetime
 import numpy as np
 import yaml
 
+import results_db
+
+def percentile(values, q: float) -> float:
+    """np.percentile, NaN when there is no value (e.g. TPOT of prefill-only runs)."""
+    values = np.asarray(values, dtype=float)
+    return float(np.percentile(values, q)) if len(values) else np.nan
+
+def compute_metrics(
+    df: pd.DataFrame,
+    start_time: Optional[float] = None,
+    end_time: Optional[float] = None,
+    pending_queries: int = 0,
+    engine_df: Optional[pd.DataFrame] = None,
+) -> Dict[str, float]:
+    """
+    Compute the summary metrics of a per-request dataframe as a flat dict.
+    engine_df: the engine's /metrics samples of the run (see compute_engine_metrics).
+    """
+    if start_time is not None and end_time is not None:
+        launched_queries = len(df.query(f"{start_time} <= launch_time <= {end_time}"))
+        df = df.query(f"{start_time} <= finish_time <= {end_time}")
+    else:
+        launched_queries = len(df)
+
+    if start_time is None:
+        start_time = df["launch_time"].min()
+    if end_time is None:
+        end_time = df["finish_time"].max()
+
+    total_time = end_time - start_time
+    total_requests = launched_queries + pending_queries
+    finished_requests = len(df)
+    request_throughput = finished_requests / total_time
+
+    total_prompt_tokens = df["prompt_tokens"].sum()
+    total_generation_tokens = df["generation_tokens"].sum()
+    output_token_throughput = total_generation_tokens / total_time
+    total_token_throughput = (total_prompt_tokens + total_generation_tokens) / total_time
+
+    # TTFT stats (in milliseconds)
+    ttft_ms = df["ttft"] * 1000
+
+    # Time per Output Token calculation (excluding first token)
+    tpot = ((df['generation_time'] - df['ttft']) / (df['generation_tokens'] - 1)) * 1000
+    tpot = tpot.replace([float('inf'), -float('inf'), np.nan], np.nan).dropna()
+
+    # Inter-token Latency
+    itl = (df['generation_time'] / df['generation_tokens']) * 1000
+    itl = itl.replace([float('inf'), -float('inf'), np.nan], np.nan).dropna()
+
+    # Prefill and decode rates, separately: the prompt is processed until the first token,
+    # the remaining output tokens are decoded afterwards
+    decode_tokens = (df["generation_tokens"] - 1).clip(lower=0)
+    prefill_speed = (df["prompt_tokens"] / df["ttft"]).replace([float('inf'), -float('inf')], np.nan).dropna()
+    decode_speed = (decode_tokens / df["generation_time"])[decode_tokens > 0]
+    decode_speed = decode_speed.replace([float('inf'), -float('inf')], np.nan).dropna()
+
+    metrics = {
+        "total_requests": total_requests,
+        "successful_requests": finished_requests,
+        "duration_s": total_time,
+        "total_input_tokens": total_prompt_tokens,
+        "total_generated_tokens": total_generation_tokens,
+        "request_throughput": request_throughput,
+        "output_token_throughput": output_token_throughput,
+        "total_token_throughput": total_token_throughput,
+        "mean_ttft_ms": ttft_ms.mean(),
+        "median_ttft_ms": ttft_ms.median(),
+        "p99_ttft_ms": percentile(ttft_ms, 99),
+        "mean_tpot_ms": tpot.mean(),
+        "median_tpot_ms": tpot.median(),
+        "p99_tpot_ms": percentile(tpot, 99),
+        "mean_itl_ms": itl.mean(),
+        "median_itl_ms": itl.median(),
+        "p99_itl_ms": percentile(itl, 99),
+        "prefill_token_throughput": total_prompt_tokens / total_time,
+        "decode_token_throughput": decode_tokens.sum() / total_time,
+        "mean_prefill_speed": prefill_speed.mean(),
+        "mean_decode_speed": decode_speed.mean(),
+    }
+    # Token counts of requests whose stream carried no usage come from the local tokenizer
+    if "tokens_counted_locally" in df.columns:
+        metrics["locally_counted_requests"] = int(df["tokens_counted_locally"].sum())
+    # Older CSVs carry no schedule instrumentation
+    if {"scheduled_time", "send_time", "dispatch_delay"}.issubset(df.columns):
+        metrics.update(compute_schedule_metrics(df))
+    # Older CSVs and engines without prompt_tokens_details carry no cached token counts
+    if "cached_tokens" in df.columns and df["cached_tokens"].notna().any():
+        metrics.update(compute_cache_metrics(df))
+    # RAG runs record the chunk-reuse degree of every query
+    if "reused_chunks" in df.columns:
+        metrics.update(compute_reuse_metrics(df))
+    if engine_df is not None:
+        metrics.update(compute_engine_metrics(engine_df, start_time, end_time))
+    return metrics
+
+def compute_cache_metrics(df: pd.DataFrame) -> Dict[str, float]:
+    """
+    Prefix-cache effect from the engine-reported cached prompt tokens of every request:
+    the share of prompt tokens served from the cache and the TTFT of the requests that
+    hit the cache (any cached token) versus those that missed it.
+    """
+    df = df[df["cached_tokens"].notna()]
+    cached = df["cached_tokens"].astype(float)
+    hit = cached > 0
+    prompt_tokens = df["prompt_tokens"].sum()
+    metrics = {
+        "total_cached_tokens": cached.sum(),
+        "cache_hit_token_ratio": cached.sum() / prompt_tokens if prompt_tokens else np.nan,
+        "cache_hit_request_ratio": hit.mean(),
+    }
+    for name, requests in (("hit", df[hit]), ("miss", df[~hit])):
+        ttft_ms = requests["ttft"] * 1000
+        metrics[f"mean_ttft_{name}_ms"] = ttft_ms.mean() if len(ttft_ms) else np.nan
+        metrics[f"median_ttft_{name}_ms"] = ttft_ms.median() if len(ttft_ms) else np.nan
+        metrics[f"p99_ttft_{name}_ms"] = percentile(ttft_ms, 99)
+    return metrics
+
+REUSE_COLUMNS = (("reused_chunks", "reuse"), ("prefix_reused_chunks", "prefix_reuse"))
+
+def compute_reuse_metrics(df: pd.DataFrame) -> Dict[str, float]:
+    """
+    TTFT of the RAG workload split by reuse degree: the number of a query's chunks that
+    earlier queries already carried (reuse_<n>) and the number of its leading chunks an
+    earlier query started with (prefix_reuse_<n>), the part a prefix cache can serve.
+    """
+    metrics = {}
+    for column, name in REUSE_COLUMNS:
+        if column not in df.columns:
+            continue
+        for degree, requests in df.groupby(column):
+            ttft_ms = requests["ttft"] * 1000
+            metrics[f"{name}_{int(degree)}_requests"] = len(requests)
+            metrics[f"mean_ttft_{name}_{int(degree)}_ms"] = ttft_ms.mean()
+            metrics[f"p99_ttft_{name}_{int(degree)}_ms"] = percentile(ttft_ms, 99)
+    return metrics
+
+def reuse_degrees(m: Dict[str, float], name: str):
+    """Reuse degrees present in the metrics of compute_reuse_metrics, ascending."""
+    degrees = (key[len(name) + 1:-len("_requests")] for key in m
+               if key.startswith(f"{name}_") and key.endswith("_requests"))
+    return sorted(int(degree) for degree in degrees if degree.isdigit())
+
+def engine_metrics_path(filename: str) -> str:
+    """Engine metrics CSV the workloads write next to a per-request CSV."""
+    return f"{os.path.splitext(filename)[0]}_engine_metrics.csv"
+
+def load_engine_metrics(filename: str) -> Optional[pd.DataFrame]:
+    path = engine_metrics_path(filename)
+    if not os.path.exists(path):
+        return None
+    engine_df = pd.read_csv(path)
+    return engine_df if not engine_df.empty else None
+
+def _counter_increase(values: pd.Series) -> float:
+    """Increase of a counter over the samples, robust to engine restarts (counter resets)."""
+    values = values.dropna()
+    if len(values) < 2:
+        return np.nan
+    diffs = values.diff().dropna()
+    # after a reset the counter restarted from 0
+    return float(diffs.where(diffs >= 0, values[diffs.index]).sum())
+
+def compute_engine_metrics(engine_df: pd.DataFrame, start_time: float, end_time: float) -> Dict[str, float]:
+    """
+    Engine-side averages over the run from the samples of the engine's /metrics (same
+    clock as launch_time / finish_time): queue length, running requests, KV-cache usage,
+    prefix-cache hit rate (from the hit / query counters, else the engine's own gauge)
+    and preemptions. Metrics the engine does not export are NaN.
+    """
+    samples = engine_df[(engine_df["timestamp"] >= start_time) & (engine_df["timestamp"] <= end_time)]
+
+    def column(name: str) -> pd.Series:
+        return samples[name].dropna() if name in samples.columns else pd.Series(dtype=float)
+
+    def mean(name: str) -> float:
+        values = column(name)
+        return float(values.mean()) if len(values) else np.nan
+
+    def maximum(name: str) -> float:
+        values = column(name)
+        return float(values.max()) if len(values) else np.nan
+
+    hit_rate = np.nan
+    queries = _counter_increase(column("prefix_cache_queries"))
+    if queries > 0:
+        hit_rate = _counter_increase(column("prefix_cache_hits")) / queries
+    elif len(column("prefix_cache_hit_rate")):
+        hit_rate = mean("prefix_cache_hit_rate")
+    return {
+        "engine_samples": len(samples),
+        "mean_engine_running": mean("num_running"),
+        "mean_engine_waiting": mean("num_waiting"),
+        "max_engine_waiting": maximum("num_waiting"),
+        "mean_kv_cache_usage": mean("kv_cache_usage"),
+        "max_kv_cache_usage": maximum("kv_cache_usage"),
+        "engine_prefix_cache_hit_rate": hit_rate,
+        "engine_preemptions": _counter_increase(column("preemptions")),
+    }
+
+CORRECTED_PERCENTILES = (50, 90, 99)
+
+def compute_schedule_metrics(df: pd.DataFrame) -> Dict[str, float]:
+    """How closely the requests followed the workload's intended send schedule."""
+    lag_ms = (df["send_time"] - df["scheduled_time"]).clip(lower=0) * 1000
+    dispatch_ms = df["dispatch_delay"] * 1000
+    missed_slots = df["missed_slots"] if "missed_slots" in df.columns else pd.Series(0, index=df.index)
+
+    scheduled_span = df["scheduled_time"].max() - df["scheduled_time"].min()
+    send_span = df["send_time"].max() - df["send_time"].min()
+    num_gaps = max(len(df) - 1, 0)
+    return {
+        "intended_request_rate": num_gaps / scheduled_span if scheduled_span > 0 else np.nan,
+        "sent_request_rate": num_gaps / send_span if send_span > 0 else np.nan,
+        "mean_schedule_lag_ms": lag_ms.mean(),
+        "p99_schedule_lag_ms": percentile(lag_ms, 99),
+        "max_schedule_lag_ms": lag_ms.max(),
+        "mean_dispatch_delay_ms": dispatch_ms.mean(),
+        "p99_dispatch_delay_ms": percentile(dispatch_ms, 99),
+        "on_time_ratio": (missed_slots == 0).mean(),
+        "missed_slots": int(missed_slots.sum()),
+        **compute_corrected_latency_metrics(df),
+    }
+
+def compute_corrected_latency_metrics(df: pd.DataFrame) -> Dict[str, float]:
+    """
+    TTFT and end-to-end latency percentiles measured from the launch (uncorrected) and
+    from the intended send time (corrected for coordinated omission: requests delayed
+    by a backlog are charged for the time they spent waiting to be sent).
+    """
+    delay = df["launch_time"] - df["scheduled_time"]
+    latencies_ms = {
+        "ttft": df["ttft"] * 1000,
+        "corrected_ttft": (df["ttft"] + delay) * 1000,
+        "e2el": (df["finish_time"] - df["launch_time"]) * 1000,
+        "corrected_e2el": (df["finish_time"] - df["scheduled_time"]) * 1000,
+    }
+    metrics = {}
+    for name, values in latencies_ms.items():
+        for p in CORRECTED_PERCENTILES:
+            metrics[f"p{p}_{name}_ms"] = percentile(values, p)
+    return metrics
+
+def load_readiness() -> Optional[Dict[str, float]]:
+    """
+    Cold-start metrics of the baseline the run was served by: run-bench.py probes the
+    engine by inference after every deploy (2-serving-engines/readiness_probe.py).
+    """
+    readiness = os.environ.get("LMBENCH_READINESS")
+    return json.loads(readiness) if readiness else None
+
+def warmup_report_path(filename: str) -> str:
+    """Warmup report the workloads write next to a per-request CSV."""
+    return f"{os.path.splitext(filename)[0]}_warmup.json"
+
+def load_warmup(filename: str) -> Optional[Dict[str, Any]]:
+    """
+    Report of the steady-state warmup before the run (--warmup-time of the drivers): how
+    long the run's own prefixes were sent until TTFT and throughput stopped changing.
+    """
+    path = warmup_report_path(filename)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
 def ProcessSummary(
     df: pd.DataFrame,
     start_time: Optional[float] = None,
     end_time: Optional[float] = None,
     pending_queries: int = 0,
     qps: Optional[float] = None,
+    engine_df: Optional[pd.DataFrame] = None,
+    readiness: Optional[Dict[str, float]] = None,
+    warmup: Optional[Dict[str, Any]] = None,
 ) -> str:
     buf = io.StringIO()
     with contextlib.redirect_stdout(buf):
@@ -28,70 +298,92 @@ def ProcessSummary(
             return buf.getvalue()
 
         try:
-            if start_time is not None and end_time is not None:
-                launched_queries = len(df.query(f"{start_time} <= launch_time <= {end_time}"))
-                df = df.query(f"{start_time} <= finish_time <= {end_time}")
-            else:
-                launched_queries = len(df)
-
-            if qps is None:
-                qps = 0.0
-
-            if start_time is None:
-                start_time = df["launch_time"].min()
-            if end_time is None:
-                end_time = df["finish_time"].max()
-
-            total_time = end_time - start_time
-            total_requests = launched_queries + pending_queries
-            finished_requests = len(df)
-            request_throughput = finished_requests / total_time
-
-            total_prompt_tokens = df["prompt_tokens"].sum()
-            total_generation_tokens = df["generation_tokens"].sum()
-            output_token_throughput = total_generation_tokens / total_time
-            total_token_throughput = (total_prompt_tokens + total_generation_tokens) / total_time
-
-            # TTFT stats (in milliseconds)
-            ttft_ms = df["ttft"] * 1000
-            mean_ttft = ttft_ms.mean()
-            median_ttft = ttft_ms.median()
-            p99_ttft = np.percentile(ttft_ms, 99)
-
-            # Time per Output Token calculation (excluding first token)
-            df['tpot'] = ((df['generation_time'] - df['ttft']) / (df['generation_tokens'] - 1)) * 1000
-            tpot = df['tpot'].replace([float('inf'), -float('inf'), np.nan], np.nan).dropna()
-            mean_tpot = tpot.mean()
-            median_tpot = tpot.median()
-            p99_tpot = np.percentile(tpot, 99)
-
-            # Inter-token Latency
-            df['itl'] = (df['generation_time'] / df['generation_tokens']) * 1000
-            itl = df['itl'].replace([float('inf'), -float('inf'), np.nan], np.nan).dropna()
-            mean_itl = itl.mean()
-            median_itl = itl.median()
-            p99_itl = np.percentile(itl, 99)
+            m = compute_metrics(df, start_time, end_time, pending_queries, engine_df)
 
             print("============ Serving Benchmark Result ============")
-            print(f"Successful requests:                     {finished_requests:<10}")
-            print(f"Benchmark duration (s):                  {total_time:.2f}      ")
-            print(f"Total input tokens:                      {total_prompt_tokens:<10}")
-            print(f"Total generated tokens:                  {total_generation_tokens:<10}")
-            print(f"Request throughput (req/s):              {request_throughput:.2f}      ")
-            print(f"Output token throughput (tok/s):         {output_token_throughput:.2f}    ")
-            print(f"Total Token throughput (tok/s):          {total_token_throughput:.2f}    ")
+            print(f"Successful requests:                     {m['successful_requests']:<10}")
+            print(f"Benchmark duration (s):                  {m['duration_s']:.2f}      ")
+            print(f"Total input tokens:                      {m['total_input_tokens']:<10}")
+            print(f"Total generated tokens:                  {m['total_generated_tokens']:<10}")
+            if m.get("locally_counted_requests"):
+                print(f"Requests counted locally (no usage):     {m['locally_counted_requests']:<10}")
+            print(f"Request throughput (req/s):              {m['request_throughput']:.2f}      ")
+            print(f"Output token throughput (tok/s):         {m['output_token_throughput']:.2f}    ")
+            print(f"Total Token throughput (tok/s):          {m['total_token_throughput']:.2f}    ")
+            print("-----------------Prefill / Decode-----------------")
+            print(f"Prefill throughput (tok/s):              {m['prefill_token_throughput']:.2f}    ")
+            print(f"Decode throughput (tok/s):               {m['decode_token_throughput']:.2f}    ")
+            print(f"Mean per-request prefill speed (tok/s):  {m['mean_prefill_speed']:.2f}    ")
+            print(f"Mean per-request decode speed (tok/s):   {m['mean_decode_speed']:.2f}    ")
             print("---------------Time to First Token----------------")
-            print(f"Mean TTFT (ms):                          {mean_ttft:.2f}     ")
-            print(f"Median TTFT (ms):                        {median_ttft:.2f}     ")
-            print(f"P99 TTFT (ms):                           {p99_ttft:.2f}     ")
+            print(f"Mean TTFT (ms):                          {m['mean_ttft_ms']:.2f}     ")
+            print(f"Median TTFT (ms):                        {m['median_ttft_ms']:.2f}     ")
+            print(f"P99 TTFT (ms):                           {m['p99_ttft_ms']:.2f}     ")
             print("-----Time per Output Token (excl. 1st token)------")
-            print(f"Mean TPOT (ms):                          {mean_tpot:.2f}     ")
-            print(f"Median TPOT (ms):                        {median_tpot:.2f}     ")
-            print(f"P99 TPOT (ms):                           {p99_tpot:.2f}     ")
+            print(f"Mean TPOT (ms):                          {m['mean_tpot_ms']:.2f}     ")
+            print(f"Median TPOT (ms):                        {m['median_tpot_ms']:.2f}     ")
+            print(f"P99 TPOT (ms):                           {m['p99_tpot_ms']:.2f}     ")
             print("---------------Inter-token Latency----------------")
-            print(f"Mean ITL (ms):                           {mean_itl:.2f}     ")
-            print(f"Median ITL (ms):                         {median_itl:.2f}     ")
-            print(f"P99 ITL (ms):                            {p99_itl:.2f}     ")
+            print(f"Mean ITL (ms):                           {m['mean_itl_ms']:.2f}     ")
+            print(f"Median ITL (ms):                         {m['median_itl_ms']:.2f}     ")
+            print(f"P99 ITL (ms):                            {m['p99_itl_ms']:.2f}     ")
+            if "mean_schedule_lag_ms" in m:
+                print("----------------Schedule Adherence----------------")
+                print(f"Intended request rate (req/s):           {m['intended_request_rate']:.2f}      ")
+                print(f"Sent request rate (req/s):               {m['sent_request_rate']:.2f}      ")
+                print(f"Mean schedule lag (ms):                  {m['mean_schedule_lag_ms']:.2f}     ")
+                print(f"P99 schedule lag (ms):                   {m['p99_schedule_lag_ms']:.2f}     ")
+                print(f"Max schedule lag (ms):                   {m['max_schedule_lag_ms']:.2f}     ")
+                print(f"Mean loop dispatch delay (ms):           {m['mean_dispatch_delay_ms']:.2f}     ")
+                print(f"P99 loop dispatch delay (ms):            {m['p99_dispatch_delay_ms']:.2f}     ")
+                print(f"Requests without missed slots (%):       {m['on_time_ratio'] * 100:.2f}     ")
+                print(f"Missed slots:                            {int(m['missed_slots']):<10}")
+                print("-------Coordinated Omission (uncorr / corr)-------")
+                for p in CORRECTED_PERCENTILES:
+                    label = f"P{p} TTFT (ms):"
+                    print(f"{label:<41}{m[f'p{p}_ttft_ms']:.2f} / {m[f'p{p}_corrected_ttft_ms']:.2f}")
+                for p in CORRECTED_PERCENTILES:
+                    label = f"P{p} E2E latency (ms):"
+                    print(f"{label:<41}{m[f'p{p}_e2el_ms']:.2f} / {m[f'p{p}_corrected_e2el_ms']:.2f}")
+            if "cache_hit_token_ratio" in m:
+                print("----------Prefix Cache (engine-reported)-----------")
+                print(f"Cached prompt tokens:                    {int(m['total_cached_tokens']):<10}")
+                print(f"Cache-hit token ratio (%):               {m['cache_hit_token_ratio'] * 100:.2f}     ")
+                print(f"Requests with cache hits (%):            {m['cache_hit_request_ratio'] * 100:.2f}     ")
+                print("TTFT of requests                         hit / miss")
+                for stat, label in (("mean", "Mean"), ("median", "Median"), ("p99", "P99")):
+                    label = f"{label} TTFT (ms):"
+                    print(f"{label:<41}{m[f'{stat}_ttft_hit_ms']:.2f} / {m[f'{stat}_ttft_miss_ms']:.2f}")
+            if reuse_degrees(m, "reuse"):
+                print("-------TTFT by Chunk Reuse (mean / P99, ms)-------")
+                for name, label in (("reuse", "reused"), ("prefix_reuse", "prefix-reused")):
+                    for degree in reuse_degrees(m, name):
+                        label_n = f"{degree} {label} chunks ({m[f'{name}_{degree}_requests']} req):"
+                        print(f"{label_n:<41}{m[f'mean_ttft_{name}_{degree}_ms']:.2f} / "
+                              f"{m[f'p99_ttft_{name}_{degree}_ms']:.2f}")
+            if m.get("engine_samples"):
+                print("------------Engine Metrics (/metrics)-------------")
+                print(f"Samples:                                 {int(m['engine_samples']):<10}")
+                print(f"Mean running requests:                   {m['mean_engine_running']:.2f}      ")
+                print(f"Mean queued requests:                    {m['mean_engine_waiting']:.2f}      ")
+                print(f"Max queued requests:                     {m['max_engine_waiting']:.2f}      ")
+                print(f"Mean KV-cache usage (%):                 {m['mean_kv_cache_usage'] * 100:.2f}     ")
+                print(f"Max KV-cache usage (%):                  {m['max_kv_cache_usage'] * 100:.2f}     ")
+                print(f"Prefix-cache hit rate (%):               {m['engine_prefix_cache_hit_rate'] * 100:.2f}     ")
+                print(f"Preemptions:                             {m['engine_preemptions']:.0f}       ")
+            if readiness:
+                steady = readiness.get("time_to_steady_state_s")
+                print("--------------Cold Start (baseline)---------------")
+                print(f"Time to first inference (s):             {readiness['time_to_first_inference_s']:.2f}      ")
+                print("Time to steady state (s):                " + (f"{steady:.2f}" if steady is not None else "not reached"))
+                print(f"Steady probe latency (ms):               {readiness['steady_probe_latency_ms']:.2f}     ")
+            if warmup:
+                print("---------------------Warmup-----------------------")
+                print(f"Warmup duration (s):                     {warmup['warmup_s']:.2f}      ")
+                print(f"Warmup requests:                         {warmup['warmup_requests']:<10}")
+                print("Steady state reached:                    " + ("yes" if warmup["warmup_steady"] else "no (time limit)"))
+                print(f"Final window mean TTFT (ms):             {warmup['warmup_final_ttft_ms']:.2f}     ")
+                print(f"Final window output throughput (tok/s):  {warmup['warmup_final_output_throughput']:.2f}    ")
             print("==================================================")
 
         except Exception as e:
@@ -104,6 +396,10 @@ def ProcessSummary(
     return buf.getvalue()
 
 def process_output(filename: str, **kwargs):
+    # run-bench.py tags the runs of a serving matrix cell (Serving.Matrix in bench-spec.yaml)
+    if os.environ.get("LMBENCH_CELL"):
+        kwargs.setdefault("CELL", os.environ["LMBENCH_CELL"])
+        kwargs.setdefault("CELL_PARAMS", os.environ.get("LMBENCH_CELL_PARAMS", ""))
     try:
         df = pd.read_csv(filename)
 
@@ -112,7 +408,11 @@ def process_output(filename: str, **kwargs):
         timestamp = datetime.now().strftime("%Y%m%d-%H%M")
         results_path = f"4-latest-results/{filename_without_parent_or_ext}-{timestamp}.results"
 
-        summary_str = ProcessSummary(df, pending_queries=0)
+        engine_df = load_engine_metrics(filename)
+        readiness = load_readiness()
+        warmup = load_warmup(filename)
+        summary_str = ProcessSummary(df, pending_queries=0, engine_df=engine_df, readiness=readiness,
+                                     warmup=warmup)
 
         # Read bench-spec.yaml and filter out lines with hf_token
         bench_spec_content = ""
@@ -153,11 +453,48 @@ def process_output(filename: str, **kwargs):
             dst.write(src.read())
         print(f"Results saved to ~/srv/runner-db/{filename_without_parent_or_ext}-{timestamp}.results")
 
+        record_results_db(df, filename, results_path, timestamp, bench_spec_content,
+                          engine_df=engine_df, readiness=readiness, warmup=warmup, **kwargs)
+
     except Exception as e:
         print(f"ERROR: Failed to process benchmark results: {str(e)}")
         print("The benchmarking script may have failed due to context length errors.")
         print("Check the logs for more details.")
 
+def record_results_db(df: pd.DataFrame, filename: str, results_path: str, timestamp: str,
+                      bench_spec_content: str, engine_df: Optional[pd.DataFrame] = None,
+                      readiness: Optional[Dict[str, float]] = None,
+                      warmup: Optional[Dict[str, Any]] = None, **kwargs):
+    """
+    Index the run in the local results database (see results_db.py).
+    The optional `Results` section of bench-spec.yaml selects the database path
+    and whether the per-request rows are stored as well.
+    """
+    try:
+        bench_spec = yaml.safe_load(bench_spec_content) if bench_spec_content else {}
+        results_config = (bench_spec or {}).get('Results') or {}
+        metrics = compute_metrics(df, engine_df=engine_df) if not df.empty else {}
+        # the baseline's cold start, the same for every run it served
+        metrics.update(readiness or {})
+        metrics.update(warmup or {})
+        run_id = results_db.record_run(
+            metrics,
+            kwargs,
+            bench_spec=bench_spec,
+            bench_spec_text=bench_spec_content,
+            timestamp=timestamp,
+            results_file=results_path,
+            csv_file=filename,
+            df=df if results_config.get('storeRequests', False) else None,
+            db_path=results_config.get('database'),
+            # a matrix cell may vary the model: its effective serving config, not the spec on disk
+            baseline=os.environ.get("LMBENCH_CELL_BASELINE"),
+            model=os.environ.get("LMBENCH_CELL_MODEL"),
+        )
+        print(f"Results indexed as run {run_id} in {results_db.get_db_path(results_config.get('database'))}")
+    except Exception as e:
+        print(f"WARNING: Failed to record results in the results database: {str(e)}")
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Usage: python summarize.py <path_to_csv> [key=value ...]")
@@ -1,12 +1,17 @@
 #!/usr/bin/env python3
 
 import yaml
+import copy
+import hashlib
+import itertools
+import json
 import os
 import subprocess
 import time
 from pathlib import Path
-from typing import Dict, Any, Union, Optional
+from typing import Dict, Any, List, Tuple, Union, Optional
 import sys
+import urllib.request
 
 GLOBAL_ARGS = None # MIGHT be set in parse_args()
 
@@ -46,6 +51,8 @@ def read_bench_spec() -> Dict[str, Any]:
         elif baseline == 'Dynamo':
             print("validating hf_token for Dynamo baseline")
             pass
+        elif baseline == 'Mock':
+            print("Mock baseline needs no hf_token")
         else:
             raise ValueError(f"Unsupported baseline: {baseline}")
 
@@ -53,6 +60,58 @@ def read_bench_spec() -> Dict[str, Any]:
         return config
 
 
+# Serving parameters that need the most work to change (other base YAML, model weights or
+# GPU layout) vary slowest across the cells of a Matrix
+MATRIX_REDEPLOY_ORDER = ['vLLM-Version', 'modelURL', 'numGPUs', 'tensorParallelSize', 'replicaCount']
+
+def _gray_order(values: List[list]) -> List[tuple]:
+    """
+    All combinations of the value lists, ordered so that consecutive combinations differ in
+    exactly one position (reflected mixed-radix Gray code); the first position changes least.
+    """
+    if not values:
+        return [()]
+    rest = _gray_order(values[1:])
+    order = []
+    for i, value in enumerate(values[0]):
+        for combination in (rest if i % 2 == 0 else reversed(rest)):
+            order.append((value, *combination))
+    return order
+
+def expand_serving_matrix(config: Dict[str, Any]) -> List[Tuple[Optional[str], Dict[str, Any], Dict[str, Any]]]:
+    """
+    Expand the optional Serving.Matrix of bench-spec.yaml (parameter -> list of values, applied
+    to the selected baseline's section) into (cell id, cell parameters, config) per cell, in
+    run order: the most expensive parameters to redeploy vary slowest and consecutive cells
+    differ in a single parameter. Without a Matrix there is one cell with the config as is.
+    """
+    matrix = config.get('Serving', {}).get('Matrix')
+    if not matrix:
+        return [(None, {}, config)]
+    if not isinstance(matrix, dict) or not all(isinstance(v, list) and v for v in matrix.values()):
+        raise ValueError("Serving.Matrix must map serving parameters to non-empty lists of values")
+
+    baseline = config['Serving'].get('Baseline')
+    keys = sorted(matrix, key=lambda k: MATRIX_REDEPLOY_ORDER.index(k) if k in MATRIX_REDEPLOY_ORDER
+                  else len(MATRIX_REDEPLOY_ORDER))
+    cells = []
+    for i, combination in enumerate(_gray_order([matrix[k] for k in keys])):
+        params = dict(zip(keys, combination))
+        cell_config = copy.deepcopy(config)
+        del cell_config['Serving']['Matrix']
+        cell_config['Serving'].setdefault(baseline, {}).update(params)
+        cells.append((f"cell{i}", params, cell_config))
+    return cells
+
+def write_matrix_plan(cells: List[Tuple[Optional[str], Dict[str, Any], Dict[str, Any]]]) -> None:
+    """Record the parameters of every cell next to the results."""
+    plan_path = Path(__file__).parent / '4-latest-results' / 'matrix-cells.json'
+    with open(plan_path, 'w') as f:
+        json.dump([{'cell': cell_id, 'params': params} for cell_id, params, _ in cells], f, indent=2, default=str)
+    print(f"Serving matrix of {len(cells)} cells written to {plan_path}")
+    for cell_id, params, _ in cells:
+        print(f"  {cell_id}: {params}")
+
 # 1. Infrastructure Setup
 def setup_infrastructure(config: Dict[str, Any]) -> None:
     """Set up the infrastructure based on the configuration."""
@@ -69,6 +128,8 @@ def setup_infrastructure(config: Dict[str, Any]) -> None:
         minikube_installation(config)
     elif location == 'LMCacheGKE':
         start_gke_cluster(config)
+    elif location == 'Local':
+        print("Serving locally (e.g. with the Mock baseline), no cluster to set up")
     else:
         raise ValueError(f"Unsupported infrastructure location: {location}")
 
@@ -162,6 +223,15 @@ def setup_baseline(config: Dict[str, Any]) -> None:
         HF_TOKEN = hf_token
 
         kubernetes_application(direct_production_stack_config)
+    elif baseline == 'Mock':
+        KEY = 'mock'
+        mock_config = config['Serving'].get('Mock', {})
+        # the mock engine accepts any model name and needs no weights, but the workloads
+        # still tokenize with the model's tokenizer where they prepare data
+        MODEL_URL = mock_config.get('modelURL', 'meta-llama/Llama-3.1-8B-Instruct')
+        HF_TOKEN = mock_config.get('hf_token') or 'EMPTY'
+
+        mock_engine_installation(mock_config)
     elif baseline == 'Dynamo':
         KEY = 'dynamo'
         #TODO
@@ -170,6 +240,35 @@ def setup_baseline(config: Dict[str, Any]) -> None:
     else:
         raise ValueError(f"Unsupported baseline: {baseline}")
 
+def mock_engine_installation(mock_config: Dict[str, Any]) -> None:
+    """
+    Start the local mock serving engine (no GPU needed) on port 30080
+    """
+    # bench-spec key -> mock_engine.py flag
+    flags = {
+        'prefillMsPerToken': '--prefill-ms-per-token',
+        'decodeMsPerToken': '--decode-ms-per-token',
+        'batchSlowdown': '--batch-slowdown',
+        'cacheCapacityTokens': '--cache-capacity-tokens',
+        'blockSize': '--block-size',
+        'replicaCount': '--num-replicas',
+        'loadSeconds': '--load-seconds',
+        'warmupRequests': '--warmup-requests',
+        'warmupPenaltyMs': '--warmup-penalty-ms',
+    }
+
+    install_script = Path(__file__).parent / '2-serving-engines' / 'mock-engine' / 'run-mock-engine.sh'
+    os.chmod(install_script, 0o755)
+
+    global MODEL_URL
+    cmd = [str(install_script), '--model', str(MODEL_URL)]
+    for key, flag in flags.items():
+        if key in mock_config:
+            cmd.extend([flag, str(mock_config[key])])
+
+    print(f"Starting the mock engine: {' '.join(cmd)}")
+    subprocess.run(cmd, check=True)
+
 def sglang_installation(sglang_config: Dict[str, Any]) -> None:
     """
     Deploy SGLang using the configured parameters
@@ -186,13 +285,25 @@ def sglang_installation(sglang_config: Dict[str, Any]) -> None:
 
     updated_config_list = _override_sglang_yaml(base_config_list, sglang_config)
 
+    # the StatefulSet carries the fingerprint of the config it was deployed with
+    fingerprint = config_fingerprint(updated_config_list)
+    for doc in updated_config_list:
+        if doc.get('kind') == 'StatefulSet':
+            doc['metadata'] = {**doc.get('metadata', {}),
+                               'annotations': {**doc.get('metadata', {}).get('annotations', {}),
+                                               FINGERPRINT_ANNOTATION: fingerprint}}
+
     # dump the updated config to the latest results folder for visibility
     output_path = Path(__file__).parent / "4-latest-results" / "generated-sglang-config.yaml"
     with open(output_path, 'w') as out:
         yaml.dump_all(updated_config_list, out, default_flow_style=False)
         print(f"Generated SGLang config written to {output_path}")
 
-    # Run the sglang installation script
+    if _deployed_sglang_fingerprint() == fingerprint and _serving_endpoint_ready('svc/sglang-service', '30080:30000'):
+        print(f"SGLang is already serving this config (fingerprint {fingerprint}), skipping the redeploy")
+        return
+
+    # Run the sglang installation script (kubectl apply: an in-place rolling update if SGLang is running)
     install_script = Path(__file__).parent / '2-serving-engines' / 'sglang' / 'run-sglang.sh'
     os.chmod(install_script, 0o755)
     print("Running SGLang install script...")
@@ -287,6 +398,69 @@ def _override_sglang_yaml(base_config_list: list, override: Dict[str, Any]) -> l
 
     return updated_config_list
 
+FINGERPRINT_ANNOTATION = 'lmbench/config-fingerprint'
+
+def config_fingerprint(rendered: Any) -> str:
+    """Hash of a rendered serving config, independent of key order."""
+    return hashlib.sha256(json.dumps(rendered, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def _run_json(cmd: List[str]) -> Optional[Any]:
+    """Output of a kubectl / helm command as JSON, None if it fails (e.g. nothing deployed)."""
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    try:
+        return json.loads(result.stdout)
+    except json.JSONDecodeError:
+        return None
+
+def _helm_release(name: str) -> Optional[Dict[str, Any]]:
+    """Fingerprint and values of a deployed helm release, None if it is not deployed."""
+    status = _run_json(['helm', 'status', name, '-o', 'json'])
+    if not status or status.get('info', {}).get('status') != 'deployed':
+        return None
+    description = status['info'].get('description', '')
+    fingerprint = description.split('=', 1)[1] if description.startswith('lmbench-fingerprint=') else None
+    return {'fingerprint': fingerprint, 'values': _run_json(['helm', 'get', 'values', name, '-o', 'json']) or {}}
+
+def _deployed_sglang_fingerprint() -> Optional[str]:
+    statefulset = _run_json(['kubectl', 'get', 'statefulset', 'sglang-single', '-o', 'json'])
+    if not statefulset:
+        return None
+    return statefulset.get('metadata', {}).get('annotations', {}).get(FINGERPRINT_ANNOTATION)
+
+def _without_replica_counts(values: Dict[str, Any]) -> Dict[str, Any]:
+    """Helm values without the replica counts, which a helm upgrade changes in place."""
+    values = copy.deepcopy(values)
+    for model_spec in values.get('servingEngineSpec', {}).get('modelSpec', []):
+        model_spec.pop('replicaCount', None)
+    return values
+
+def _serving_endpoint_ready(service: str, ports: str) -> bool:
+    """
+    Whether the OpenAI API answers on localhost:30080, (re)starting the port-forward to the
+    service once if it does not.
+    """
+    def answers() -> bool:
+        try:
+            with urllib.request.urlopen("http://localhost:30080/v1/models", timeout=5):
+                return True
+        except OSError:
+            return False
+
+    if answers():
+        return True
+    subprocess.Popen(['kubectl', 'port-forward', service, ports],
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(10):
+        time.sleep(1)
+        if answers():
+            return True
+    return False
+
 def helm_installation(prodstack_config: Dict[str, Any]) -> None:
     """
     Deploy the router and serving engines through production stack helm installation
@@ -313,11 +487,23 @@ def helm_installation(prodstack_config: Dict[str, Any]) -> None:
         yaml.dump(updated_config, out, default_flow_style=False)
         print(f"Generated config written to {output_path}")
 
+    # Compare with the release that is running: the helm release description carries the
+    # fingerprint of the values it was deployed with
+    fingerprint = config_fingerprint(updated_config)
+    release = _helm_release('vllm')
+    mode = 'install'
+    if release is not None:
+        if release['fingerprint'] == fingerprint and _serving_endpoint_ready('svc/vllm-router-service', '30080:80'):
+            print(f"The vllm release is already serving this config (fingerprint {fingerprint}), skipping the redeploy")
+            return
+        if _without_replica_counts(release['values']) == _without_replica_counts(updated_config):
+            mode = 'upgrade'
+
     # Run the helm installation script
     install_script = Path(__file__).parent / '2-serving-engines' / 'helm-production-stack' / 'helm-install.sh'
     os.chmod(install_script, 0o755)
-    print("Running Helm install script...")
-    subprocess.run([str(install_script), str(output_path)], check=True)
+    print(f"Running Helm install script ({mode})...")
+    subprocess.run([str(install_script), str(output_path), fingerprint, mode], check=True)
 
     # The patching of deployments to the appropriate node pools is now handled directly
     # in the helm-install.sh script before waiting for pods to be ready
@@ -382,6 +568,22 @@ def kubernetes_application(direct_production_stack_config: Dict[str, Any]) -> No
     # The patching of deployments to the appropriate node pools is now handled directly
     # in the choose-and-deploy.sh script before waiting for pods to be ready
 
+def wait_for_serving(config: Dict[str, Any], deploy_start: float) -> None:
+    """
+    Probe the deployed baseline by inference until it serves with a steady latency
+    (2-serving-engines/readiness_probe.py, tuned by the optional Serving.Readiness block)
+    and hand the cold-start metrics to the summaries of the runs it serves.
+    """
+    if config['Serving'].get('Baseline') == 'Dynamo':
+        return
+    sys.path.insert(0, str(Path(__file__).parent / '2-serving-engines'))
+    from readiness_probe import ReadinessConfig, wait_until_ready
+
+    global MODEL_URL
+    readiness_config = ReadinessConfig.from_spec(config['Serving'].get('Readiness'))
+    result = wait_until_ready("http://localhost:30080/v1/", str(MODEL_URL), readiness_config, since=deploy_start)
+    os.environ['LMBENCH_READINESS'] = json.dumps(result.as_metrics())
+
 # 3. Run the specified workload
 def run_workload(config: Dict[str, Any]) -> None:
     """Run the specified workload based on the configuration."""
@@ -405,7 +607,7 @@ def run_workload(config: Dict[str, Any]) -> None:
 
     workload_cfg = config['Workload']
 
-    supported_workloads = ['ShareGPT', 'LMCacheSynthetic', 'Agentic', 'Mooncake']
+    supported_workloads = ['ShareGPT', 'LMCacheSynthetic', 'Agentic', 'Mooncake', 'Replay', 'RAG']
     for workload in workload_cfg:
         if workload not in supported_workloads:
             raise ValueError(f"Unsupported workload type: {workload}")
@@ -443,6 +645,60 @@ def run_workload(config: Dict[str, Any]) -> None:
         else:
             run_agentic(agentic_config)
 
+    if 'Replay' in workload_cfg:
+        replay_config = workload_cfg['Replay']
+        if isinstance(replay_config, list):
+            for config in replay_config:
+                run_replay(config)
+        else:
+            run_replay(replay_config)
+
+    if 'RAG' in workload_cfg:
+        rag_config = workload_cfg['RAG']
+        if isinstance(rag_config, list):
+            for config in rag_config:
+                run_rag(config)
+        else:
+            run_rag(rag_config)
+
+def run_length_env(workload_config: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Environment for the workload launchers selecting the run length of each benchmark.
+    With a CONVERGENCE block, every run stops once the confidence intervals of the chosen
+    metrics are narrow enough (bounded by MIN_TIME and MAX_TIME), otherwise the launchers
+    keep their fixed run length. With METRICS_PORT the load generator serves its live
+    metrics in the Prometheus format on that port; ENGINE_METRICS_INTERVAL sets how often
+    the engine's /metrics are scraped during a run (0 disables scraping). GENERATION_MODE
+    runs the benchmarks prefill-only (prefill) or with exact output lengths (decode).
+    """
+    env = os.environ.copy()
+    convergence = workload_config.get('CONVERGENCE')
+    if convergence:
+        metrics = convergence.get('METRICS', ['p99_ttft', 'throughput'])
+        run_length_args = [
+            '--time', str(convergence.get('MAX_TIME', 600)),
+            '--min-time', str(convergence.get('MIN_TIME', 60)),
+            '--converge-ci-width', str(convergence.get('CI_WIDTH', 0.1)),
+            '--converge-metrics', *[str(metric) for metric in metrics],
+        ]
+        env['RUN_LENGTH_ARGS'] = ' '.join(run_length_args)
+        print(f"Convergence-driven run length: {env['RUN_LENGTH_ARGS']}")
+    metrics_args = []
+    if workload_config.get('METRICS_PORT'):
+        metrics_args += ['--metrics-port', str(workload_config['METRICS_PORT'])]
+        print(f"Load generator metrics on http://localhost:{workload_config['METRICS_PORT']}/metrics")
+    if 'ENGINE_METRICS_INTERVAL' in workload_config:
+        metrics_args += ['--engine-metrics-interval', str(workload_config['ENGINE_METRICS_INTERVAL'])]
+    if metrics_args:
+        env['METRICS_ARGS'] = ' '.join(metrics_args)
+    generation_mode = workload_config.get('GENERATION_MODE')
+    if generation_mode:
+        if generation_mode not in ('mixed', 'prefill', 'decode'):
+            raise ValueError(f"GENERATION_MODE must be mixed, prefill or decode, got {generation_mode}")
+        env['GENERATION_MODE'] = generation_mode
+        print(f"Generation mode: {generation_mode}")
+    return env
+
 def run_sharegpt(sharegpt_config: Dict[str, Any]) -> None:
     """Run the ShareGPT workload with the specified configuration."""
     if not GLOBAL_ARGS.ignore_data_generation:
@@ -484,6 +740,16 @@ def sharegpt_data_generation(sharegpt_config: Dict[str, Any]) -> None:
         raise RuntimeError("Failed to generate ShareGPT data")
 
 def sharegpt_run_workload(sharegpt_config: Dict[str, Any]) -> None:
+    if sharegpt_config.get('IN_PROCESS_SWEEP', False):
+        run_in_process_sweep('sharegpt', sharegpt_config)
+    elif 'QPS_SEARCH' in sharegpt_config:
+        output_template = f"4-latest-results/{KEY}_sharegpt_output_{{qps}}.csv"
+        run_saturation_search('sharegpt', sharegpt_config['QPS_SEARCH'], output_template,
+                              lambda qps: sharegpt_run_qps(sharegpt_config, [qps]))
+    else:
+        sharegpt_run_qps(sharegpt_config, sharegpt_config.get('QPS'))
+
+def sharegpt_run_qps(sharegpt_config: Dict[str, Any], qps_values: list) -> None:
     workload_exec_script_path = Path(__file__).parent / '3-workloads' / 'sharegpt' / 'workload_execution' / 'run-sharegpt.sh'
 
     if not workload_exec_script_path.exists():
@@ -500,7 +766,6 @@ def sharegpt_run_workload(sharegpt_config: Dict[str, Any]) -> None:
     limit = sharegpt_config.get('LIMIT')
     min_rounds = sharegpt_config.get('MIN_ROUNDS')
     start_round = sharegpt_config.get('START_ROUND')
-    qps_values = sharegpt_config.get('QPS')
     cmd.extend([str(limit)])
     cmd.extend([str(min_rounds)])
     cmd.extend([str(start_round)])
@@ -508,7 +773,7 @@ def sharegpt_run_workload(sharegpt_config: Dict[str, Any]) -> None:
 
     # Execute the workload
     print(f"Running ShareGPT workload with parameters: {' '.join(cmd)}")
-    result = subprocess.run(cmd, check=True)
+    result = subprocess.run(cmd, check=True, env=run_length_env(sharegpt_config))
 
     if result.returncode == 0:
         print("ShareGPT workloads completed successfully")
@@ -535,9 +800,29 @@ def run_synthetic(synthetic_config: Dict[str, Any]) -> None:
     if not hasattr(run_synthetic, 'share_gpt_generated'):
         run_synthetic.share_gpt_generated = False
 
+    USE_SHAREGPT = synthetic_config.get('USE_SHAREGPT', False)
+    if USE_SHAREGPT and (not run_synthetic.share_gpt_generated):
+        synthetic_sharegpt_data_generation()
+        run_synthetic.share_gpt_generated = True
+
+    if synthetic_config.get('IN_PROCESS_SWEEP', False):
+        run_in_process_sweep('synthetic', synthetic_config)
+    elif 'QPS_SEARCH' in synthetic_config:
+        output_template = f"4-latest-results/{KEY}_synthetic_output_{{qps}}.csv"
+        # every probe is a fresh launcher run: advance the users by NUM_USERS_WARMUP per probe
+        # (as the launcher does per QPS point, NUM_USERS without it) so no probe replays the
+        # prefixes of an earlier one
+        user_id_step = synthetic_config.get('NUM_USERS_WARMUP') or synthetic_config.get('NUM_USERS', 1)
+        probe_user_ids = itertools.count(1, user_id_step)
+        run_saturation_search('synthetic', synthetic_config['QPS_SEARCH'], output_template,
+                              lambda qps: synthetic_run_qps(synthetic_config, [qps],
+                                                            init_user_id=next(probe_user_ids)))
+    else:
+        synthetic_run_qps(synthetic_config, synthetic_config.get('QPS'))
+
+def synthetic_run_qps(synthetic_config: Dict[str, Any], qps_values: list, init_user_id: int = 1) -> None:
     global MODEL_URL
 
-    qps_values = synthetic_config.get('QPS')
     NUM_USERS_WARMUP = synthetic_config.get('NUM_USERS_WARMUP')
     NUM_USERS = synthetic_config.get('NUM_USERS')
     NUM_ROUNDS = synthetic_config.get('NUM_ROUNDS')
@@ -545,9 +830,6 @@ def run_synthetic(synthetic_config: Dict[str, Any]) -> None:
     CHAT_HISTORY = synthetic_config.get('CHAT_HISTORY')
     ANSWER_LEN = synthetic_config.get('ANSWER_LEN')
     USE_SHAREGPT = synthetic_config.get('USE_SHAREGPT', False)
-    if USE_SHAREGPT and (not run_synthetic.share_gpt_generated):
-        synthetic_sharegpt_data_generation()
-        run_synthetic.share_gpt_generated = True
 
     workload_exec_script_path = Path(__file__).parent / '3-workloads' / 'synthetic' / 'run_synthetic.sh'
     if not workload_exec_script_path.exists():
@@ -585,13 +867,75 @@ def run_synthetic(synthetic_config: Dict[str, Any]) -> None:
 
     # Execute the workload
     print(f"Running synthetic workload with parameters: {' '.join(cmd)}")
-    result = subprocess.run(cmd, check=True)
+    env = run_length_env(synthetic_config)
+    env['INIT_USER_ID'] = str(init_user_id)
+    if synthetic_config.get('OPEN_LOOP', False):
+        env['SCHEDULE_ARGS'] = '--open-loop'
+    result = subprocess.run(cmd, check=True, env=env)
 
     if result.returncode == 0:
         print("Synthetic workloads completed successfully")
     else:
         raise RuntimeError("Failed to run synthetic workload")
 
+def run_saturation_search(workload: str, search_spec: Dict[str, Any], output_template: str, run_qps) -> None:
+    """
+    Adaptively probe QPS values (bracketing, then bisection) to find the highest QPS
+    at which the latency SLOs hold. run_qps(qps) runs the workload launcher for a single
+    QPS, whose per-request CSV is then read back from output_template.
+    """
+    import pandas as pd
+    sys.path.insert(0, str(Path(__file__).parent / '3-workloads'))
+    from saturation_search import SearchConfig, search_max_qps, report
+
+    search_config = SearchConfig.from_spec(search_spec)
+
+    def probe(qps: float):
+        csv_path = Path(__file__).parent / output_template.format(qps=qps)
+        # an output left over from an earlier run must not be scored as this probe
+        csv_path.unlink(missing_ok=True)
+        run_qps(qps)
+        if not csv_path.exists():
+            print(f"[warn] No results found at {csv_path}")
+            return None
+        try:
+            return pd.read_csv(csv_path)
+        except pd.errors.EmptyDataError:
+            return None
+
+    result = search_max_qps(probe, search_config)
+    curve_path = Path(__file__).parent / '4-latest-results' / f"{KEY}_{workload}_saturation.csv"
+    print(report(result, str(curve_path)))
+    print(f"Latency-versus-load curve written to {curve_path}")
+
+def run_in_process_sweep(workload: str, workload_config: Dict[str, Any]) -> None:
+    """
+    Run every QPS point (or the QPS search) of a workload config in a single Python process
+    (3-workloads/sweep.py), keeping the dataset, connection pool and event loop warm across
+    points instead of starting the launcher's driver processes per point.
+    """
+    sweep_script_path = Path(__file__).parent / '3-workloads' / 'sweep.py'
+    if not sweep_script_path.exists():
+        raise FileNotFoundError(f"Sweep driver not found at {sweep_script_path}")
+
+    global MODEL_URL
+    cmd = ['python3', str(sweep_script_path), workload]
+    cmd.extend(['--model', str(MODEL_URL)])
+    cmd.extend(['--base-url', "http://localhost:30080/v1/"]) # the base URL when serving with production stack
+    cmd.extend(['--key', KEY]) # the key that will be embedded in the filenames of the results
+    cmd.extend(['--config', json.dumps(workload_config)])
+    if workload_config.get('METRICS_PORT'):
+        # sweep.py serves them from the METRICS_PORT of --config
+        print(f"Load generator metrics on http://localhost:{workload_config['METRICS_PORT']}/metrics")
+
+    print(f"Running {workload} workload in-process with parameters: {' '.join(cmd)}")
+    result = subprocess.run(cmd, check=True)
+
+    if result.returncode == 0:
+        print(f"{workload} workloads completed successfully")
+    else:
+        raise RuntimeError(f"Failed to run {workload} workload")
+
 def run_mooncake(mooncake_config: Dict[str, Any]) -> None:
     """Run the Mooncake workload with the specified configuration."""
     qps_values = mooncake_config.get('QPS')
@@ -619,13 +963,114 @@ def run_mooncake(mooncake_config: Dict[str, Any]) -> None:
 
     # Execute the workload
     print(f"Running Mooncake workload with parameters: {' '.join(cmd)}")
-    result = subprocess.run(cmd, check=True)
+    result = subprocess.run(cmd, check=True, env=run_length_env(mooncake_config))
 
     if result.returncode == 0:
         print("Mooncake workloads completed successfully")
     else:
         raise RuntimeError("Failed to run Mooncake workload")
 
+def run_replay(replay_config: Dict[str, Any]) -> None:
+    """Replay request manifests compiled by 3-workloads/compile_manifest.py."""
+    manifests = replay_config.get('MANIFEST')
+    if not manifests:
+        raise ValueError("Replay workload needs a MANIFEST")
+    if not isinstance(manifests, list):
+        manifests = [manifests]
+    manifest_paths = []
+    for manifest in manifests:
+        manifest_path = Path(manifest)
+        if not manifest_path.is_absolute():
+            manifest_path = Path(__file__).parent / manifest_path
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"Request manifest not found at {manifest_path}")
+        manifest_paths.append(manifest_path.resolve())
+
+    workload_exec_script_path = Path(__file__).parent / '3-workloads' / 'replay' / 'run_replay.sh'
+    if not workload_exec_script_path.exists():
+        raise FileNotFoundError(f"Replay script not found at {workload_exec_script_path}")
+
+    os.chmod(workload_exec_script_path, 0o755)
+
+    global MODEL_URL
+
+    cmd = [str(workload_exec_script_path)]
+    cmd.extend([str(MODEL_URL)])
+    cmd.extend(["http://localhost:30080/v1/"]) # the base URL when serving with production stack
+    cmd.extend([KEY]) # the key that will be embedded in the filenames of the results
+    cmd.extend([str(path) for path in manifest_paths])
+
+    # Trace amplification and time scaling, applied while streaming the manifests
+    transform_args = []
+    for key, flag in (('TIME_SCALE', '--time-scale'), ('COPIES', '--copies'),
+                      ('COPY_SHIFT', '--copy-shift'), ('SPLICE', '--splice')):
+        if replay_config.get(key) is not None:
+            transform_args.extend([flag, str(replay_config[key])])
+    env = run_length_env(replay_config)
+    env['TRANSFORM_ARGS'] = ' '.join(transform_args)
+
+    # Load generated by several replay-qa.py workers (one per client node, or local processes)
+    distributed = replay_config.get('DISTRIBUTED')
+    if distributed:
+        env['WORKERS'] = str(distributed.get('WORKERS', 2))
+        coordinator_args = ['--port', str(distributed.get('PORT', 30099))]
+        if distributed.get('LOCAL', False):
+            coordinator_args.append('--local-workers')
+        env['COORDINATOR_ARGS'] = ' '.join(coordinator_args)
+        print(f"Distributed replay over {env['WORKERS']} workers: {env['COORDINATOR_ARGS']}")
+
+    # Execute the workload
+    print(f"Running Replay workload with parameters: {' '.join(cmd)} {env['TRANSFORM_ARGS']}")
+    result = subprocess.run(cmd, check=True, env=env)
+
+    if result.returncode == 0:
+        print("Replay workload completed successfully")
+    else:
+        raise RuntimeError("Failed to run Replay workload")
+
+def run_rag(rag_config: Dict[str, Any]) -> None:
+    """Run the RAG workload (Zipf document-chunk reuse) with the specified configuration."""
+    qps_values = rag_config.get('QPS', [1])
+    NUM_CHUNKS = rag_config.get('NUM_CHUNKS', 1000)
+    CHUNK_LEN = rag_config.get('CHUNK_LEN', 512)
+    CHUNKS_PER_QUERY = rag_config.get('CHUNKS_PER_QUERY', 5)
+    ZIPF_S = rag_config.get('ZIPF_S', 1.0)
+    SHUFFLE_PROB = rag_config.get('SHUFFLE_PROB', 0.0)
+    QUESTION_LEN = rag_config.get('QUESTION_LEN', 32)
+    ANSWER_LEN = rag_config.get('ANSWER_LEN', 100)
+    NUM_QUERIES = rag_config.get('NUM_QUERIES', 1000)
+
+    workload_exec_script_path = Path(__file__).parent / '3-workloads' / 'rag' / 'run_rag.sh'
+    if not workload_exec_script_path.exists():
+        raise FileNotFoundError(f"RAG script not found at {workload_exec_script_path}")
+
+    os.chmod(workload_exec_script_path, 0o755)
+
+    global MODEL_URL
+
+    cmd = [str(workload_exec_script_path)]
+    cmd.extend([str(MODEL_URL)])
+    cmd.extend(["http://localhost:30080/v1/"]) # the base URL when serving with production stack
+    cmd.extend([KEY]) # the key that will be embedded in the filenames of the results
+    cmd.extend([str(NUM_CHUNKS)])
+    cmd.extend([str(CHUNK_LEN)])
+    cmd.extend([str(CHUNKS_PER_QUERY)])
+    cmd.extend([str(ZIPF_S)])
+    cmd.extend([str(SHUFFLE_PROB)])
+    cmd.extend([str(QUESTION_LEN)])
+    cmd.extend([str(ANSWER_LEN)])
+    cmd.extend([str(NUM_QUERIES)])
+    cmd.extend([str(qps) for qps in qps_values])
+
+    # Execute the workload
+    print(f"Running RAG workload with parameters: {' '.join(cmd)}")
+    result = subprocess.run(cmd, check=True, env=run_length_env(rag_config))
+
+    if result.returncode == 0:
+        print("RAG workloads completed successfully")
+    else:
+        raise RuntimeError("Failed to run RAG workload")
+
 def run_agentic(agentic_config: Dict[str, Any]) -> None:
     """Run the Agentic workload with the specified configuration."""
     """
@@ -642,6 +1087,10 @@ def run_agentic(agentic_config: Dict[str, Any]) -> None:
     CHAT_HISTORY=$8
     ANSWER_LEN=$9
     """
+    if agentic_config.get('IN_PROCESS_SWEEP', False):
+        run_in_process_sweep('agentic', agentic_config)
+        return
+
     NEW_USER_INTERVALS = agentic_config.get('NEW_USER_INTERVALS')
     NUM_USERS_WARMUP = agentic_config.get('NUM_USERS_WARMUP')
     NUM_AGENTS = agentic_config.get('NUM_AGENTS')
@@ -672,7 +1121,7 @@ def run_agentic(agentic_config: Dict[str, Any]) -> None:
 
     # Execute the workload
     print(f"Running Agentic workload with parameters: {' '.join(cmd)}")
-    result = subprocess.run(cmd, check=True)
+    result = subprocess.run(cmd, check=True, env=run_length_env(agentic_config))
 
     if result.returncode == 0:
         print("Agentic workloads completed successfully")
@@ -729,17 +1178,39 @@ def main() -> None:
     try:
         # Read the configuration
         config = read_bench_spec()
+        cells = expand_serving_matrix(config)
+        if len(cells) > 1:
+            if args.start_from > 2:
+                raise ValueError("A Serving.Matrix needs the baseline stage (--start-from 1 or 2)")
+            write_matrix_plan(cells)
 
-        # 1. Set up infrastructure
+        # 1. Set up infrastructure (kept up across the cells of a Matrix)
         if args.start_from <= 1:
             setup_infrastructure(config)
 
-        # 2. Set up baseline (cluster of serving engines)
-        if args.start_from <= 2:
-            setup_baseline(config)
-
-        # 3. Run the specified workload
-        run_workload(config)
+        for cell_id, params, cell_config in cells:
+            if cell_id is not None:
+                print(f"Serving matrix {cell_id}: {params}")
+
+            # 2. Set up baseline (cluster of serving engines)
+            if args.start_from <= 2:
+                deploy_start = time.time()
+                setup_baseline(cell_config)
+                wait_for_serving(cell_config, deploy_start)
+
+            # tag the results of the cell: in the file names (KEY) and in the summaries
+            if cell_id is not None:
+                KEY = f"{KEY}-{cell_id}"
+                os.environ['LMBENCH_CELL'] = cell_id
+                os.environ['LMBENCH_CELL_PARAMS'] = json.dumps(params, default=str)
+                # the results database files the run under the cell's baseline and model
+                # (modelURL may be a matrix axis), not under those of bench-spec.yaml
+                cell_baseline = cell_config['Serving']['Baseline']
+                os.environ['LMBENCH_CELL_BASELINE'] = cell_baseline
+                os.environ['LMBENCH_CELL_MODEL'] = str(cell_config['Serving'].get(cell_baseline, {}).get('modelURL', ''))
+
+            # 3. Run the specified workload
+            run_workload(cell_config)
 
     except Exception as e:
         print(f"Benchmarking Error: {str(e)}")
@@ -0,0 +1,86 @@
+"""A distributed replay over two --local-workers against the mock engine, merged by the coordinator."""
+import json
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+MOCK_ENGINE = ROOT / "2-serving-engines" / "mock-engine" / "mock_engine.py"
+COORDINATOR = ROOT / "3-workloads" / "replay" / "coordinator.py"
+
+NUM_USERS = 4
+TURNS = 3
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def write_manifest(path: Path) -> None:
+    """NUM_USERS users of TURNS turns each, each later turn after the previous one of its user."""
+    entries = []
+    for turn in range(TURNS):
+        for user in range(NUM_USERS):
+            entries.append({
+                "offset": turn * 0.2 + user * 0.05, "user_id": user, "question_id": turn,
+                "max_tokens": 4, "after_previous": turn > 0, "history": "whole" if turn else "none",
+                "previous_response": {"role": "assistant"},
+                "messages": [{"role": "user", "content": f"user {user} turn {turn}: hello"}],
+                "continued": turn < TURNS - 1,
+            })
+    header = {"manifest_version": 1, "workload": "test", "params": {},
+              "requests": len(entries), "users": NUM_USERS, "duration": entries[-1]["offset"]}
+    with open(path, "w", encoding="utf-8") as f:
+        for line in [header] + entries:
+            f.write(json.dumps(line) + "\n")
+
+
+@pytest.fixture
+def engine():
+    port = free_port()
+    process = subprocess.Popen([sys.executable, str(MOCK_ENGINE), "--host", "127.0.0.1", "--port", str(port),
+                                "--decode-ms-per-token", "1"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}/v1/"
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                urllib.request.urlopen(base_url + "models", timeout=1).close()
+                break
+            except OSError:
+                if process.poll() is not None or time.time() > deadline:
+                    raise RuntimeError("mock engine did not come up")
+                time.sleep(0.2)
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def test_merge_over_two_local_workers(engine, tmp_path):
+    manifest = tmp_path / "manifest.jsonl"
+    write_manifest(manifest)
+    output = tmp_path / "merged.csv"
+    subprocess.run([sys.executable, str(COORDINATOR), "--workers", "2", "--local-workers",
+                    "--manifest", str(manifest), "--base-url", engine, "--model", "mock-model",
+                    "--host", "127.0.0.1", "--port", str(free_port()), "--start-delay", "1",
+                    "--register-timeout", "60", "--engine-metrics-interval", "0",
+                    "--output", str(output)],
+                   cwd=COORDINATOR.parent, check=True, timeout=180)
+
+    df = pd.read_csv(output)
+    # every request exactly once, users sharded by user_id % workers
+    assert len(df) == NUM_USERS * TURNS
+    assert sorted(df["worker"].unique()) == [0, 1]
+    assert df["launch_time"].is_monotonic_increasing
+    for worker in (0, 1):
+        assert len(df[df["worker"] == worker]) == NUM_USERS // 2 * TURNS
@@ -0,0 +1,117 @@
+"""EngineMetricsScraper against a fake vLLM / SGLang /metrics endpoint, and the averages summarize.py derives."""
+import importlib.util
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "4-latest-results" / "post-processing"))
+
+from summarize import compute_metrics, load_engine_metrics  # noqa: E402
+
+# the workload drivers share identical copies of utils.py
+_spec = importlib.util.spec_from_file_location("synthetic_utils", ROOT / "3-workloads" / "synthetic" / "utils.py")
+utils = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(utils)
+
+
+def vllm_metrics(scrape: int) -> str:
+    """Two replicas; the prefix cache counters grow by 100 queries / 40 hits per scrape."""
+    lines = ["# HELP vllm:num_requests_running Number of requests in model execution batches.",
+             "# TYPE vllm:num_requests_running gauge"]
+    for replica in (0, 1):
+        labels = f'{{model_name="mock-model",replica="{replica}"}}'
+        lines += [
+            f"vllm:num_requests_running{labels} {3 + replica}.0",
+            f"vllm:num_requests_waiting{labels} {replica}.0",
+            f"vllm:kv_cache_usage_perc{labels} {0.2 + 0.4 * replica}",
+            f"vllm:prefix_cache_queries_total{labels} {50.0 * scrape}",
+            f"vllm:prefix_cache_hits_total{labels} {20.0 * scrape}",
+            f"vllm:num_preemptions_total{labels} 0.0",
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def sglang_metrics(scrape: int) -> str:
+    return "\n".join([
+        "# TYPE sglang:num_running_reqs gauge",
+        'sglang:num_running_reqs{model_name="mock-model"} 8.0',
+        'sglang:num_queue_reqs{model_name="mock-model"} 2.0',
+        'sglang:token_usage{model_name="mock-model"} 0.75',
+        'sglang:cache_hit_rate{model_name="mock-model"} 0.3',
+        f'sglang:num_retracted_reqs{{model_name="mock-model"}} {float(scrape // 3)}',
+    ]) + "\n"
+
+
+@pytest.fixture(params=[vllm_metrics, sglang_metrics], ids=["vllm", "sglang"])
+def endpoint(request):
+    exposition = request.param
+    scrapes = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            scrapes.append(time.time())
+            body = exposition(len(scrapes)).encode()
+            self.send_response(200 if self.path == "/metrics" else 404)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield exposition, f"http://127.0.0.1:{server.server_address[1]}/v1/", scrapes
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_scraper_columns_clock_and_run_averages(endpoint, tmp_path):
+    exposition, base_url, scrapes = endpoint
+    output = str(tmp_path / "run.csv")
+    start = time.time()
+    scraper = utils.EngineMetricsScraper(utils.engine_metrics_url(base_url), 0.05,
+                                         utils.engine_metrics_path(output)).start()
+    time.sleep(0.5)
+    scraper.stop()
+    end = time.time()
+
+    engine_df = load_engine_metrics(output)
+    assert list(engine_df.columns) == ["timestamp", *utils.EngineMetricsScraper.COLUMNS]
+    assert len(engine_df) == scraper.num_samples == len(scrapes) >= 5
+    # samples are stamped with time.time(), the clock of launch_time / finish_time
+    assert engine_df["timestamp"].between(start, end).all()
+    assert engine_df["timestamp"].is_monotonic_increasing
+
+    # a run covering the whole scrape window
+    df = pd.DataFrame({
+        "prompt_tokens": [100, 100], "generation_tokens": [10, 10], "ttft": [0.1, 0.1],
+        "generation_time": [0.4, 0.4], "launch_time": [start, start + 0.1], "finish_time": [end - 0.1, end],
+    })
+    metrics = compute_metrics(df, engine_df=engine_df)
+    assert metrics["engine_samples"] == len(engine_df)
+    if exposition is vllm_metrics:
+        # label sets are summed, ratios averaged; the hit rate comes from the counters
+        assert engine_df["num_running"].eq(7).all()
+        assert metrics["mean_engine_running"] == pytest.approx(7)
+        assert metrics["mean_engine_waiting"] == pytest.approx(1)
+        assert metrics["mean_kv_cache_usage"] == pytest.approx(0.4)
+        assert metrics["engine_prefix_cache_hit_rate"] == pytest.approx(0.4)
+        assert metrics["engine_preemptions"] == 0
+    else:
+        assert engine_df["prefix_cache_queries"].isna().all()
+        assert metrics["mean_engine_running"] == pytest.approx(8)
+        assert metrics["max_engine_waiting"] == pytest.approx(2)
+        assert metrics["mean_kv_cache_usage"] == pytest.approx(0.75)
+        # no counters: the engine's own gauge
+        assert metrics["engine_prefix_cache_hit_rate"] == pytest.approx(0.3)
+        assert metrics["engine_preemptions"] == len(scrapes) // 3
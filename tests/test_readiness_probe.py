@@ -0,0 +1,81 @@
+"""wait_until_ready with a stubbed probe and a fake clock (no engine, no sleeping)."""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "2-serving-engines"))
+
+import readiness_probe  # noqa: E402
+from readiness_probe import ReadinessConfig, wait_until_ready  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class StubProbe:
+    """Fails `failures` times, then returns `latencies` (the last one repeated)."""
+
+    def __init__(self, failures, latencies):
+        self.failures = failures
+        self.latencies = list(latencies)
+        self.calls = 0
+
+    def __call__(self, base_url, model, timeout):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionRefusedError("engine not up")
+        return self.latencies.pop(0) if len(self.latencies) > 1 else self.latencies[0]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(readiness_probe, "time", clock)
+    return clock
+
+
+def test_backoff_then_steady(clock):
+    config = ReadinessConfig(initial_backoff=0.5, max_backoff=2.0, window=3, tolerance=0.1, interval=0.2)
+    # warm-up tail in the first window, then two agreeing windows
+    probe = StubProbe(failures=4, latencies=[0.5, 0.4, 0.3, 0.1, 0.1, 0.1, 0.1])
+    result = wait_until_ready("http://engine/v1/", "mock-model", config, since=clock.now, probe=probe)
+
+    # backoff doubles and is capped at max_backoff
+    assert clock.sleeps[:4] == [0.5, 1.0, 2.0, 2.0]
+    assert result.failed_probes == 4
+    assert result.time_to_first_inference_s == pytest.approx(5.5)
+    # first window [0.5, 0.4, 0.3], second [0.1, 0.1, 0.1] moved too much, third agrees
+    assert result.probes == 4 + 9
+    assert result.time_to_steady_state_s == pytest.approx(5.5 + 8 * 0.2)
+    assert result.steady_probe_latency_ms == pytest.approx(100.0)
+
+
+def test_not_steady_within_max_probes(clock):
+    config = ReadinessConfig(window=2, tolerance=0.01, max_probes=6, interval=0.2)
+    probe = StubProbe(failures=0, latencies=[0.1, 0.2, 0.4, 0.8, 1.6, 3.2, 6.4, 12.8])
+    result = wait_until_ready("http://engine/v1/", "mock-model", config, since=clock.now, probe=probe)
+
+    assert result.time_to_steady_state_s is None
+    assert result.probes == 1 + 6
+    assert result.failed_probes == 0
+
+
+def test_timeout_without_successful_inference(clock):
+    config = ReadinessConfig(timeout=10.0, initial_backoff=1.0, max_backoff=4.0)
+    probe = StubProbe(failures=10 ** 6, latencies=[0.1])
+    with pytest.raises(TimeoutError):
+        wait_until_ready("http://engine/v1/", "mock-model", config, probe=probe)
+    # 1 + 2 + 4 seconds waited, the next 4s backoff would pass the deadline
+    assert clock.sleeps == [1.0, 2.0, 4.0]
+    assert probe.calls == 4
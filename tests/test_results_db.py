@@ -0,0 +1,102 @@
+"""Direction of the metrics in results_db.py best, derived from what summarize.compute_metrics produces."""
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "4-latest-results" / "post-processing"))
+
+import results_db  # noqa: E402
+from summarize import compute_metrics  # noqa: E402
+
+# Throughputs, rates, ratios and speeds: larger is better
+HIGHER_PATTERN = re.compile(r"throughput|_rate$|_ratio$|_speed$|^successful_requests$")
+# Everything else must be a latency (_ms) or one of these counts / engine-side load figures
+OTHER_METRICS = re.compile(r"^(total_requests|duration_s|total_input_tokens|total_generated_tokens"
+                           r"|locally_counted_requests|missed_slots|total_cached_tokens"
+                           r"|(prefix_)?reuse_\d+_requests|engine_samples|engine_preemptions"
+                           r"|(mean|max)_engine_(running|waiting)|(mean|max)_kv_cache_usage)$")
+
+
+def all_columns_run(n: int = 40) -> pd.DataFrame:
+    """A run with every optional per-request column the workloads write."""
+    rng = np.random.default_rng(0)
+    launch = np.sort(rng.uniform(0, 20, n))
+    ttft = rng.uniform(0.05, 0.2, n)
+    generation_time = ttft + rng.uniform(0.5, 1.0, n)
+    return pd.DataFrame({
+        "prompt_tokens": rng.integers(100, 1000, n),
+        "generation_tokens": rng.integers(2, 100, n),
+        "cached_tokens": rng.integers(0, 100, n),
+        "tokens_counted_locally": rng.integers(0, 2, n),
+        "ttft": ttft,
+        "generation_time": generation_time,
+        "launch_time": launch,
+        "finish_time": launch + generation_time,
+        "scheduled_time": launch - 0.01,
+        "send_time": launch,
+        "dispatch_delay": np.full(n, 0.001),
+        "missed_slots": rng.integers(0, 2, n),
+        "reused_chunks": rng.integers(0, 3, n),
+        "prefix_reused_chunks": rng.integers(0, 2, n),
+    })
+
+
+def engine_samples() -> pd.DataFrame:
+    timestamps = np.arange(0.0, 25.0, 1.0)
+    return pd.DataFrame({
+        "timestamp": timestamps, "num_running": 4.0, "num_waiting": 1.0, "kv_cache_usage": 0.5,
+        "prefix_cache_queries": timestamps * 100, "prefix_cache_hits": timestamps * 40,
+        "prefix_cache_hit_rate": np.nan, "preemptions": 0.0,
+    })
+
+
+def test_higher_is_better_covers_every_metric():
+    metrics = compute_metrics(all_columns_run(), engine_df=engine_samples())
+    higher = {name for name in metrics if HIGHER_PATTERN.search(name)}
+    unclassified = [name for name in metrics
+                    if name not in higher and not name.endswith("_ms") and not OTHER_METRICS.match(name)]
+
+    assert not unclassified, f"classify the new metrics in results_db.HIGHER_IS_BETTER: {unclassified}"
+    assert results_db.HIGHER_IS_BETTER == higher
+
+
+def test_best_sorts_higher_is_better_descending(tmp_path):
+    db_path = str(tmp_path / "results.db")
+    for ratio in (0.5, 0.2, 0.89):
+        results_db.record_run({"cache_hit_token_ratio": ratio, "p99_ttft_ms": 100 * ratio},
+                              {"WORKLOAD": "synthetic"}, db_path=db_path)
+    conn = results_db.connect(db_path)
+    try:
+        best = [row["metric_value"] for row in results_db.query_runs(conn, metric="cache_hit_token_ratio")]
+        fastest = [row["metric_value"] for row in results_db.query_runs(conn, metric="p99_ttft_ms")]
+    finally:
+        conn.close()
+    assert best == [0.89, 0.5, 0.2]
+    assert fastest == [20.0, 50.0, 89.0]
+
+
+def test_request_columns_migrate_and_store(tmp_path):
+    db_path = str(tmp_path / "results.db")
+    # a database of the first schema, before the per-request cache / token / reuse columns
+    conn = results_db.sqlite3.connect(db_path)
+    conn.executescript(results_db.SCHEMA)
+    for column in ("user_id", "question_id", "prompt_tokens", "ttft"):
+        conn.execute(f"ALTER TABLE requests ADD COLUMN {column} {results_db.REQUEST_COLUMNS[column]}")
+    conn.close()
+
+    df = all_columns_run(3)
+    df.loc[0, "cached_tokens"] = np.nan
+    run_id = results_db.record_run({}, {"WORKLOAD": "rag"}, df=df, db_path=db_path)
+    conn = results_db.connect(db_path)
+    try:
+        rows = conn.execute("SELECT cached_tokens, tokens_counted_locally, reused_chunks, "
+                            "prefix_reused_chunks FROM requests WHERE run_id = ?", (run_id,)).fetchall()
+    finally:
+        conn.close()
+    assert [tuple(row) for row in rows] == [
+        (None if i == 0 else int(df.loc[i, "cached_tokens"]), int(df.loc[i, "tokens_counted_locally"]),
+         int(df.loc[i, "reused_chunks"]), int(df.loc[i, "prefix_reused_chunks"]))
+        for i in range(3)]
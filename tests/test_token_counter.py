@@ -0,0 +1,51 @@
+"""TokenCounter: local token counts of responses whose stream carried no usage."""
+import asyncio
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# the workload drivers share identical copies of utils.py
+_spec = importlib.util.spec_from_file_location("synthetic_utils", ROOT / "3-workloads" / "synthetic" / "utils.py")
+utils = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(utils)
+TokenCounter = utils.TokenCounter
+
+MESSAGES = [{"role": "system", "content": "You are a helpful assistant"},
+            {"role": "user", "content": "How many words are in here?"}]
+
+
+@pytest.fixture(autouse=True)
+def fresh_tokenizers(monkeypatch):
+    monkeypatch.setattr(TokenCounter, "_tokenizers", {})
+
+
+def test_count_falls_back_to_words_without_tokenizer(monkeypatch):
+    # transformers cannot be imported: no tokenizer loads
+    monkeypatch.setitem(sys.modules, "transformers", None)
+    prompt_tokens, completion_tokens = asyncio.run(
+        TokenCounter.Count("mock-model", MESSAGES, "Six words in this short answer"))
+
+    assert (prompt_tokens, completion_tokens) == (11, 6)
+    assert TokenCounter._tokenizers == {"mock-model": None}
+
+
+class ChatTokenizer:
+    """Returns a BatchEncoding-like dict unless the token ids are asked for, as newer transformers do."""
+    chat_template = "{{ messages }}"
+
+    def apply_chat_template(self, messages, tokenize=True, add_generation_prompt=False, return_dict=True):
+        ids = list(range(3 * len(messages) + 1))
+        return ids if not return_dict else {"input_ids": ids, "attention_mask": [1] * len(ids)}
+
+    def encode(self, text, add_special_tokens=True):
+        return text.split()
+
+
+def test_count_prompt_uses_the_chat_template_token_ids():
+    TokenCounter._tokenizers["chat-model"] = ChatTokenizer()
+    assert TokenCounter.CountPrompt("chat-model", MESSAGES) == 7
+    assert TokenCounter.CountText("chat-model", "three more words") == 3